@@ -0,0 +1,242 @@
+"""Endgame bitbases: exact results of king and piece against a bare king.
+
+A bitbase has one bit per position, set when the side with the piece (the
+strong side) wins with best play and clear when the position is a draw or
+illegal. A bare king can not win, so the bit is the full win/draw/loss result.
+The bitbases are built locally by retrograde analysis: starting from the mates
+(and, for KPK, the winning promotions), wins are propagated backwards through
+the moves that lead to them, until no position changes. The positions left
+over are draws.
+
+Positions are indexed with the strong side as white, by the side to move, the
+strong king, the piece and the weak king (2 * 64 * 64 * 64 bits, 64 KB per
+file). Positions where black has the piece are mirrored. The files are
+memory-mapped when the engine starts, so processes using them share their pages.
+
+Build the bitbases (from the `chess` directory):
+    python -m ai.bitbase [directory]
+"""
+import os
+import mmap
+import time
+import argparse
+from model.bitboard import (WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, SYMBOLS, SQUARE_BB,
+                            KING_ATTACKS, PAWN_ATTACKS, squares, popcount, rook_attacks, queen_attacks)
+
+
+# Default directory of the bitbase files, built locally
+BITBASE_DIR = os.path.join(os.path.dirname(__file__), 'bitbases')
+
+# Piece types with a bitbase, in build order: KPK needs the results of its promotions
+ENDGAMES = (QUEEN, ROOK, PAWN)
+
+# Side to move in the index
+STRONG, WEAK = 0, 1
+SIZE = 2 * 64 * 64 * 64
+
+# Results for the side to move
+LOSS, DRAW, WIN = -1, 0, 1
+
+# States of the positions during the analysis
+ILLEGAL, UNKNOWN, WON = 0, 1, 2
+
+
+def bitbase_path(piece_type, directory=BITBASE_DIR):
+    """File of the bitbase of king and piece against king, e.g. kqk.bin"""
+    return os.path.join(directory, f'k{SYMBOLS[piece_type].lower()}k.bin')
+
+
+def index(side, strong_king, piece, weak_king):
+    return side << 18 | strong_king << 12 | piece << 6 | weak_king
+
+
+def piece_attacks(piece_type, sq, occupied):
+    """Squares attacked by the strong piece (a white pawn moves up)"""
+    if piece_type == PAWN: return PAWN_ATTACKS[WHITE][sq]
+    if piece_type == ROOK: return rook_attacks(sq, occupied)
+    return queen_attacks(sq, occupied)
+
+
+def piece_unmoves(piece_type, sq, occupied):
+    """Squares the strong piece can have come from without capturing"""
+    if piece_type != PAWN: return piece_attacks(piece_type, sq, occupied) & ~occupied
+
+    # Pawns: a single push, or a double push from the second rank
+    unmoves = 0
+    if sq >= 16 and not occupied & SQUARE_BB[sq - 8]:
+        unmoves |= SQUARE_BB[sq - 8]
+        if 24 <= sq < 32 and not occupied & SQUARE_BB[sq - 16]: unmoves |= SQUARE_BB[sq - 16]
+    return unmoves
+
+
+def is_set(bits, i):
+    return bits[i >> 3] >> (i & 7) & 1
+
+
+def generate(piece_type, promotions=None):
+    """Bitbase of king and piece against king by retrograde analysis.
+
+    Args:
+        piece_type (int): piece of the strong side (pawn, rook or queen)
+        promotions (dict): bitbases of the promotion pieces, by piece type (KPK)
+
+    Returns:
+        bytearray: bit-packed results, see `index`
+    """
+    state = bytearray(SIZE)
+
+    # Legal moves of the weak side that are not known to lose yet
+    moves_left = bytearray(SIZE)
+    won = []
+
+    for strong_king in range(64):
+        for piece in range(64):
+            if piece == strong_king or (piece_type == PAWN and not 8 <= piece < 56): continue
+
+            for weak_king in range(64):
+                if weak_king == strong_king or weak_king == piece: continue
+                if KING_ATTACKS[strong_king] & SQUARE_BB[weak_king]: continue
+
+                occupied = SQUARE_BB[strong_king] | SQUARE_BB[piece] | SQUARE_BB[weak_king]
+                check = piece_attacks(piece_type, piece, occupied) & SQUARE_BB[weak_king]
+
+                # Strong side to move: the weak king can not be in check
+                if not check:
+                    i = index(STRONG, strong_king, piece, weak_king)
+                    state[i] = UNKNOWN
+
+                    if piece_type == PAWN and piece >= 48 and not occupied & SQUARE_BB[piece + 8]:
+                        child = index(WEAK, strong_king, piece + 8, weak_king)
+                        if any(is_set(bits, child) for bits in promotions.values()):
+                            state[i] = WON
+                            won.append(i)
+
+                # Weak side to move: it can capture the piece when it is not defended
+                i = index(WEAK, strong_king, piece, weak_king)
+                state[i] = UNKNOWN
+                attacked = piece_attacks(piece_type, piece, occupied ^ SQUARE_BB[weak_king]) | KING_ATTACKS[strong_king]
+                moves = popcount(KING_ATTACKS[weak_king] & ~attacked)
+                moves_left[i] = moves
+
+                if moves == 0 and check:
+                    state[i] = WON
+                    won.append(i)
+
+    while won:
+        i = won.pop()
+        side, strong_king, piece, weak_king = i >> 18, i >> 12 & 63, i >> 6 & 63, i & 63
+        occupied = SQUARE_BB[strong_king] | SQUARE_BB[piece] | SQUARE_BB[weak_king]
+
+        if side == WEAK:
+            # The strong side wins with the move of its king or piece that led here
+            for sq in squares(KING_ATTACKS[strong_king] & ~occupied & ~KING_ATTACKS[weak_king]):
+                j = index(STRONG, sq, piece, weak_king)
+                if state[j] == UNKNOWN:
+                    state[j] = WON
+                    won.append(j)
+
+            for sq in squares(piece_unmoves(piece_type, piece, occupied)):
+                j = index(STRONG, strong_king, sq, weak_king)
+                if state[j] == UNKNOWN:
+                    state[j] = WON
+                    won.append(j)
+        else:
+            # The weak side loses once all its moves lose
+            for sq in squares(KING_ATTACKS[weak_king] & ~occupied & ~KING_ATTACKS[strong_king]):
+                j = index(WEAK, strong_king, piece, sq)
+                if state[j] == UNKNOWN:
+                    moves_left[j] -= 1
+                    if moves_left[j] == 0:
+                        state[j] = WON
+                        won.append(j)
+
+    bits = bytearray(SIZE // 8)
+    for i in range(SIZE):
+        if state[i] == WON: bits[i >> 3] |= 1 << (i & 7)
+    return bits
+
+
+def build_bitbases(directory=BITBASE_DIR):
+    """Generate the bitbases of all endgames into the directory
+
+    Returns:
+        dict: bitbases by piece type
+    """
+    os.makedirs(directory, exist_ok=True)
+    bitbases = {}
+    for piece_type in ENDGAMES:
+        promotions = {QUEEN: bitbases[QUEEN], ROOK: bitbases[ROOK]} if piece_type == PAWN else None
+        bitbases[piece_type] = generate(piece_type, promotions)
+        with open(bitbase_path(piece_type, directory), 'wb') as file: file.write(bitbases[piece_type])
+    return bitbases
+
+
+class Bitbases:
+    """Read-only bitbases in memory-mapped files. Endgames without a bitbase
+    file are not probed, except the ones that are always drawn (bare kings,
+    king and minor piece against king)."""
+
+    def __init__(self, directory=BITBASE_DIR):
+        """Args:
+            directory (str): directory of the bitbase files
+        """
+        self.maps = {}
+        for piece_type in ENDGAMES:
+            path = bitbase_path(piece_type, directory)
+            if not os.path.exists(path): continue
+
+            with open(path, 'rb') as file:
+                if os.fstat(file.fileno()).st_size != SIZE // 8: raise ValueError(f'Invalid bitbase: {path}')
+                self.maps[piece_type] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        for bits in self.maps.values(): bits.close()
+        self.maps = {}
+
+    def probe(self, bitboard):
+        """Result of the position for the side to move
+
+        Args:
+            bitboard (BitBoard): position
+
+        Returns:
+            int: WIN, DRAW or LOSS, None if the position is not in the bitbases
+        """
+        occupied = bitboard.occupied
+        pieces = popcount(occupied[WHITE] | occupied[BLACK])
+        if pieces == 2: return DRAW
+        if pieces != 3: return None
+
+        strong = WHITE if occupied[BLACK] == bitboard.pieces[BLACK][KING] else BLACK
+        piece = (occupied[strong] ^ bitboard.pieces[strong][KING]).bit_length() - 1
+        piece_type = bitboard.squares[piece][1]
+        if piece_type in (KNIGHT, BISHOP): return DRAW
+
+        bits = self.maps.get(piece_type)
+        if bits is None: return None
+
+        strong_king = bitboard.pieces[strong][KING].bit_length() - 1
+        weak_king = bitboard.pieces[strong ^ 1][KING].bit_length() - 1
+        if strong == BLACK: strong_king, piece, weak_king = strong_king ^ 56, piece ^ 56, weak_king ^ 56
+
+        side = STRONG if bitboard.side == strong else WEAK
+        if not is_set(bits, index(side, strong_king, piece, weak_king)): return DRAW
+        return WIN if side == STRONG else LOSS
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the endgame bitbases (KQK, KRK, KPK)')
+    parser.add_argument('directory', nargs='?', default=BITBASE_DIR, help='directory of the bitbase files')
+    args = parser.parse_args()
+
+    start = time.time()
+    bitbases = build_bitbases(args.directory)
+    for piece_type, bits in bitbases.items():
+        wins = [sum(is_set(bits, index(side, 0, 0, 0) + i) for i in range(64 ** 3)) for side in (STRONG, WEAK)]
+        print(f'{bitbase_path(piece_type, args.directory)}: {wins[0]} wins with the strong side to move, '
+              f'{wins[1]} losses with the weak side to move')
+    print(f'{time.time() - start:.1f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""Opening book: a binary file of sorted 16-byte entries, memory-mapped for lookup.
+
+The entries have the layout of Polyglot books: position key (8 bytes), move
+(2 bytes), weight (2 bytes) and a learn field (4 bytes, unused), big-endian,
+sorted by key. The key is the Zobrist hash of `BitBoard` and the move is a
+packed move (see `encode_move`), so books are built for this engine with the
+tool below. A lookup is a binary search over the mapped file: nothing is
+parsed when a book is opened, and processes using the same book share its
+pages.
+
+Build a book from a PGN file (from the `chess` directory):
+    python -m ai.book games.pgn book.bin [--plies N] [--min-games N]
+"""
+import os
+import mmap
+import random
+import struct
+import argparse
+from collections import defaultdict
+from model.bitboard import BitBoard, WHITE
+from model.pgn import read_games
+
+
+ENTRY = struct.Struct('>QHHI')
+KEY = struct.Struct('>Q')
+
+# Default book file, built locally from a PGN file
+BOOK_PATH = os.path.join(os.path.dirname(__file__), 'book.bin')
+
+# Game results in PGN and the points of white
+RESULTS = {'1-0': 1, '0-1': 0, '1/2-1/2': 0.5}
+
+
+class OpeningBook:
+    """Read-only opening book in a memory-mapped file"""
+
+    def __init__(self, path=BOOK_PATH):
+        """Args:
+            path (str): book file
+        """
+        self.path = path
+        with open(path, 'rb') as file:
+            size = os.fstat(file.fileno()).st_size
+            if size % ENTRY.size: raise ValueError(f'Invalid opening book: {path}')
+
+            # A file of size 0 can not be mapped
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self.size = size // ENTRY.size
+        self.random = random.Random()
+
+    def close(self):
+        if self.size: self.map.close()
+
+    def find(self, key):
+        """Index of the first entry of the key (binary search)"""
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if KEY.unpack_from(self.map, middle * ENTRY.size)[0] < key: low = middle + 1
+            else: high = middle
+        return low
+
+    def entries(self, key):
+        """(move, weight) of the book moves of a position key"""
+        entries = []
+        for index in range(self.find(key), self.size):
+            entry_key, move, weight, _ = ENTRY.unpack_from(self.map, index * ENTRY.size)
+            if entry_key != key: break
+            entries.append((move, weight))
+        return entries
+
+    def probe(self, bitboard, best=False):
+        """Book move of the position, picked at random by weight.
+
+        Args:
+            bitboard (BitBoard): position
+            best (bool): play the move with the highest weight
+
+        Returns:
+            int: packed move, None if the position is not in the book
+        """
+        entries = self.entries(bitboard.hash)
+        if not entries: return None
+
+        # Guard against hash collisions
+        legal_moves = bitboard.legal_moves()
+        entries = [(move, weight) for move, weight in entries if move in legal_moves and weight > 0]
+        if not entries: return None
+
+        if best: return max(entries, key=lambda entry: entry[1])[0]
+        moves, weights = zip(*entries)
+        return self.random.choices(moves, weights)[0]
+
+
+def build_book(pgn_path, book_path, plies=20, min_games=1):
+    """Build a book from the first plies of the games of a PGN file.
+
+    The weight of a move is the points scored with it (2 per win, 1 per
+    draw), or the number of games when results are unknown.
+
+    Returns:
+        tuple: (games, entries)
+    """
+    weights = defaultdict(int)
+    counts = defaultdict(int)
+    games = 0
+
+    with open(pgn_path, encoding='utf-8', errors='replace') as file:
+        for game in read_games(file, plies):
+            games += 1
+            if not game.moves: continue
+            board = BitBoard.from_fen(game.fen)
+            white_points = RESULTS.get(game.result)
+
+            for move in game.moves:
+                if white_points is None: points = 1
+                else: points = int(2 * (white_points if board.side == WHITE else 1 - white_points))
+                weights[board.hash, move] += points
+                counts[board.hash, move] += 1
+                board.push(move)
+
+    entries = sorted(((key, move, weight) for (key, move), weight in weights.items()
+                      if counts[key, move] >= min_games and weight > 0),
+                     key=lambda entry: (entry[0], -entry[2]))
+
+    # Weights are 16-bit
+    scale = max((entry[2] for entry in entries), default=0) / 0xFFFF
+    with open(book_path, 'wb') as file:
+        for key, move, weight in entries:
+            if scale > 1: weight = max(1, int(weight / scale))
+            file.write(ENTRY.pack(key, move, weight, 0))
+    return games, len(entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build an opening book from a PGN file')
+    parser.add_argument('pgn', help='PGN file of games')
+    parser.add_argument('book', nargs='?', default=BOOK_PATH, help='book file to write')
+    parser.add_argument('--plies', type=int, default=20, help='number of plies per game in the book')
+    parser.add_argument('--min-games', type=int, default=1, help='minimum number of games of a book move')
+    args = parser.parse_args()
+
+    games, entries = build_book(args.pgn, args.book, args.plies, args.min_games)
+    print(f'{entries} entries from {games} games written to {args.book}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,482 @@
+import time
+from model.bitboard import NO_MOVE, WHITE, PAWN, KNIGHT, KING, CAPTURE, EN_PASSANT, PROMOTION, SEE_VALUES, move_name, squares
+from model.values import MATERIAL
+from ai.transposition import TranspositionTable, EXACT, LOWER, UPPER
+from ai.bitbase import Bitbases, DRAW, LOSS
+
+
+MATE = 100000
+INFINITY = 1000000
+
+# Scores beyond this are mates, their distance is counted from the root
+MATE_BOUND = MATE - 1000
+
+# Endgames won by the bitbases score above any evaluation and below the mates
+KNOWN_WIN = 20000
+
+# Move ordering scores: hash move, then captures and promotions (most valuable 
+# victim, least valuable attacker), then killer moves, then quiet moves by history
+HASH_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 24
+KILLER_SCORE = 1 << 22
+HISTORY_LIMIT = 1 << 21
+
+# Captures that lose material (by static exchange evaluation) come after the quiet moves
+LOSING_CAPTURE_SCORE = -CAPTURE_SCORE
+
+# MVV-LVA: victim value first, the attacker's piece type breaks ties. 
+# The king has no material value, but is the most valuable attacker
+MVV_LVA = [[CAPTURE_SCORE + 16 * MATERIAL[victim] - attacker for attacker in range(6)] for victim in range(6)]
+
+
+def format_info(info):
+    """Summary of a search"""
+    summary = (f"depth {info['depth']} score {info['score']} nodes {info['nodes']} "
+               f"time {info['time']:.2f}s nps {info['nps']} pv {' '.join(info['pv'])}")
+    
+    if 'threads' in info: summary += f" threads {info['threads']}"
+    if info.get('tbhits'): summary += f" tbhits {info['tbhits']}"
+
+    if 'cutoffs' in info:
+        first_rate = info['first_cutoffs'] / info['cutoffs'] if info['cutoffs'] else 0
+        summary += f" | ebf {info['ebf']:.2f} cutoffs {info['cutoffs']} ({100 * first_rate:.0f}% first move)"
+
+    if 'tt' in info:
+        tt = info['tt']
+        hit_rate = tt['hits'] / tt['probes'] if tt['probes'] else 0
+        summary += (f" | tt hits {tt['hits']} misses {tt['misses']} ({100 * hit_rate:.0f}% hit) "
+                    f"collisions {tt['collisions']} full {tt['hashfull'] / 10:.1f}%")
+    return summary
+
+
+def score_to_tt(score, ply):
+    """Mate scores are stored as distance to mate from the position itself"""
+    if score > MATE_BOUND: return score + ply
+    if score < -MATE_BOUND: return score - ply
+    return score
+
+
+def score_from_tt(score, ply):
+    if score > MATE_BOUND: return score - ply
+    if score < -MATE_BOUND: return score + ply
+    return score
+
+
+def known_win_progress(board, winner):
+    """Progress of the winning side in a won endgame: its pawns advanced, or
+    without pawns, the losing king pushed to the edge by the winning king"""
+    pawns = board.pieces[winner][PAWN]
+    if pawns:
+        ranks = sum(sq >> 3 if winner == WHITE else 7 - (sq >> 3) for sq in squares(pawns))
+        return 20 * ranks
+
+    winner_king = board.pieces[winner][KING].bit_length() - 1
+    loser_king = board.pieces[winner ^ 1][KING].bit_length() - 1
+    x, y = loser_king & 7, loser_king >> 3
+    edge = max(3 - x, x - 4) + max(3 - y, y - 4)
+    distance = max(abs(x - (winner_king & 7)), abs(y - (winner_king >> 3)))
+    return 10 * edge + 4 * (7 - distance)
+
+
+class Engine:
+    """Negamax alpha-beta search with iterative deepening on a `BitBoard`.
+
+    The search stops at the time or node budget of the AI level, whichever
+    is reached first, and plays the best move of the last finished iteration.
+    """
+
+    # AI level: (time in s, nodes)
+    LEVELS = {1: (0.5, 2000),
+              2: (2.0, 20000),
+              3: (5.0, 200000)}
+
+    MAX_DEPTH = 64
+
+    def __init__(self, level=1, hash_mb=16, tt=None, worker_id=0):
+        """Args:
+            level (int): AI level, sets the time and node budget
+            hash_mb (float): memory size of the transposition table (in MB)
+            tt (TranspositionTable): table to use instead of a new one, e.g. 
+                one shared with the other processes of a parallel search
+            worker_id (int): number of the process in a parallel search, the 
+                helpers (all but 0) vary their search from the main process
+        """
+        self.level = level
+        self.info = {}
+        self.tt = TranspositionTable(hash_mb) if tt is None else tt
+        self.worker_id = worker_id
+        
+        # Optional function that returns True when the search must stop
+        self.abort = None
+        
+        # Function that returns True once the predicted move is played, while pondering
+        self.ponderhit = None
+        
+        # Optional function called with the info of every finished iteration
+        self.iteration = None
+        
+        # Search the moves in the order of the move ordering heuristics,
+        # otherwise in move generation order
+        self.move_ordering = True
+        
+        # Skip captures that lose material (by static exchange evaluation) in the
+        # quiescence search
+        self.see_pruning = True
+        
+        # History heuristic: how often a quiet move (by side, from and to 
+        # square) caused a cutoff, weighted by depth
+        self.history = [[0] * 4096, [0] * 4096]
+        
+        # Endgame bitbases, when they are built
+        self.bitbases = Bitbases()
+        self.reset()
+
+    def reset(self):
+        """Reset search variables"""
+        self.nodes = 0
+        self.qnodes = 0
+        self.stopped = False
+        self.start_time = time.time()
+        self.time_limit = None
+        self.node_limit = None
+        self.pondering = False
+        self.ponder_limits = None
+        self.pv = [[] for _ in range(self.MAX_DEPTH + 1)]
+        
+        # Killer moves: two quiet moves per ply that caused a cutoff in a sibling node
+        self.killers = [[NO_MOVE, NO_MOVE] for _ in range(self.MAX_DEPTH + 1)]
+        
+        # Beta cutoffs, and the cutoffs by the first move searched
+        self.cutoffs = 0
+        self.first_cutoffs = 0
+        
+        # Positions scored by the bitbases
+        self.tbhits = 0
+        self.root_in_bitbases = False
+
+    def search(self, bitboard, time_limit=None, node_limit=None, depth_limit=None, ponder=False):
+        """Search the best move for the side to move in the position.
+
+        Args:
+            bitboard (BitBoard): position to search, it is not changed
+            time_limit (float): time budget (in s), default from the AI level
+            node_limit (int): node budget, default from the AI level
+            depth_limit (int): maximum depth of the iterative deepening
+            ponder (bool): search the position after the predicted move of the
+                opponent without limits, until `ponderhit` returns True. Then 
+                the budget applies, counting the time and nodes spent pondering
+
+        Returns:
+            int: best move (packed), None if there are no moves
+        """
+        self.reset()
+        self.tt.reset_stats()
+        level_time, level_nodes = self.LEVELS[self.level]
+        self.time_limit = level_time if time_limit is None else time_limit
+        self.node_limit = level_nodes if node_limit is None else node_limit
+        depth_limit = self.MAX_DEPTH if depth_limit is None else depth_limit
+        
+        if ponder:
+            self.pondering = True
+            self.ponder_limits = (self.time_limit, self.node_limit)
+            self.time_limit = self.node_limit = float('inf')
+
+        self.board = bitboard.copy()
+        root_moves = self.board.legal_moves()
+        if not root_moves: return None
+        
+        # Endgames in the bitbases: only the moves that keep the result are searched
+        self.root_in_bitbases = self.bitbases.probe(self.board) is not None
+        if self.root_in_bitbases: root_moves = self.bitbase_moves(root_moves)
+        
+        # History of earlier searches still helps, but should not dominate
+        for table in self.history:
+            for i, value in enumerate(table): 
+                if value: table[i] = value >> 2
+        
+        entry = self.tt.probe(self.board.hash)
+        root_moves = self.order_moves(root_moves, entry[3] if entry is not None else NO_MOVE, 0)
+
+        # Lazy SMP: helpers start with another root move, and half of them one 
+        # ply deeper, so the processes fill the shared table with different subtrees
+        start_depth = 1
+        if self.worker_id:
+            shift = self.worker_id % len(root_moves)
+            root_moves = root_moves[shift:] + root_moves[:shift]
+            start_depth += self.worker_id & 1
+
+        best_move, best_score, pv = root_moves[0], 0, [root_moves[0]]
+        depth = 0
+        finished = 0
+
+        for depth in range(min(start_depth, depth_limit), depth_limit + 1):
+            score = self.negamax(depth, -INFINITY, INFINITY, 0, root_moves)
+            if self.stopped: break
+
+            pv = self.extend_pv(self.pv[0], depth)
+            best_move, best_score = pv[0], score
+            finished = depth
+            if self.iteration is not None: self.iteration(self.search_info(finished, best_score, pv))
+
+            # Try the best move first in the next iteration
+            root_moves.remove(best_move)
+            root_moves.insert(0, best_move)
+
+            # Stop early when the next iteration can not finish in time
+            if self.elapsed() > self.time_limit / 2 or abs(score) >= MATE - self.MAX_DEPTH: break
+
+        self.info = self.search_info(finished, best_score, pv)
+        return best_move
+
+    def extend_pv(self, pv, depth):
+        """Principal variation of an iteration up to its depth. The variation of 
+        the search ends at transposition table cutoffs, it is continued with the 
+        best moves stored in the table."""
+        board = self.board
+        pv = list(pv)
+        for move in pv: board.push(move)
+        
+        while len(pv) < depth and not board.is_repetition():
+            entry = self.tt.probe(board.hash)
+            if entry is None or entry[3] not in board.legal_moves(): break
+            pv.append(entry[3])
+            board.push(entry[3])
+        
+        for _ in pv: board.pop()
+        return pv
+
+    def search_info(self, depth, score, pv):
+        """Statistics of the search so far, with the result of the last finished iteration"""
+        elapsed = self.elapsed()
+        return {'depth': depth,
+                'score': score,
+                'nodes': self.nodes,
+                'qnodes': self.qnodes,
+                'time': elapsed,
+                'nps': int(self.nodes / elapsed) if elapsed > 0 else 0,
+                'pv': [move_name(move) for move in pv],
+                'ponder': pv[1] if len(pv) > 1 else NO_MOVE,
+                'ebf': self.nodes ** (1 / depth) if depth > 0 else 0,
+                'cutoffs': self.cutoffs,
+                'first_cutoffs': self.first_cutoffs,
+                'tbhits': self.tbhits,
+                'tt': self.tt.stats()}
+
+    def elapsed(self):
+        return time.time() - self.start_time
+
+    def check_limits(self):
+        """Stop the search when the budget is used, or when it is aborted"""
+        if self.pondering and self.ponderhit():
+            # The predicted move was played: a search that already used 
+            # its budget while pondering stops right away
+            self.pondering = False
+            self.time_limit, self.node_limit = self.ponder_limits
+        
+        if (self.nodes >= self.node_limit 
+            or self.elapsed() >= self.time_limit
+            or (self.abort is not None and self.abort())): 
+            self.stopped = True
+
+    def negamax(self, depth, alpha, beta, ply, moves=None):
+        """Score of the position for the side to move
+
+        Args:
+            depth (int): remaining depth
+            alpha (int): lower bound of the score
+            beta (int): upper bound of the score
+            ply (int): distance to the root
+            moves (array): packed moves to search, by default all legal moves
+        """
+        self.nodes += 1
+        if self.nodes & 255 == 0: self.check_limits()
+        if self.stopped: return 0
+
+        self.pv[ply] = []
+        board = self.board
+
+        if ply > 0:
+            if board.halfmove >= 100 or board.is_repetition(): return 0
+            score = self.probe_bitbases(depth, ply)
+            if score is not None: return score
+        if depth == 0: return self.quiescence(alpha, beta, ply)
+
+        # Transposition table: cut off with a stored search that went deep enough
+        key = board.hash
+        entry = self.tt.probe(key)
+        hash_move = NO_MOVE
+        
+        if entry is not None:
+            tt_depth, bound, score, hash_move = entry
+            score = score_from_tt(score, ply)
+            
+            if ply > 0 and tt_depth >= depth:
+                if (bound == EXACT 
+                    or (bound == LOWER and score >= beta) 
+                    or (bound == UPPER and score <= alpha)):
+                    if hash_move: self.pv[ply] = [hash_move]
+                    return score
+
+        if moves is None: 
+            moves = board.legal_moves()
+            if not moves: return -MATE + ply if board.in_check(board.side) else 0
+            moves = self.order_moves(moves, hash_move, ply)
+
+        alpha_start = alpha
+        best_move = NO_MOVE
+        
+        for i, move in enumerate(moves):
+            board.push(move)
+            score = -self.negamax(depth - 1, -beta, -alpha, ply + 1)
+            board.pop()
+            if self.stopped: return 0
+
+            if score > alpha:
+                alpha = score
+                best_move = move
+                self.pv[ply] = [move] + self.pv[ply + 1]
+                if alpha >= beta: 
+                    self.cutoff(move, depth, ply, i)
+                    break
+
+        if alpha >= beta: bound = LOWER
+        elif alpha > alpha_start: bound = EXACT
+        else: bound = UPPER
+        self.tt.store(key, depth, bound, score_to_tt(alpha, ply), best_move)
+        
+        return alpha
+
+    def quiescence(self, alpha, beta, ply):
+        """Score of the position for the side to move, searching only captures and 
+        promotions until the position is quiet, so the static evaluation is not 
+        taken in the middle of an exchange. In check all evasions are searched."""
+        self.nodes += 1
+        self.qnodes += 1
+        if self.nodes & 255 == 0: self.check_limits()
+        if self.stopped: return 0
+
+        self.pv[ply] = []
+        board = self.board
+        if ply >= self.MAX_DEPTH: return self.evaluate()
+
+        in_check = board.in_check(board.side)
+        if in_check:
+            moves = board.legal_moves()
+            if not moves: return -MATE + ply
+        else:
+            # Stand pat: the side to move does not have to capture
+            score = self.evaluate()
+            if score >= beta: return score
+            if score > alpha: alpha = score
+            moves = board.legal_moves(captures_only=True)
+            if self.see_pruning: moves = [move for move in moves if not self.loses_material(move)]
+        
+        for move in self.order_moves(moves, NO_MOVE, ply):
+            board.push(move)
+            score = -self.quiescence(-beta, -alpha, ply + 1)
+            board.pop()
+            if self.stopped: return 0
+
+            if score > alpha:
+                alpha = score
+                self.pv[ply] = [move] + self.pv[ply + 1]
+                if alpha >= beta: break
+        
+        return alpha
+
+    def order_moves(self, moves, hash_move, ply):
+        """Moves sorted from most to least promising: the hash move, captures and 
+        promotions by MVV-LVA, the killer moves of the ply, quiet moves by history, 
+        then the captures that lose material"""
+        if not self.move_ordering: return list(moves)
+        
+        squares = self.board.squares
+        history = self.history[self.board.side]
+        killer_1, killer_2 = self.killers[ply]
+        scores = {}
+
+        for move in moves:
+            if move == hash_move: score = HASH_MOVE_SCORE
+            elif move >> 12 & (CAPTURE | PROMOTION):
+                flags = move >> 12
+                if flags == EN_PASSANT: score = MVV_LVA[PAWN][PAWN]
+                elif flags & CAPTURE: 
+                    score = MVV_LVA[squares[move >> 6 & 63][1]][squares[move & 63][1]]
+                    if self.loses_material(move): score += LOSING_CAPTURE_SCORE - CAPTURE_SCORE
+                else: score = CAPTURE_SCORE
+                
+                # Promotions gain the value of the new piece
+                if flags & PROMOTION: score += 16 * MATERIAL[(flags & 3) + KNIGHT]
+            elif move == killer_1: score = KILLER_SCORE + 1
+            elif move == killer_2: score = KILLER_SCORE
+            else: score = history[move & 0xFFF]
+            scores[move] = score
+        
+        return sorted(moves, key=scores.__getitem__, reverse=True)
+
+    def loses_material(self, move):
+        """Check if a capture loses material by static exchange evaluation. 
+        Only a capture by a more valuable piece than the captured one can."""
+        squares = self.board.squares
+        victim, attacker = squares[move >> 6 & 63], squares[move & 63]
+        if victim is None or SEE_VALUES[attacker[1]] <= SEE_VALUES[victim[1]]: return False
+        return self.board.see(move) < 0
+
+    def cutoff(self, move, depth, ply, index):
+        """Update the move ordering heuristics after a beta cutoff by the move,
+        the index-th move searched in the node"""
+        self.cutoffs += 1
+        if index == 0: self.first_cutoffs += 1
+        
+        # Captures and promotions are already ordered well
+        if move >> 12 & (CAPTURE | PROMOTION): return
+        
+        killers = self.killers[ply]
+        if killers[0] != move: 
+            killers[1] = killers[0]
+            killers[0] = move
+        
+        history = self.history[self.board.side]
+        history[move & 0xFFF] += depth * depth
+        
+        # Keep the history scores below the killer moves
+        if history[move & 0xFFF] >= HISTORY_LIMIT:
+            for i, value in enumerate(history): history[i] = value >> 1
+
+    def probe_bitbases(self, depth, ply):
+        """Score of an endgame in the bitbases, None if it is not in them.
+
+        Below a root with more pieces the result ends the search of the node. 
+        When the root is in the bitbases, wins and losses are searched to the 
+        horizon, so the search still makes progress to the mate: they are 
+        scored beyond any evaluation, plus the progress of the winning side.
+        """
+        result = self.bitbases.probe(self.board)
+        if result is None or (self.root_in_bitbases and depth > 0 and result != DRAW): return None
+        
+        self.tbhits += 1
+        if result == DRAW: return 0
+        
+        board = self.board
+        if result == LOSS:
+            if not board.legal_moves(): return -MATE + ply
+            return -KNOWN_WIN + self.evaluate() - known_win_progress(board, board.side ^ 1)
+        return KNOWN_WIN + self.evaluate() + known_win_progress(board, board.side)
+
+    def bitbase_moves(self, moves):
+        """Root moves that keep the bitbase result of the position"""
+        board = self.board
+        result = self.bitbases.probe(board)
+        kept = []
+        
+        for move in moves:
+            board.push(move)
+            child = self.bitbases.probe(board)
+            board.pop()
+            if child is None or -child == result: kept.append(move)
+        return kept or list(moves)
+
+    def evaluate(self):
+        """Static evaluation: material and tapered piece-square values,
+        from the point of view of the side to move"""
+        return self.board.evaluate()
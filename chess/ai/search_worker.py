@@ -0,0 +1,190 @@
+import time
+import queue
+import multiprocessing
+from ai.chess_engine import Engine
+from ai.transposition import TranspositionTable
+
+
+def search_jobs(level, hash_mb, jobs, results, current_job, done_job, ponderhit_job, stop_job, iterations,
+                worker_id=0, tt_name=None, tt_size=0):
+    """Main loop of a search process: search every position sent to it.
+
+    A job is aborted as soon as the current job number changes, which
+    happens when the controller cancels the search or starts a new one.
+    A job set as the stop job ends early, but its result is still sent.
+    A ponder job searches without limits until its job number is set as 
+    the ponder hit. Helper processes of a parallel search (worker_id > 0) 
+    search without limits of their own, and stop once the main process 
+    finished the job. The main process sends the info of every finished
+    iteration to the iterations queue.
+    """
+    tt = TranspositionTable.attach(tt_name, tt_size) if tt_name is not None else None
+    engine = Engine(level, hash_mb, tt, worker_id)
+
+    while True:
+        job = jobs.get()
+        if job is None: break
+
+        job_id, bitboard, limits, ponder = job
+        if current_job.value != job_id: continue
+
+        if worker_id == 0:
+            engine.abort = lambda: current_job.value != job_id or stop_job.value == job_id
+            engine.ponderhit = lambda: ponderhit_job.value == job_id
+            engine.iteration = lambda info: iterations.put((job_id, info))
+            move = engine.search(bitboard, ponder=ponder, **limits)
+            done_job.value = job_id
+        else:
+            engine.abort = lambda: current_job.value != job_id or done_job.value == job_id
+            move = engine.search(bitboard, **dict(limits, time_limit=float('inf'), node_limit=float('inf')))
+        results.put((job_id, worker_id, move, engine.info))
+
+    if tt is not None: tt.close()
+
+
+class SearchWorker:
+    """Runs engine searches in background processes, so the game loop
+    keeps drawing frames and handling events while the engine thinks.
+
+    With more than one thread the search is a Lazy SMP search: every process
+    searches the same position, sharing one transposition table in shared
+    memory, and the result of the deepest finished search is played.
+
+    While the opponent thinks, the worker can ponder: search the position 
+    after the predicted reply. If the opponent plays it, the search goes on 
+    with the normal budget (`ponderhit`), otherwise it is cancelled. Either 
+    way its results stay in the transposition table.
+    """
+
+    def __init__(self, level, hash_mb=16, threads=1):
+        """Args:
+            level (int): AI level
+            hash_mb (float): memory size of the engine's transposition table (in MB)
+            threads (int): number of search processes
+        """
+        context = multiprocessing.get_context('spawn')
+
+        self.threads = threads
+        self.jobs = [context.Queue() for _ in range(threads)]
+        self.results = context.Queue()
+        self.current_job = context.RawValue('i', 0)
+        self.done_job = context.RawValue('i', 0)
+        self.ponderhit_job = context.RawValue('i', 0)
+        self.stop_job = context.RawValue('i', 0)
+        self.iterations = context.Queue()
+        self.searching = False
+        self.pondering = False
+
+        # Results of the current job per process
+        self.collected = {}
+
+        self.tt = TranspositionTable(hash_mb, shared=True) if threads > 1 else None
+        tt_name = self.tt.name if self.tt is not None else None
+        tt_size = self.tt.size if self.tt is not None else 0
+
+        self.processes = [context.Process(target=search_jobs,
+                                          args=(level, hash_mb, self.jobs[worker_id], self.results, self.current_job,
+                                                self.done_job, self.ponderhit_job, self.stop_job, self.iterations,
+                                                worker_id, tt_name, tt_size),
+                                          daemon=True)
+                          for worker_id in range(threads)]
+        for process in self.processes: process.start()
+
+    def start(self, bitboard, ponder=False, **limits):
+        """Start searching the position.
+
+        Args:
+            bitboard (BitBoard): position to search
+            ponder (bool): search without limits until `ponderhit` is called
+            limits: time_limit, node_limit and depth_limit of `Engine.search`
+        """
+        # Drop the iterations of the previous search nobody asked for
+        self.progress()
+        self.current_job.value += 1
+        self.collected = {}
+        for jobs in self.jobs: jobs.put((self.current_job.value, bitboard.copy(), limits, ponder))
+        self.searching = True
+        self.pondering = ponder
+
+    def ponderhit(self):
+        """The predicted move was played: the ponder search becomes the search of 
+        the move, with the time and nodes spent pondering counting to its budget"""
+        self.ponderhit_job.value = self.current_job.value
+        self.pondering = False
+
+    def stop(self):
+        """Stop the search early: `poll` returns the best move found so far"""
+        self.stop_job.value = self.current_job.value
+        self.pondering = False
+
+    def progress(self):
+        """Info of the iterations the current search finished since the last call"""
+        infos = []
+        while True:
+            try: job_id, info = self.iterations.get_nowait()
+            except queue.Empty: return infos
+            if job_id == self.current_job.value: infos.append(info)
+
+    def poll(self):
+        """Get the result of the search without waiting for it.
+
+        Returns:
+            tuple: (move, info) when the search is done, otherwise None
+        """
+        while self.searching:
+            try: job_id, worker_id, move, info = self.results.get_nowait()
+            except queue.Empty: return None
+
+            # Results of cancelled searches are ignored
+            if job_id != self.current_job.value: continue
+
+            self.collected[worker_id] = (move, info)
+            if len(self.collected) == self.threads:
+                self.searching = False
+                return self.best_result()
+        return None
+
+    def search(self, bitboard, **limits):
+        """Search the position and wait for the result
+
+        Returns:
+            tuple: (move, info)
+        """
+        self.start(bitboard, **limits)
+        while True:
+            result = self.poll()
+            if result is not None: return result
+            time.sleep(0.005)
+
+    def best_result(self):
+        """Move of the deepest finished search, preferring the main process.
+        The info is the one of that search, with the nodes of all processes."""
+        worker_id = max(self.collected, key=lambda worker_id: (self.collected[worker_id][0] is not None,
+                                                                self.collected[worker_id][1].get('depth', 0),
+                                                                worker_id == 0))
+        move, info = self.collected[worker_id]
+        if self.threads == 1: return move, info
+
+        main_info = self.collected[0][1]
+        info = dict(info)
+        info['nodes'] = sum(result[1].get('nodes', 0) for result in self.collected.values())
+        info['time'] = main_info.get('time', 0)
+        info['nps'] = int(info['nodes'] / info['time']) if info['time'] > 0 else 0
+        info['threads'] = self.threads
+        info['worker'] = worker_id
+        return move, info
+
+    def cancel(self):
+        """Stop the current search and ignore its result"""
+        self.current_job.value += 1
+        self.searching = False
+        self.pondering = False
+
+    def close(self):
+        """Stop the search processes"""
+        self.cancel()
+        for jobs in self.jobs: jobs.put(None)
+        for process in self.processes:
+            process.join(timeout=1)
+            if process.is_alive(): process.terminate()
+        if self.tt is not None: self.tt.close()
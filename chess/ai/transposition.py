@@ -0,0 +1,168 @@
+from array import array
+from multiprocessing import shared_memory
+from model.bitboard import NO_MOVE
+
+
+# Bound types
+EXACT, LOWER, UPPER = 1, 2, 3
+
+# Packing of an entry in one 64-bit integer
+SCORE_OFFSET = 1 << 20
+MOVE_BITS, SCORE_BITS, DEPTH_BITS = 16, 21, 8
+MOVE_MASK = (1 << MOVE_BITS) - 1
+SCORE_MASK = (1 << SCORE_BITS) - 1
+DEPTH_MASK = (1 << DEPTH_BITS) - 1
+
+
+class TranspositionTable:
+    """Fixed-size hash table of search results, keyed by Zobrist hash.
+
+    The table is preallocated as two `array`s of 64-bit integers (keys and
+    packed data), so its memory use does not grow during a game. Each bucket
+    holds two entries: the first is only replaced by a search of at least the
+    same depth, the second is always replaced.
+
+    A shared table lives in a `multiprocessing.shared_memory` block, which the
+    search processes of a parallel search attach to (see `attach`). Processes
+    write entries without locks, so the key is stored XOR-ed with the data:
+    an entry torn by two simultaneous writes does not match its key anymore.
+    """
+
+    ENTRY_SIZE = 16
+
+    def __init__(self, size_mb=16, shared=False):
+        """Args:
+            size_mb (float): memory size of the table (in MB)
+            shared (bool): create the table in shared memory
+        """
+        entries = max(2, int(size_mb * 1024 * 1024) // self.ENTRY_SIZE)
+
+        # Number of buckets is a power of two, so the index is a bit mask of the key
+        buckets = 1 << (entries // 2).bit_length() - 1
+        self.mask = buckets - 1
+        self.size = 2 * buckets
+        
+        self.memory = None
+        self.owner = shared
+        if shared:
+            self.memory = shared_memory.SharedMemory(create=True, size=self.ENTRY_SIZE * self.size)
+            self.map_memory()
+        else:
+            self.keys = array('Q', bytes(8 * self.size))
+            self.data = array('Q', bytes(8 * self.size))
+        self.reset_stats()
+
+    @classmethod
+    def attach(cls, name, size):
+        """Table in the shared memory block created by another process
+
+        Args:
+            name (str): name of the shared memory block
+            size (int): number of entries of the table
+        """
+        table = cls.__new__(cls)
+        table.size = size
+        table.mask = size // 2 - 1
+        table.memory = shared_memory.SharedMemory(name=name)
+        table.owner = False
+        table.map_memory()
+        table.reset_stats()
+        return table
+
+    def map_memory(self):
+        """View the shared memory block as the key and data arrays"""
+        buffer = self.memory.buf
+        self.keys = buffer[:8 * self.size].cast('Q')
+        self.data = buffer[8 * self.size:16 * self.size].cast('Q')
+
+    @property
+    def name(self):
+        """Name of the shared memory block, None if the table is not shared"""
+        return self.memory.name if self.memory is not None else None
+
+    def close(self):
+        """Detach from the shared memory block, and free it if this process created it"""
+        if self.memory is None: return
+        self.keys.release()
+        self.data.release()
+        self.memory.close()
+        if self.owner: self.memory.unlink()
+        self.memory = None
+
+    def reset_stats(self):
+        self.probes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.collisions = 0
+
+    def clear(self):
+        """Remove all entries"""
+        if self.memory is not None: self.memory.buf[:16 * self.size] = bytes(16 * self.size)
+        else:
+            self.keys = array('Q', bytes(8 * self.size))
+            self.data = array('Q', bytes(8 * self.size))
+        self.reset_stats()
+
+    def probe(self, key):
+        """Find the entry of a position.
+
+        Returns:
+            tuple: (depth, bound, score, packed move) or None if the position is not stored
+        """
+        self.probes += 1
+        index = (key & self.mask) << 1
+        keys = self.keys
+        data = self.data[index]
+
+        if keys[index] ^ data != key:
+            data = self.data[index + 1]
+            if keys[index + 1] ^ data != key:
+                self.misses += 1
+                return None
+
+        self.hits += 1
+        return (data >> 2 & DEPTH_MASK,
+                data & 3,
+                (data >> 10 & SCORE_MASK) - SCORE_OFFSET,
+                data >> 31)
+
+    def store(self, key, depth, bound, score, move):
+        """Store the result of a search of a position"""
+        self.stores += 1
+        index = (key & self.mask) << 1
+        keys = self.keys
+        data = self.data
+
+        # Depth-preferred entry, unless the stored search went deeper
+        stored = keys[index] ^ data[index]
+        if stored != key and (data[index] >> 2 & DEPTH_MASK) > depth: 
+            index += 1
+            stored = keys[index] ^ data[index]
+
+        if stored != key and stored != 0: self.collisions += 1
+        elif stored == key and move == NO_MOVE:
+            # Keep the best move of an earlier search of the position
+            move = data[index] >> 31
+
+        entry = (move << 31
+                 | (score + SCORE_OFFSET) << 10
+                 | min(depth, DEPTH_MASK) << 2
+                 | bound)
+        data[index] = entry
+        keys[index] = key ^ entry
+
+    def hashfull(self):
+        """Used share of the entries, in permille (sampled)"""
+        sample = min(self.size, 1000)
+        return sum(1 for index in range(sample) if self.data[index] != 0) * 1000 // sample
+
+    def stats(self):
+        """Counters to size the table"""
+        return {'size': self.size,
+                'probes': self.probes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'stores': self.stores,
+                'collisions': self.collisions,
+                'hashfull': self.hashfull()}
@@ -0,0 +1,41 @@
+"""Benchmark of loading positions from FEN strings.
+
+Times `BitBoard.from_fen` (the search and perft representation) and
+`Board.from_fen` (which also creates the piece objects), and compares them
+with replaying the moves of a game from the start position.
+
+Run from the `chess` directory:
+    python -m benchmarks.fen [repeats]
+"""
+import sys
+import time
+from benchmarks.idle_frame import OPENING
+from benchmarks.movegen import setup_board
+from model.board import Board
+from model.bitboard import BitBoard
+from perft import REFERENCE_POSITIONS
+
+
+def time_load(load, fens, repeats):
+    """Process time (in s) per loaded position"""
+    start = time.process_time()
+    for _ in range(repeats):
+        for fen in fens: load(fen)
+    return (time.process_time() - start) / (repeats * len(fens))
+
+
+def main(repeats=200):
+    fens = [fen for _, fen, _ in REFERENCE_POSITIONS]
+    
+    for name, load in (('BitBoard.from_fen', BitBoard.from_fen), ('Board.from_fen', Board.from_fen)):
+        seconds = time_load(load, fens, repeats)
+        print(f'{name:18} {seconds * 1e6:9.1f} us/position {60 / seconds:12,.0f} positions/min')
+
+    start = time.process_time()
+    for _ in range(max(1, repeats // 20)): setup_board('bitboard', OPENING)
+    seconds = (time.process_time() - start) / max(1, repeats // 20)
+    print(f'{"replay opening":18} {seconds * 1e6:9.1f} us/position {60 / seconds:12,.0f} positions/min')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
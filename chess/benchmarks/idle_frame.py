@@ -0,0 +1,71 @@
+"""Headless benchmark of the CPU time spent per idle frame.
+
+The game loop calls `Chess.update()` every frame. This benchmark mimics that
+loop on a board without a display and compares recomputing the possible moves
+every frame (the old behaviour) with recomputing them once per move.
+
+Run from the `chess` directory:
+    python -m benchmarks.idle_frame [frames]
+"""
+import sys
+import time
+from model.board import Board
+
+
+OPENING = [[(4, 1), (4, 3)], [(4, 6), (4, 4)],
+           [(6, 0), (5, 2)], [(1, 7), (2, 5)],
+           [(5, 0), (2, 3)], [(6, 7), (5, 5)]]
+
+
+def setup_board():
+    """Board after a few opening moves"""
+    board = Board(is_flipped=False)
+    board.update_possible_moves()
+    
+    for move in OPENING:
+        (x1, y1), _ = move
+        piece = board.position[y1][x1]
+        board.move_piece(board.current_color, piece, move)
+        board.update_possible_moves()
+        board.next_turn(piece, move)
+        board.update_possible_moves()
+    return board
+
+
+def check_for_game_end(board):
+    """Same work as `Chess.check_for_game_end`"""
+    for _, state in board.end_conditions.items():
+        if state: return True
+    return False
+
+
+def idle_frames(board, frames, cached):
+    """Process time (in s) per idle frame"""
+    start = time.process_time()
+    checked_generation = None
+    
+    for _ in range(frames):
+        if not cached: board.invalidate()
+        board.update_possible_moves()
+        
+        if not cached or checked_generation != board.generation:
+            checked_generation = board.generation
+            check_for_game_end(board)
+    
+    return (time.process_time() - start) / frames
+
+
+def main(frames=400):
+    board = setup_board()
+    
+    before = idle_frames(board, frames, cached=False)
+    after = idle_frames(board, frames, cached=True)
+    
+    print(f'Frames:                    {frames}')
+    print(f'Recompute every frame:     {before * 1e6:10.1f} us CPU/frame')
+    print(f'Recompute once per move:   {after * 1e6:10.1f} us CPU/frame')
+    print(f'Share of 25 ms frame (40 FPS): {100 * before / 0.025:.1f}% -> {100 * after / 0.025:.3f}%')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 400)
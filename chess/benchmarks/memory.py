@@ -0,0 +1,63 @@
+"""Memory benchmark of the board representation.
+
+Measures the bytes held by a new `Board` (piece and square objects, 
+bitboards and game state) and the memory a move costs: the bytes and 
+memory blocks still held after the move (the board and its undo record), 
+and the peak of the memory allocated while the move is made and the 
+possible moves are updated.
+
+Run from the `chess` directory:
+    python -m benchmarks.memory [repeats]
+"""
+import sys
+import tracemalloc
+from benchmarks.idle_frame import OPENING
+from model.board import Board
+
+
+def board_size(backend):
+    """Bytes allocated to create a board"""
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    board = Board(is_flipped=False, backend=backend)
+    size = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    return size, board
+
+
+def move_cost(backend):
+    """Average (retained bytes, retained blocks, peak bytes) per move of the opening"""
+    board = Board(is_flipped=False, backend=backend)
+    board.update_possible_moves()
+    retained = blocks = peak = 0
+    
+    tracemalloc.start()
+    for move in OPENING:
+        move = board.find_move(move)
+        tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+        start_blocks = sys.getallocatedblocks()
+        
+        board.push(move)
+        board.update_possible_moves()
+        
+        current, move_peak = tracemalloc.get_traced_memory()
+        retained += current - start
+        blocks += sys.getallocatedblocks() - start_blocks
+        peak += move_peak - start
+    tracemalloc.stop()
+    
+    moves = len(OPENING)
+    return retained / moves, blocks / moves, peak / moves
+
+
+def main(repeats=5):
+    for backend in Board.BACKENDS:
+        size = min(board_size(backend)[0] for _ in range(repeats))
+        retained, blocks, peak = min(move_cost(backend) for _ in range(repeats))
+        print(f'{backend:9} {size:9,} bytes/board {retained:9,.0f} bytes/move retained '
+              f'{blocks:7,.1f} blocks/move {peak:9,.0f} bytes/move peak')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,52 @@
+"""Benchmark of legal move generation per backend.
+
+Times a full `Board.update_possible_moves()` on the same positions with the
+'objects' backend (piece objects walking the squares) and the 'bitboard'
+backend (precomputed attack tables).
+
+Run from the `chess` directory:
+    python -m benchmarks.movegen [repeats]
+"""
+import sys
+import time
+from benchmarks.idle_frame import OPENING
+from model.board import Board
+
+
+def setup_board(backend, moves):
+    board = Board(is_flipped=False, backend=backend)
+    board.update_possible_moves()
+    
+    for move in moves:
+        (x1, y1), _ = move
+        piece = board.position[y1][x1]
+        board.move_piece(board.current_color, piece, move)
+        board.update_possible_moves()
+        board.next_turn(piece, move)
+        board.update_possible_moves()
+    return board
+
+
+def time_update(board, repeats):
+    """Process time (in s) per `update_possible_moves`"""
+    start = time.process_time()
+    for _ in range(repeats):
+        board.invalidate()
+        board.update_possible_moves()
+    return (time.process_time() - start) / repeats
+
+
+def main(repeats=200):
+    positions = {'start': [], 'opening': OPENING}
+    
+    for name, moves in positions.items():
+        results = {}
+        for backend in Board.BACKENDS:
+            board = setup_board(backend, moves)
+            results[backend] = time_update(board, repeats)
+            print(f'{name:8} {backend:9} {results[backend] * 1e6:9.1f} us/update')
+        print(f'{name:8} speedup   {results["objects"] / results["bitboard"]:9.1f}x')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,45 @@
+"""Benchmark of the parallel (Lazy SMP) search.
+
+Searches a set of positions for a fixed time with 1, 2, 4, ... search 
+processes (up to the number of CPU cores, or the given maximum) and reports 
+the depth reached and the nodes searched by all processes together. The 
+speedup is the number of nodes searched relative to one process; with a 
+shared transposition table, more nodes in the same time lets the main 
+process reach deeper.
+
+Run from the `chess` directory:
+    python -m benchmarks.smp [time per position in s] [max threads]
+"""
+import os
+import sys
+from ai.search_worker import SearchWorker
+from benchmarks.search import POSITIONS
+from model.bitboard import BitBoard
+
+
+def thread_counts(max_threads):
+    threads = 1
+    while threads < max_threads:
+        yield threads
+        threads *= 2
+    yield max_threads
+
+
+def main(time_limit=2.0, max_threads=None):
+    max_threads = max_threads or os.cpu_count() or 1
+    print(f'{os.cpu_count()} CPU cores, {time_limit:.1f} s per position')
+    single = {}
+    
+    for threads in thread_counts(max_threads):
+        worker = SearchWorker(level=3, threads=threads)
+        for name, fen in POSITIONS.items():
+            _, info = worker.search(BitBoard.from_fen(fen), time_limit=time_limit, node_limit=float('inf'))
+            if threads == 1: single[name] = info['nodes']
+            print(f"{name:11} {threads:3} threads depth {info['depth']:3} {info['nodes']:9,} nodes "
+                  f"{info['nps']:8,} nodes/s speedup {info['nodes'] / single[name]:5.2f}x")
+        worker.close()
+
+
+if __name__ == '__main__':
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 2.0,
+         int(sys.argv[2]) if len(sys.argv) > 2 else None)
@@ -1,6 +1,16 @@
+import os
+import time
 from model.pieces import Empty
+from model.pgn import read_games, write_game
 from view.view import GameView
 from model.board import Board
+from ai.chess_engine import format_info
+from ai.search_worker import SearchWorker
+from ai.book import OpeningBook, BOOK_PATH
+
+
+# File the game is saved to and loaded from
+PGN_PATH = 'game.pgn'
 
 
 class Chess:
@@ -14,6 +24,7 @@ class Chess:
         self.play = True
         self.status = 'start_screen'
         self.win_condition = None
+        self.checked_generation = None
         
         self.move = []
         
@@ -30,7 +41,13 @@ class Chess:
         # Settings
         self.settings = {'flip': False, 
                          'vs_computer': False, 
-                         'ai_level': 1}
+                         'ai_level': 1,
+                         'hash_mb': 16,
+                         'threads': 1,
+                         'ponder': True,
+                         'show_hanging': False,
+                         'book': BOOK_PATH,
+                         'pgn': PGN_PATH}
 
         # View
         self.view = GameView()
@@ -38,6 +55,15 @@ class Chess:
         # Board
         self.board = None
         
+        # AI: the engine searches in background processes, more than one
+        # thread searches in parallel (Lazy SMP). While the human thinks, the
+        # engine searches the position after the reply it expects (pondering)
+        self.worker = None
+        self.ponder_move = None
+        
+        # Opening book of the AI, if one was built
+        self.book = None
+        
     def process_click(self, x, y, is_up=False):
         """The main method of the controller.
         This method determines in which phase of the game we are and 
@@ -110,15 +136,21 @@ class Chess:
         """The game is started with the selected settings.
         The default settings are: human vs. human."""
 
+        self.stop_ai()
+        
         # Change starting screen to Chess board
-        self.board = Board(square_width=self.view.square_width, 
-                           square_height=self.view.square_height,
-                           is_flipped=self.is_flipped)
+        self.board = Board(is_flipped=self.is_flipped)
 
         # Create players
         self.board.player_list.append('Human')
         
-        if self.settings['vs_computer']: self.board.player_list.append('AI')
+        if self.settings['vs_computer']: 
+            self.board.player_list.append('AI')
+            self.worker = SearchWorker(level=self.settings['ai_level'], 
+                                       hash_mb=self.settings['hash_mb'],
+                                       threads=self.settings['threads'])
+            if self.book is None and os.path.exists(self.settings['book']): 
+                self.book = OpeningBook(self.settings['book'])
         else: self.board.player_list.append('Human') 
         
     def play_game(self, mouse_x, mouse_y, is_up):
@@ -138,21 +170,21 @@ class Chess:
                  or self.view.resign_game_button.is_clicked(mouse_x, mouse_y))): 
                 self.new_game(mouse_x, mouse_y)
 
+        # The pieces can not be moved while the computer is thinking
+        elif self.is_ai_turn(): return
+
         elif is_up and self.is_clicked:
             # Check possible moves, and if possible
             # make the move.
             self.board.moves = self.is_clicked.valid_moves
             if (square.x, square.y) != self.left_click:
                 self.move = [self.left_click, (square.x, square.y)]
+                move = self.board.find_move(self.move) if self.is_clicked.can_move else None
                 
-                if (self.is_clicked.can_move 
-                    and self.move in self.is_clicked.valid_moves):
-                    self.board.move_piece(color=self.board.current_color, 
-                                          moving_piece=self.is_clicked, 
-                                          move=self.move)
-                    self.update()                    
-                    self.board.next_turn(self.is_clicked, self.move)
+                if move is not None:
+                    self.board.push(move)
                     if self.settings['flip']: self.board.is_flipped = not self.board.is_flipped
+                    if self.worker is not None and self.worker.pondering: self.stop_pondering(move)
                                         
                 self.board.moves = []
                 self.is_clicked = None
@@ -210,38 +242,181 @@ class Chess:
         # Mouse button is pressed
         else: self.right_click = (x, y)          
 
+    def takeback(self):
+        """Take back the last move. When playing against the computer, 
+        its reply is taken back as well, so the human is to move again."""
+        if self.status != 'game' or not self.board.undo_stack: return
+        if self.worker is not None: self.worker.cancel()
+        
+        self.board.pop()
+        if self.settings['flip']: self.board.is_flipped = not self.board.is_flipped
+        
+        if (self.board.player_list[self.board.current_player] == 'AI' 
+            and self.board.undo_stack):
+            self.board.pop()
+            if self.settings['flip']: self.board.is_flipped = not self.board.is_flipped
+        
+        self.board.moves = []
+        self.is_clicked = None
+        self.is_dragged = None
+
+    def toggle_hanging_pieces(self):
+        """Show or hide the marks on the hanging pieces of the side to move"""
+        self.settings['show_hanging'] = not self.settings['show_hanging']
+
+    def save_game(self):
+        """Save the moves of the game to the PGN file, so it can be loaded 
+        again or opened with other chess software"""
+        if self.status not in ('game', 'replay'): return
+        
+        white, black = self.board.player_list
+        tags = {'Event': 'Casual game', 'Date': time.strftime('%Y.%m.%d'), 'White': white, 'Black': black}
+        with open(self.settings['pgn'], 'w') as file: write_game(file, self.board.to_game(tags))
+        print(f"Game saved to {self.settings['pgn']}")
+
+    def load_game(self):
+        """Replace the game by the first game of the PGN file, with the same players"""
+        if self.status != 'game': return
+        if not os.path.exists(self.settings['pgn']):
+            print(f"No game in {self.settings['pgn']}")
+            return
+        
+        with open(self.settings['pgn'], encoding='utf-8', errors='replace') as file:
+            game = next(read_games(file), None)
+        if game is None:
+            print(f"No game in {self.settings['pgn']}")
+            return
+        if game.error is not None:
+            print(f"Invalid game in {self.settings['pgn']}: {game.error}")
+            return
+        
+        if self.worker is not None: self.worker.cancel()
+        self.ponder_move = None
+        
+        board = Board.from_game(game)
+        board.player_list = self.board.player_list
+        board.is_flipped = self.is_flipped != (self.settings['flip'] and board.current_player == 1)
+        self.board = board
+        
+        self.checked_generation = None
+        self.is_clicked = None
+        self.is_dragged = None
+        print(f"Game loaded from {self.settings['pgn']}")
+
+    def is_ai_turn(self):
+        """Check if the computer is to move"""
+        return (self.status == 'game' 
+                and self.board.player_list[self.board.current_player] == 'AI')
+
+    def is_thinking(self):
+        """Check if the engine is searching a move (pondering does not count)"""
+        return self.worker is not None and self.worker.searching and not self.worker.pondering
+
     def ai_move(self):
-        """"""
-        pass
+        """Let the engine search the best move within the time and node 
+        budget of the AI level, and play it once the search is done. 
+        The search runs in the worker process, this method only polls it.
+        Positions in the opening book are played from the book, without search."""
+        if not self.worker.searching: 
+            move = self.book.probe(self.board.bitboard) if self.book is not None else None
+            if move is not None:
+                print('AI: book move')
+                self.board.push(move)
+                if self.settings['flip']: self.board.is_flipped = not self.board.is_flipped
+                return
+            
+            self.worker.start(self.board.bitboard)
+            return
+        
+        result = self.worker.poll()
+        if result is None: return
+        
+        move, info = result
+        print('AI: ' + format_info(info))
+        if move is None: return
+        
+        self.board.push(move)
+        if self.settings['flip']: self.board.is_flipped = not self.board.is_flipped
+        self.start_pondering(info.get('ponder'))
+
+    def start_pondering(self, move):
+        """Search the position after the expected reply of the human, 
+        the second move of the principal variation, during the human's turn"""
+        self.ponder_move = None
+        if not self.settings['ponder'] or not move: return
+        
+        # No pondering when the move of the engine ended the game, e.g. by repetition
+        if any(self.board.end_conditions.values()): return
+        
+        bitboard = self.board.bitboard.copy()
+        if move not in bitboard.legal_moves(): return
+        bitboard.push(move)
+        if not bitboard.legal_moves(): return
+        
+        self.ponder_move = move
+        self.worker.start(bitboard, ponder=True)
+
+    def stop_pondering(self, move):
+        """The human played a move while the engine was pondering. If it was the
+        expected one, the ponder search goes on as the search of the reply, 
+        otherwise it is cancelled and the reply is searched from scratch."""
+        if move == self.ponder_move: self.worker.ponderhit()
+        else: self.worker.cancel()
+        self.ponder_move = None
     
     def update(self):
-        """"""
+        """Update possible moves and game state. Both are only recomputed
+        when the position on the board changed since the last frame."""
         if self.status == 'game':
             self.board.update_possible_moves()
             self.check_for_game_end()
+            if self.is_ai_turn(): self.ai_move()
                 
     def check_for_game_end(self):
-        """"""
+        """Check the end conditions once per position"""
+        if self.checked_generation == self.board.generation: return
+        self.checked_generation = self.board.generation
+        
         for condition, state in self.board.end_conditions.items():
             if state: 
                 self.win_condition = condition
                 self.status = 'replay'
+                
+                # The engine may be pondering the position after its last move
+                if self.worker is not None: self.worker.cancel()
+                self.ponder_move = None
                 break
 
+    def stop_ai(self):
+        """Stop the engine, e.g. when the game ends or the application is closed"""
+        if self.worker is not None:
+            self.worker.close()
+            self.worker = None
+
     def new_game(self, x, y):
         """"""
+        # End conditions change without a move, so check them again
+        self.checked_generation = None
+        if self.worker is not None: self.worker.cancel()
+        
         if self.view.draw_game_button.is_clicked(x, y): 
             self.board.end_conditions['draw_agreed'] = True
             self.board.winner = 'Draw'
             
         if self.view.resign_game_button.is_clicked(x, y): 
             self.board.end_conditions['resignation'] = True
-            winner = 1 if self.board.current_player == 0 else 0
+            
+            # Against the computer, it is always the human who resigns
+            resigning = self.board.player_list.index('Human') if self.settings['vs_computer'] else self.board.current_player
+            winner = 1 if resigning == 0 else 0
             self.board.winner = ['White', 'Black'][winner]
     
     def play_again(self, x, y):
-        if self.view.play_again_button.is_clicked(x, y): self.status = 'start_screen'
+        if self.view.play_again_button.is_clicked(x, y): 
+            self.stop_ai()
+            self.status = 'start_screen'
         if self.view.nomore_game_button.is_clicked(x, y): 
+            self.stop_ai()
             self.status = 'end_game'
             self.play = False
 
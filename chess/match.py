@@ -0,0 +1,317 @@
+"""Self-play match between two engine configurations, to measure whether a
+change makes the AI stronger.
+
+Games are played in parallel on a process pool (one process per core by
+default), in pairs from the opening positions of a file (by default a built-in
+set of common openings), so each engine plays every opening with both colors.
+Engines limited by nodes or depth play the same game from the same opening,
+so a match should not have more games than twice the number of openings. The games are written to a PGN file
+and the result is reported as an Elo difference with its 95% error bars.
+With --sprt the match stops as soon as a sequential probability ratio test
+accepts one of the hypotheses "elo1 better" or "elo0 better".
+
+An engine is a comma separated list of options:
+    level=N      AI level (default 1), sets the limits that are not given
+    time=S       time per move (in s)
+    nodes=N      nodes per move
+    depth=N      depth per move
+    hash=MB      transposition table size (default 16)
+    cmd=COMMAND  run an external UCI engine, e.g. another checkout:
+                 cmd=python ../../old/chess/uci.py
+    name=NAME    name in the PGN
+
+Usage (from the `chess` directory):
+    python match.py level=2 level=1 --games 200 --openings openings.epd
+    python match.py nodes=4000 nodes=2000 --sprt --elo0 0 --elo1 20
+"""
+import os
+import math
+import time
+import shlex
+import argparse
+import subprocess
+import multiprocessing
+from model.bitboard import BitBoard, START_FEN, WHITE, move_name
+from model.pgn import Game, write_game
+from ai.chess_engine import Engine
+from ai.bitbase import Bitbases, WIN, LOSS
+
+
+# Games longer than this are adjudicated as draws
+MAX_PLIES = 400
+
+# PGN results by the points of white
+RESULTS = {1: '1-0', 0.5: '1/2-1/2', 0: '0-1'}
+
+# Default openings: the first moves of common openings, in long algebraic notation
+OPENINGS = ('e2e4 e7e5 g1f3 b8c6 f1b5 a7a6',
+            'e2e4 e7e5 g1f3 b8c6 f1c4 f8c5',
+            'e2e4 e7e5 g1f3 g8f6 f3e5 d7d6',
+            'e2e4 e7e5 b1c3 g8f6 f2f4 d7d5',
+            'e2e4 c7c5 g1f3 d7d6 d2d4 c5d4',
+            'e2e4 c7c5 g1f3 b8c6 d2d4 c5d4',
+            'e2e4 c7c5 b1c3 b8c6 g2g3 g7g6',
+            'e2e4 e7e6 d2d4 d7d5 b1c3 f8b4',
+            'e2e4 e7e6 d2d4 d7d5 e4e5 c7c5',
+            'e2e4 c7c6 d2d4 d7d5 e4e5 c8f5',
+            'e2e4 d7d5 e4d5 d8d5 b1c3 d5a5',
+            'e2e4 d7d6 d2d4 g8f6 b1c3 g7g6',
+            'd2d4 d7d5 c2c4 e7e6 b1c3 g8f6',
+            'd2d4 d7d5 c2c4 c7c6 g1f3 g8f6',
+            'd2d4 d7d5 c2c4 d5c4 g1f3 g8f6',
+            'd2d4 g8f6 c2c4 g7g6 b1c3 f8g7',
+            'd2d4 g8f6 c2c4 e7e6 b1c3 f8b4',
+            'd2d4 g8f6 c2c4 e7e6 g1f3 b7b6',
+            'd2d4 g8f6 c2c4 c7c5 d4d5 b7b5',
+            'd2d4 f7f5 g2g3 g8f6 f1g2 g7g6',
+            'c2c4 e7e5 b1c3 g8f6 g1f3 b8c6',
+            'c2c4 c7c5 g1f3 g8f6 b1c3 b8c6',
+            'g1f3 d7d5 g2g3 g8f6 f1g2 c7c6',
+            'g1f3 g8f6 c2c4 g7g6 b2b3 f8g7')
+
+# Engines of the process playing the games, by configuration
+_engines = {}
+_bitbases = None
+
+
+class UCIEngine:
+    """External engine speaking UCI. It quits when the process of the pool that
+    started it ends, as its input is closed."""
+
+    def __init__(self, command):
+        self.process = subprocess.Popen(shlex.split(command), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL, text=True, bufsize=1)
+        self.send('uci')
+        self.wait_for('uciok')
+
+    def send(self, line):
+        self.process.stdin.write(line + '\n')
+        self.process.stdin.flush()
+
+    def wait_for(self, prefix):
+        for line in self.process.stdout:
+            if line.startswith(prefix): return line.split()
+        raise RuntimeError('UCI engine stopped')
+
+    def new_game(self):
+        self.send('ucinewgame')
+        self.send('isready')
+        self.wait_for('readyok')
+
+    def search(self, fen, moves, limits):
+        """Best move (in long algebraic notation) of the position after the moves"""
+        self.send(f"position fen {fen} moves {' '.join(moves)}" if moves else f'position fen {fen}')
+
+        # Like the engines of this process, the limits not given are the ones of the level
+        level_time, level_nodes = Engine.LEVELS[limits['level']]
+        command = f"go movetime {int(1000 * limits.get('time', level_time))} nodes {limits.get('nodes', level_nodes)}"
+        if 'depth' in limits: command += f" depth {limits['depth']}"
+        self.send(command)
+        return self.wait_for('bestmove')[1]
+
+
+def parse_engine(spec):
+    """Engine configuration of a command line spec, e.g. 'level=2,nodes=5000'"""
+    config = {'level': 1, 'hash': 16}
+    for option in spec.split(','):
+        key, _, value = option.partition('=')
+        if key in ('level', 'nodes', 'depth', 'hash'): config[key] = int(value)
+        elif key == 'time': config[key] = float(value)
+        elif key in ('cmd', 'name'): config[key] = value
+        else: raise ValueError(f'Unknown engine option: {key}')
+    config.setdefault('name', spec)
+    return config
+
+
+def get_engine(config):
+    """Engine of a configuration, created once per process"""
+    key = tuple(sorted(config.items()))
+    if key not in _engines:
+        if 'cmd' in config: _engines[key] = UCIEngine(config['cmd'])
+        else: _engines[key] = Engine(config['level'], config['hash'])
+    return _engines[key]
+
+
+def default_openings():
+    """FEN of the positions after the moves of `OPENINGS`"""
+    openings = []
+    for line in OPENINGS:
+        board = BitBoard.from_fen(START_FEN)
+        for name in line.split(): board.push(board.parse_move(name))
+        openings.append(board.to_fen())
+    return openings
+
+
+def read_openings(path):
+    """FEN of the positions of an EPD or FEN file, one per line"""
+    openings = []
+    with open(path) as file:
+        for line in file:
+            fields = line.split()
+            if not fields or line.startswith('#'): continue
+
+            # EPD lines have no move counters, but can have operations
+            if len(fields) >= 6 and fields[4].isdigit() and fields[5].isdigit(): fen = ' '.join(fields[:6])
+            else: fen = ' '.join(fields[:4]) + ' 0 1'
+            BitBoard.from_fen(fen)
+            openings.append(fen)
+    return openings
+
+
+def repetitions(board):
+    """Number of earlier occurrences of the position"""
+    stack = board.stack
+    return sum(stack[-ply][5] == board.hash for ply in range(2, min(board.halfmove, len(stack)) + 1, 2))
+
+
+def play_game(game):
+    """Play a game in a process of the pool.
+
+    Args:
+        game (tuple): (number, opening FEN, white config, black config)
+
+    Returns:
+        tuple: (number, white points, termination, packed moves)
+    """
+    global _bitbases
+    if _bitbases is None: _bitbases = Bitbases()
+
+    number, fen, white, black = game
+    board = BitBoard.from_fen(fen)
+    configs = (white, black)
+    engines = [get_engine(config) for config in configs]
+    for engine in engines:
+        if isinstance(engine, UCIEngine): engine.new_game()
+        else:
+            engine.tt.clear()
+            engine.history = [[0] * 4096, [0] * 4096]
+
+    moves, names = [], []
+    while True:
+        legal_moves = board.legal_moves()
+        if not legal_moves:
+            if board.in_check(board.side): return number, 0 if board.side == WHITE else 1, 'normal', moves
+            return number, 0.5, 'normal', moves
+        if board.halfmove >= 100 or repetitions(board) >= 2: return number, 0.5, 'normal', moves
+        if len(moves) >= MAX_PLIES: return number, 0.5, 'adjudication', moves
+
+        # Endgames in the bitbases are adjudicated, with bare kings and minor pieces drawn
+        result = _bitbases.probe(board)
+        if result is not None:
+            points = 0.5 if result not in (WIN, LOSS) else (result == WIN) == (board.side == WHITE)
+            return number, float(points), 'adjudication', moves
+
+        config, engine = configs[board.side], engines[board.side]
+        limits = {key: config[key] for key in ('time', 'nodes', 'depth', 'level') if key in config}
+        if isinstance(engine, UCIEngine):
+            move = board.parse_move(engine.search(fen, names, limits))
+        else:
+            move = engine.search(board, limits.get('time'), limits.get('nodes'), limits.get('depth'))
+
+        moves.append(move)
+        names.append(move_name(move))
+        board.push(move)
+
+
+def elo(score):
+    """Elo difference of a score (between 0 and 1)"""
+    if score <= 0: return -math.inf
+    if score >= 1: return math.inf
+    return -400 * math.log10(1 / score - 1)
+
+
+def score_variance(wins, draws, losses):
+    """Mean and variance of the score of a game"""
+    games = wins + draws + losses
+    score = (wins + draws / 2) / games
+    return score, (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+
+
+def elo_interval(wins, draws, losses):
+    """Elo difference and its 95% error (in Elo) from the game results"""
+    score, variance = score_variance(wins, draws, losses)
+    if score in (0, 1): return elo(score), math.inf
+    games = wins + draws + losses
+    error = 1.96 * math.sqrt(variance / games)
+
+    # The bounds are kept half a game from a perfect score, where the Elo difference is infinite
+    low, high = max(score - error, 0.5 / games), min(score + error, 1 - 0.5 / games)
+    return elo(score), (elo(high) - elo(low)) / 2
+
+
+def sprt_llr(wins, draws, losses, elo0, elo1):
+    """Log-likelihood ratio of H1 (elo1) against H0 (elo0), with a normal
+    approximation of the game scores. Half a game of every result is added,
+    so the variance of one-sided results is not 0."""
+    wins, draws, losses = wins + 0.5, draws + 0.5, losses + 0.5
+    score, variance = score_variance(wins, draws, losses)
+    score0, score1 = 1 / (1 + 10 ** (-elo0 / 400)), 1 / (1 + 10 ** (-elo1 / 400))
+    return (wins + draws + losses) * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play a self-play match between two engine configurations')
+    parser.add_argument('engine1', type=parse_engine, help='engine to test, e.g. level=2 or nodes=5000,name=new')
+    parser.add_argument('engine2', type=parse_engine, help='reference engine')
+    parser.add_argument('--games', type=int, default=100, help='maximum number of games')
+    parser.add_argument('--openings', help='EPD or FEN file of the opening positions')
+    parser.add_argument('--pgn', default='match.pgn', help='PGN file of the games')
+    parser.add_argument('--concurrency', type=int, default=os.cpu_count(), help='number of games played at once')
+    parser.add_argument('--sprt', action='store_true', help='stop when the SPRT accepts a hypothesis')
+    parser.add_argument('--elo0', type=float, default=0, help='Elo difference of H0')
+    parser.add_argument('--elo1', type=float, default=10, help='Elo difference of H1')
+    parser.add_argument('--alpha', type=float, default=0.05, help='false positive rate')
+    parser.add_argument('--beta', type=float, default=0.05, help='false negative rate')
+    args = parser.parse_args()
+
+    if args.engine1['name'] == args.engine2['name']: args.engine2['name'] += ' (2)'
+    openings = read_openings(args.openings) if args.openings else default_openings()
+    if args.games > 2 * len(openings):
+        print(f'Warning: {args.games} games from {len(openings)} openings, engines limited by nodes or depth '
+              f'repeat their games')
+
+    # Game pairs: every opening is played with both colors
+    games = []
+    for number in range(args.games):
+        fen = openings[number // 2 % len(openings)]
+        white, black = (args.engine1, args.engine2) if number % 2 == 0 else (args.engine2, args.engine1)
+        games.append((number, fen, white, black))
+
+    lower, upper = math.log(args.beta / (1 - args.alpha)), math.log((1 - args.beta) / args.alpha)
+    wins = draws = losses = 0
+    start = time.time()
+
+    context = multiprocessing.get_context('spawn')
+    with open(args.pgn, 'w') as pgn, context.Pool(args.concurrency) as pool:
+        for number, points, termination, moves in pool.imap_unordered(play_game, games):
+            _, fen, white, black = games[number]
+            tags = {'Event': 'Self-play match', 'Date': time.strftime('%Y.%m.%d'), 'Round': number + 1,
+                    'White': white['name'], 'Black': black['name'], 'Termination': termination}
+            if fen != START_FEN: tags.update(SetUp='1', FEN=fen)
+            write_game(pgn, Game(tags, moves, RESULTS[points]))
+            pgn.flush()
+
+            engine1_points = points if white is args.engine1 else 1 - points
+            if engine1_points == 1: wins += 1
+            elif engine1_points == 0: losses += 1
+            else: draws += 1
+
+            difference, error = elo_interval(wins, draws, losses)
+            summary = (f'Games {wins + draws + losses}: +{wins} -{losses} ={draws}  '
+                       f'Elo {difference:.1f} +/- {error:.1f}')
+            if args.sprt:
+                llr = sprt_llr(wins, draws, losses, args.elo0, args.elo1)
+                summary += f'  LLR {llr:.2f} ({lower:.2f}, {upper:.2f})'
+            print(summary, flush=True)
+
+            if args.sprt and not lower < llr < upper:
+                print(f"SPRT: H{1 if llr >= upper else 0} accepted "
+                      f"(elo {args.elo1 if llr >= upper else args.elo0:g})")
+                pool.terminate()
+                break
+
+    print(f'{wins + draws + losses} games in {time.time() - start:.1f} s, written to {args.pgn}')
+
+
+if __name__ == '__main__':
+    main()
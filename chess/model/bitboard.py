@@ -0,0 +1,1063 @@
+"""Bitboard representation of a chess position.
+
+Every square is one bit of a 64-bit integer (a1 = bit 0, h1 = bit 7,
+a8 = bit 56), so the square index of board coordinate (x, y) is y * 8 + x.
+Attacks of knights, kings and pawns come from precomputed tables, attacks of
+sliding pieces from occupancy-indexed lookup tables (magic bitboards with the
+Python dict hash taking the place of the magic multiplication).
+"""
+import random
+from array import array
+from model.values import MIDDLEGAME_TABLES, ENDGAME_TABLES, MATERIAL, PHASE_WEIGHTS, MAX_PHASE
+
+WHITE, BLACK = 0, 1
+COLORS = 'wb'
+
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+SYMBOLS = 'PNBRQK'
+
+# Castling rights
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+
+# Packed moves: 16-bit integers of the from square (bits 0-5), the to square 
+# (bits 6-11) and move flags (bits 12-15). Promotions are PROMOTION plus the 
+# piece type minus KNIGHT, with the CAPTURE bit set when they capture.
+QUIET, DOUBLE_PUSH, KING_CASTLE, QUEEN_CASTLE, CAPTURE, EN_PASSANT = 0, 1, 2, 3, 4, 5
+PROMOTION = 8
+NO_MOVE = 0
+
+# Move flags of the promotions, best piece first
+PROMOTIONS = [PROMOTION | piece_type - KNIGHT for piece_type in (QUEEN, ROOK, BISHOP, KNIGHT)]
+CAPTURE_PROMOTIONS = [flags | CAPTURE for flags in PROMOTIONS]
+
+# Flags (shifted into place) of a move to an empty square and of a capture
+CAPTURE_FLAGS = (QUIET << 12, CAPTURE << 12)
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+FULL = 0xFFFF_FFFF_FFFF_FFFF
+SQUARE_BB = [1 << sq for sq in range(64)]
+
+RANK_1 = 0xFF
+RANK_8 = RANK_1 << 56
+FILE_A = 0x0101_0101_0101_0101
+FILE_H = FILE_A << 7
+
+ROOK_DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+BISHOP_DIRECTIONS = ((1, 1), (-1, -1), (1, -1), (-1, 1))
+KNIGHT_JUMPS = ((1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2))
+KING_STEPS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+
+
+def square(x, y):
+    """Square index of board coordinate (x, y)"""
+    return y * 8 + x
+
+
+def square_xy(sq):
+    """Board coordinate (x, y) of square index"""
+    return sq & 7, sq >> 3
+
+
+def square_name(sq):
+    """Name of square index, e.g. 'e4'"""
+    return 'abcdefgh'[sq & 7] + str((sq >> 3) + 1)
+
+
+def encode_move(from_sq, to_sq, flags=QUIET):
+    """Packed move of from square, to square and move flags"""
+    return from_sq | to_sq << 6 | flags << 12
+
+
+def move_promotion(move):
+    """Piece type a pawn promotes to, None if the move is no promotion"""
+    flags = move >> 12
+    return (flags & 3) + KNIGHT if flags & PROMOTION else None
+
+
+def move_name(move):
+    """Long algebraic notation of a move, e.g. 'e2e4' or 'e7e8q'"""
+    name = square_name(move & 63) + square_name(move >> 6 & 63)
+    promotion = move_promotion(move)
+    if promotion is not None: name += SYMBOLS[promotion].lower()
+    return name
+
+
+def move_xy(move):
+    """Board coordinates of a move, [(x1, y1), (x2, y2)]"""
+    return [square_xy(move & 63), square_xy(move >> 6 & 63)]
+
+
+def squares(bb):
+    """Iterate over the square indices of the set bits"""
+    while bb:
+        lsb = bb & -bb
+        yield lsb.bit_length() - 1
+        bb ^= lsb
+
+
+def popcount(bb):
+    return bin(bb).count('1')
+
+
+def append_moves(append, from_sq, to_squares, enemy):
+    """Append the packed moves from a square to the squares of a mask, captures
+    where the mask meets the enemy pieces. The loop is inlined rather than
+    iterating `squares`, as this is the inner loop of move generation."""
+    while to_squares:
+        lsb = to_squares & -to_squares
+        append(from_sq | (lsb.bit_length() - 1) << 6 | CAPTURE_FLAGS[lsb & enemy != 0])
+        to_squares ^= lsb
+
+
+def _step_attacks(steps):
+    """Attack table of pieces that move a single step (knight, king)"""
+    table = []
+    for sq in range(64):
+        x, y = square_xy(sq)
+        attacks = 0
+        for dx, dy in steps:
+            if 0 <= x + dx <= 7 and 0 <= y + dy <= 7: attacks |= SQUARE_BB[square(x + dx, y + dy)]
+        table.append(attacks)
+    return table
+
+
+def _pawn_attacks():
+    """Pawn capture tables for white and black"""
+    table = [[], []]
+    for color, dy in ((WHITE, 1), (BLACK, -1)):
+        for sq in range(64):
+            x, y = square_xy(sq)
+            attacks = 0
+            if 0 <= y + dy <= 7:
+                if x > 0: attacks |= SQUARE_BB[square(x - 1, y + dy)]
+                if x < 7: attacks |= SQUARE_BB[square(x + 1, y + dy)]
+            table[color].append(attacks)
+    return table
+
+
+def _ray(sq, dx, dy):
+    """All squares from sq (exclusive) in one direction, ordered from near to far"""
+    x, y = square_xy(sq)
+    ray = []
+    x, y = x + dx, y + dy
+    while 0 <= x <= 7 and 0 <= y <= 7:
+        ray.append(square(x, y))
+        x, y = x + dx, y + dy
+    return ray
+
+
+def _between():
+    """Squares strictly between two squares on a line, 0 if they do not share a line"""
+    table = [[0] * 64 for _ in range(64)]
+    for sq in range(64):
+        for dx, dy in KING_STEPS:
+            between = 0
+            for ray_sq in _ray(sq, dx, dy):
+                table[sq][ray_sq] = between
+                between |= SQUARE_BB[ray_sq]
+    return table
+
+
+def _subsets(mask):
+    """All subsets of the bits in mask (Carry-Rippler)"""
+    subset = 0
+    while True:
+        yield subset
+        subset = (subset - mask) & mask
+        if subset == 0: return
+
+
+def _slider_tables(directions):
+    """Relevant occupancy masks and attack lookup tables of a sliding piece.
+
+    The table of each square maps the occupancy of the relevant squares (the
+    rays without the board edge) to the attacked squares. It is built from
+    per-direction tables, since each direction only depends on its own ray.
+    """
+    masks, tables = [], []
+    for sq in range(64):
+        ray_tables = []
+        mask = 0
+        for dx, dy in directions:
+            ray = _ray(sq, dx, dy)
+            ray_mask = 0
+            for ray_sq in ray[:-1]: ray_mask |= SQUARE_BB[ray_sq]
+
+            ray_table = {}
+            for occupied in _subsets(ray_mask):
+                attacks = 0
+                for ray_sq in ray:
+                    attacks |= SQUARE_BB[ray_sq]
+                    if occupied & SQUARE_BB[ray_sq]: break
+                ray_table[occupied] = attacks
+            ray_tables.append((ray_mask, ray_table))
+            mask |= ray_mask
+
+        table = {}
+        for occupied in _subsets(mask):
+            attacks = 0
+            for ray_mask, ray_table in ray_tables: attacks |= ray_table[occupied & ray_mask]
+            table[occupied] = attacks
+
+        masks.append(mask)
+        tables.append(table)
+    return masks, tables
+
+
+KNIGHT_ATTACKS = _step_attacks(KNIGHT_JUMPS)
+KING_ATTACKS = _step_attacks(KING_STEPS)
+PAWN_ATTACKS = _pawn_attacks()
+ROOK_MASKS, ROOK_TABLES = _slider_tables(ROOK_DIRECTIONS)
+BISHOP_MASKS, BISHOP_TABLES = _slider_tables(BISHOP_DIRECTIONS)
+
+BETWEEN = _between()
+
+# Lines through a square on an empty board
+ROOK_RAYS = [ROOK_TABLES[sq][0] for sq in range(64)]
+BISHOP_RAYS = [BISHOP_TABLES[sq][0] for sq in range(64)]
+
+# Zobrist keys: the hash of a position is the XOR of the keys of its pieces,
+# castling rights, en passant file and side to move
+_random = random.Random(2020)
+ZOBRIST_PIECES = [[[_random.getrandbits(64) for _ in range(64)] for _ in range(6)] for _ in range(2)]
+ZOBRIST_CASTLING = [_random.getrandbits(64) for _ in range(16)]
+ZOBRIST_EP = [_random.getrandbits(64) for _ in range(8)]
+ZOBRIST_SIDE = _random.getrandbits(64)
+
+def _piece_square(tables):
+    """Piece-square value of every piece type on every square, for both colors.
+    The tables are drawn from white's side, so white pieces look them up mirrored."""
+    return [[[table[7 - (sq >> 3)][sq & 7] for sq in range(64)] for table in tables],
+            [[table[sq >> 3][sq & 7] for sq in range(64)] for table in tables]]
+
+
+PIECE_SQUARE = _piece_square(MIDDLEGAME_TABLES)
+PIECE_SQUARE_ENDGAME = _piece_square(ENDGAME_TABLES)
+
+# Piece values of the static exchange evaluation, the king outweighs everything
+SEE_VALUES = MATERIAL[:KING] + (20000,)
+
+# Castling rights that remain after a piece moves from or to a square
+CASTLING_MASKS = [0b1111] * 64
+CASTLING_MASKS[square(4, 0)] &= ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASKS[square(7, 0)] &= ~WHITE_KINGSIDE
+CASTLING_MASKS[square(0, 0)] &= ~WHITE_QUEENSIDE
+CASTLING_MASKS[square(4, 7)] &= ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_MASKS[square(7, 7)] &= ~BLACK_KINGSIDE
+CASTLING_MASKS[square(0, 7)] &= ~BLACK_QUEENSIDE
+
+
+# FEN lookup tables
+PIECE_CHARS = [SYMBOLS, SYMBOLS.lower()]
+FEN_PIECES = {PIECE_CHARS[color][piece_type]: (color, piece_type) for color in (WHITE, BLACK) for piece_type in range(6)}
+FEN_EMPTY = {str(n): n for n in range(1, 9)}
+SQUARE_NAMES = {square_name(sq): sq for sq in range(64)}
+CASTLING_RIGHTS = (WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE)
+CASTLING_FEN = ['-' if rights == 0 else ''.join(char for char, right in zip('KQkq', CASTLING_RIGHTS) if rights & right) 
+                for rights in range(16)]
+FEN_CASTLING = {fen: rights for rights, fen in enumerate(CASTLING_FEN)}
+CASTLING_PIECES = {WHITE_KINGSIDE: (WHITE, square(4, 0), square(7, 0)),
+                   WHITE_QUEENSIDE: (WHITE, square(4, 0), square(0, 0)),
+                   BLACK_KINGSIDE: (BLACK, square(4, 7), square(7, 7)),
+                   BLACK_QUEENSIDE: (BLACK, square(4, 7), square(0, 7))}
+
+
+def rook_attacks(sq, occupied):
+    return ROOK_TABLES[sq][occupied & ROOK_MASKS[sq]]
+
+
+def bishop_attacks(sq, occupied):
+    return BISHOP_TABLES[sq][occupied & BISHOP_MASKS[sq]]
+
+
+def queen_attacks(sq, occupied):
+    return ROOK_TABLES[sq][occupied & ROOK_MASKS[sq]] | BISHOP_TABLES[sq][occupied & BISHOP_MASKS[sq]]
+
+
+# Decoded SAN strings, see `decode_san`. Games use few distinct ones.
+SAN_TOKENS = {}
+SAN_TOKENS_LIMIT = 100000
+
+# SAN of moves by (position hash, move), see `BitBoard.san`. Openings and 
+# positions shown again (e.g. after taking a move back) are looked up.
+SAN_CACHE = {}
+SAN_CACHE_LIMIT = 100000
+
+
+def decode_san(san):
+    """The parts of a move in Standard Algebraic Notation, independent of the 
+    position: (piece type, to square, mask of the possible from squares, capture, 
+    promotion piece type). Castling has to square -1 and its move flags in place 
+    of the promotion. Raises ValueError if the notation is invalid."""
+    decoded = SAN_TOKENS.get(san)
+    if decoded is not None: return decoded
+
+    token = san.rstrip('+#!?')
+    if token in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        decoded = (KING, -1, FULL, False, KING_CASTLE if len(token) == 3 else QUEEN_CASTLE)
+    else:
+        promotion = None
+        if '=' in token: token, promotion = token.split('=', 1)
+        elif token[-1:] in ('N', 'B', 'R', 'Q'): token, promotion = token[:-1], token[-1]
+        if promotion is not None:
+            if promotion not in ('N', 'B', 'R', 'Q'): raise ValueError(f'Invalid move: {san}')
+            promotion = SYMBOLS.index(promotion)
+
+        piece_type = SYMBOLS.find(token[0]) if token[:1] in ('N', 'B', 'R', 'Q', 'K') else PAWN
+        to_sq = SQUARE_NAMES.get(token[-2:])
+        if to_sq is None or (promotion is not None and piece_type != PAWN): raise ValueError(f'Invalid move: {san}')
+
+        # Disambiguation: file and/or rank of the from square
+        origin = token[1 if piece_type != PAWN else 0:-2]
+        capture = origin.endswith('x')
+        if capture: origin = origin[:-1]
+        from_squares = FULL
+        for char in origin:
+            if 'a' <= char <= 'h': from_squares &= FILE_A << ord(char) - 97
+            elif '1' <= char <= '8': from_squares &= RANK_1 << 8 * (ord(char) - 49)
+            else: raise ValueError(f'Invalid move: {san}')
+        decoded = (piece_type, to_sq, from_squares, capture, promotion)
+
+    if len(SAN_TOKENS) >= SAN_TOKENS_LIMIT: SAN_TOKENS.clear()
+    SAN_TOKENS[san] = decoded
+    return decoded
+
+
+class BitBoard:
+    """Position stored as occupancy bitboards per color and piece type.
+
+    Moves are packed 16-bit integers (see `encode_move`) of the from square,
+    the to square and the move flags (capture, en passant, castling, double
+    pawn push, promotion piece), and move lists are `array('H')`s. Moves are 
+    made with `push` and taken back with `pop`, using a stack of undo records.
+    """
+
+    def __init__(self):
+        self.pieces = [[0] * 6, [0] * 6]
+        self.occupied = [0, 0]
+        self.squares = [None] * 64
+
+        self.side = WHITE
+        self.castling = WHITE_KINGSIDE | WHITE_QUEENSIDE | BLACK_KINGSIDE | BLACK_QUEENSIDE
+        self.ep = -1
+        self.halfmove = 0
+        self.fullmove = 1
+        self.hash = ZOBRIST_CASTLING[self.castling]
+
+        # Evaluation terms, updated on every change of the position: material and 
+        # middlegame and endgame piece-square totals per color, and the game phase
+        self.material = [0, 0]
+        self.psq = [0, 0]
+        self.psq_endgame = [0, 0]
+        self.phase = 0
+
+        # Undo records: (move, captured piece, castling, ep, halfmove, hash)
+        self.stack = []
+
+    @classmethod
+    def from_fen(cls, fen):
+        """Position of a FEN string (Forsyth-Edwards Notation)"""
+        fields = fen.split()
+        if len(fields) < 4 or fields[0].count('/') != 7: raise ValueError(f'Invalid FEN: {fen}')
+        
+        board = cls.__new__(cls)
+        pieces = board.pieces = [[0] * 6, [0] * 6]
+        board.squares = board_squares = [None] * 64
+        board.stack = []
+
+        # Squares are read from a8 to h1, so a new rank starts 16 squares back
+        sq = 56
+        try:
+            for char in fields[0]:
+                piece = FEN_PIECES.get(char)
+                if piece is not None:
+                    pieces[piece[0]][piece[1]] |= SQUARE_BB[sq]
+                    board_squares[sq] = piece
+                    sq += 1
+                elif char == '/': sq -= 16
+                else: sq += FEN_EMPTY[char]
+        except (KeyError, IndexError): raise ValueError(f'Invalid FEN: {fen}') from None
+        
+        if sq != 8: raise ValueError(f'Invalid FEN: {fen}')
+        board.occupied = [0, 0]
+        for color in (WHITE, BLACK):
+            for bb in pieces[color]: board.occupied[color] |= bb
+
+        if fields[1] not in ('w', 'b'): raise ValueError(f'Invalid FEN: {fen}')
+        board.side = WHITE if fields[1] == 'w' else BLACK
+
+        # One king per side, and the side that just moved can not have left its king in check
+        if popcount(pieces[WHITE][KING]) != 1 or popcount(pieces[BLACK][KING]) != 1:
+            raise ValueError(f'Invalid FEN, every side needs one king: {fen}')
+        if board.in_check(board.side ^ 1): raise ValueError(f'Invalid FEN, the side not to move is in check: {fen}')
+
+        board.castling = FEN_CASTLING.get(fields[2])
+        if board.castling is None: 
+            # Rights in a non-standard order
+            if fields[2].strip('KQkq'): raise ValueError(f'Invalid FEN: {fen}')
+            board.castling = sum(right for char, right in zip('KQkq', CASTLING_RIGHTS) if char in fields[2])
+        
+        # Rights are only kept while the king and rook are on their squares
+        for right, (color, king_sq, rook_sq) in CASTLING_PIECES.items():
+            if board_squares[king_sq] != (color, KING) or board_squares[rook_sq] != (color, ROOK): 
+                board.castling &= ~right
+
+        # En passant target is only kept if a pawn can capture on it
+        board.ep = -1
+        if fields[3] != '-':
+            ep = SQUARE_NAMES.get(fields[3])
+            if ep is None: raise ValueError(f'Invalid FEN: {fen}')
+            if PAWN_ATTACKS[board.side ^ 1][ep] & pieces[board.side][PAWN]: board.ep = ep
+
+        board.halfmove = int(fields[4]) if len(fields) > 4 else 0
+        board.fullmove = int(fields[5]) if len(fields) > 5 else 1
+        board.hash = board.compute_hash()
+        board.compute_evaluation()
+        return board
+
+    def to_fen(self):
+        """FEN string of the position. The en passant square is only
+        written when a pawn can capture on it."""
+        ranks = []
+        for rank in range(56, -8, -8):
+            row = ''
+            empty = 0
+            for piece in self.squares[rank:rank + 8]:
+                if piece is None: empty += 1
+                else:
+                    if empty: row += str(empty)
+                    row += PIECE_CHARS[piece[0]][piece[1]]
+                    empty = 0
+            if empty: row += str(empty)
+            ranks.append(row)
+
+        return ' '.join(('/'.join(ranks), 
+                         COLORS[self.side], 
+                         CASTLING_FEN[self.castling],
+                         square_name(self.ep) if self.ep >= 0 else '-',
+                         str(self.halfmove), 
+                         str(self.fullmove)))
+
+    def copy(self):
+        """Independent copy of the position, including the undo stack"""
+        board = BitBoard.__new__(BitBoard)
+        board.pieces = [self.pieces[WHITE][:], self.pieces[BLACK][:]]
+        board.occupied = self.occupied[:]
+        board.squares = self.squares[:]
+        board.side = self.side
+        board.castling = self.castling
+        board.ep = self.ep
+        board.halfmove = self.halfmove
+        board.fullmove = self.fullmove
+        board.hash = self.hash
+        board.material = self.material[:]
+        board.psq = self.psq[:]
+        board.psq_endgame = self.psq_endgame[:]
+        board.phase = self.phase
+        board.stack = self.stack[:]
+        return board
+
+    def put(self, sq, color, piece_type):
+        """Place piece on an empty square"""
+        bit = SQUARE_BB[sq]
+        self.pieces[color][piece_type] |= bit
+        self.occupied[color] |= bit
+        self.squares[sq] = (color, piece_type)
+        self.hash ^= ZOBRIST_PIECES[color][piece_type][sq]
+        self.material[color] += MATERIAL[piece_type]
+        self.psq[color] += PIECE_SQUARE[color][piece_type][sq]
+        self.psq_endgame[color] += PIECE_SQUARE_ENDGAME[color][piece_type][sq]
+        self.phase += PHASE_WEIGHTS[piece_type]
+
+    def remove(self, sq):
+        """Remove piece from square"""
+        color, piece_type = self.squares[sq]
+        bit = SQUARE_BB[sq]
+        self.pieces[color][piece_type] ^= bit
+        self.occupied[color] ^= bit
+        self.squares[sq] = None
+        self.hash ^= ZOBRIST_PIECES[color][piece_type][sq]
+        self.material[color] -= MATERIAL[piece_type]
+        self.psq[color] -= PIECE_SQUARE[color][piece_type][sq]
+        self.psq_endgame[color] -= PIECE_SQUARE_ENDGAME[color][piece_type][sq]
+        self.phase -= PHASE_WEIGHTS[piece_type]
+
+    def relocate(self, from_sq, to_sq):
+        """Move piece to an empty square"""
+        color, piece_type = self.squares[from_sq]
+        bits = SQUARE_BB[from_sq] | SQUARE_BB[to_sq]
+        self.pieces[color][piece_type] ^= bits
+        self.occupied[color] ^= bits
+        self.squares[to_sq] = self.squares[from_sq]
+        self.squares[from_sq] = None
+        keys = ZOBRIST_PIECES[color][piece_type]
+        self.hash ^= keys[from_sq] ^ keys[to_sq]
+        values = PIECE_SQUARE[color][piece_type]
+        self.psq[color] += values[to_sq] - values[from_sq]
+        values = PIECE_SQUARE_ENDGAME[color][piece_type]
+        self.psq_endgame[color] += values[to_sq] - values[from_sq]
+
+    def compute_hash(self):
+        """Zobrist hash of the position computed from scratch"""
+        key = ZOBRIST_CASTLING[self.castling]
+        for sq, piece in enumerate(self.squares):
+            if piece is not None: key ^= ZOBRIST_PIECES[piece[0]][piece[1]][sq]
+        if self.ep >= 0: key ^= ZOBRIST_EP[self.ep & 7]
+        if self.side == BLACK: key ^= ZOBRIST_SIDE
+        return key
+
+    def compute_evaluation(self):
+        """Evaluation terms of the position computed from scratch"""
+        self.material = [0, 0]
+        self.psq = [0, 0]
+        self.psq_endgame = [0, 0]
+        self.phase = 0
+        
+        for sq, piece in enumerate(self.squares):
+            if piece is None: continue
+            color, piece_type = piece
+            self.material[color] += MATERIAL[piece_type]
+            self.psq[color] += PIECE_SQUARE[color][piece_type][sq]
+            self.psq_endgame[color] += PIECE_SQUARE_ENDGAME[color][piece_type][sq]
+            self.phase += PHASE_WEIGHTS[piece_type]
+
+    def evaluate(self):
+        """Static evaluation (in centipawns) from the point of view of the side to move:
+        material plus the piece-square values, blended from the middlegame to the 
+        endgame tables as pieces leave the board"""
+        phase = min(self.phase, MAX_PHASE)
+        psq = self.psq[WHITE] - self.psq[BLACK]
+        psq_endgame = self.psq_endgame[WHITE] - self.psq_endgame[BLACK]
+        score = (self.material[WHITE] - self.material[BLACK] 
+                 + (psq * phase + psq_endgame * (MAX_PHASE - phase)) // MAX_PHASE)
+        return score if self.side == WHITE else -score
+
+    def king_square(self, color):
+        return self.pieces[color][KING].bit_length() - 1
+
+    def attackers(self, sq, color, occupied):
+        """Pieces of color that attack square sq, given the occupancy"""
+        pieces = self.pieces[color]
+        return ((KNIGHT_ATTACKS[sq] & pieces[KNIGHT])
+                | (KING_ATTACKS[sq] & pieces[KING])
+                | (PAWN_ATTACKS[color ^ 1][sq] & pieces[PAWN])
+                | (bishop_attacks(sq, occupied) & (pieces[BISHOP] | pieces[QUEEN]))
+                | (rook_attacks(sq, occupied) & (pieces[ROOK] | pieces[QUEEN])))
+
+    def is_attacked(self, sq, color):
+        """Check if square sq is attacked by a piece of color"""
+        return self.attackers(sq, color, self.occupied[0] | self.occupied[1]) != 0
+
+    def in_check(self, color):
+        return self.is_attacked(self.king_square(color), color ^ 1)
+
+    def is_repetition(self):
+        """Check if the position occurred before, since the last capture or pawn move"""
+        stack = self.stack
+        for ply in range(2, min(self.halfmove, len(stack)) + 1, 2):
+            if stack[-ply][5] == self.hash: return True
+        return False
+
+    def piece_moves(self, moves, targets, pins, push_targets=None):
+        """Add the moves of all pieces but the king (and en passant captures)
+
+        Args:
+            moves (list): packed moves are appended to this list
+            targets (int): mask of the squares the pieces may move to
+            pins (dict): square of a pinned piece -> mask of the squares it may move to
+            push_targets (int): mask of the squares pawns may push to, by default targets
+        """
+        color = self.side
+        enemy = self.occupied[color ^ 1]
+        occupied = self.occupied[color] | enemy
+        empty = ~occupied & FULL
+        pieces = self.pieces[color]
+        pinned = 0
+        for sq in pins: pinned |= SQUARE_BB[sq]
+        append = moves.append
+
+        # Pawns
+        pawns = pieces[PAWN]
+        if color == WHITE:
+            single = (pawns << 8) & empty
+            double = ((single & (RANK_1 << 16)) << 8) & empty
+            forward, promotion_rank = 8, RANK_8
+        else:
+            single = (pawns >> 8) & empty
+            double = ((single & (RANK_1 << 40)) >> 8) & empty
+            forward, promotion_rank = -8, RANK_1
+
+        if push_targets is None: push_targets = targets
+        for to_sq in squares(single & push_targets):
+            from_sq = to_sq - forward
+            if SQUARE_BB[from_sq] & pinned and not pins[from_sq] & SQUARE_BB[to_sq]: continue
+            if SQUARE_BB[to_sq] & promotion_rank:
+                for flags in PROMOTIONS: append(from_sq | to_sq << 6 | flags << 12)
+            else: append(from_sq | to_sq << 6)
+        for to_sq in squares(double & push_targets): 
+            from_sq = to_sq - 2 * forward
+            if SQUARE_BB[from_sq] & pinned and not pins[from_sq] & SQUARE_BB[to_sq]: continue
+            append(from_sq | to_sq << 6 | DOUBLE_PUSH << 12)
+
+        # Captures towards the a-file and towards the h-file, shifted like the pushes
+        captures = enemy & targets
+        if color == WHITE: 
+            sides = (((pawns & ~FILE_A) << 7) & captures, 7), (((pawns & ~FILE_H) << 9) & captures, 9)
+        else: 
+            sides = (((pawns & ~FILE_A) >> 9) & captures, -9), (((pawns & ~FILE_H) >> 7) & captures, -7)
+        for to_squares, offset in sides:
+            for to_sq in squares(to_squares):
+                from_sq = to_sq - offset
+                if SQUARE_BB[from_sq] & pinned and not pins[from_sq] & SQUARE_BB[to_sq]: continue
+                if SQUARE_BB[to_sq] & promotion_rank:
+                    for flags in CAPTURE_PROMOTIONS: append(from_sq | to_sq << 6 | flags << 12)
+                else: append(from_sq | to_sq << 6 | CAPTURE << 12)
+
+        # Pieces: a pinned knight can never move
+        for from_sq in squares(pieces[KNIGHT] & ~pinned):
+            append_moves(append, from_sq, KNIGHT_ATTACKS[from_sq] & targets, enemy)
+        for from_sq in squares(pieces[BISHOP]):
+            to_squares = bishop_attacks(from_sq, occupied) & targets
+            if SQUARE_BB[from_sq] & pinned: to_squares &= pins[from_sq]
+            append_moves(append, from_sq, to_squares, enemy)
+        for from_sq in squares(pieces[ROOK]):
+            to_squares = rook_attacks(from_sq, occupied) & targets
+            if SQUARE_BB[from_sq] & pinned: to_squares &= pins[from_sq]
+            append_moves(append, from_sq, to_squares, enemy)
+        for from_sq in squares(pieces[QUEEN]):
+            to_squares = queen_attacks(from_sq, occupied) & targets
+            if SQUARE_BB[from_sq] & pinned: to_squares &= pins[from_sq]
+            append_moves(append, from_sq, to_squares, enemy)
+
+    @staticmethod
+    def king_moves(moves, king_sq, to_squares, enemy):
+        """Add the moves of the king to a mask of squares"""
+        append_moves(moves.append, king_sq, to_squares, enemy)
+
+    def en_passant_moves(self, moves):
+        """Add en passant captures. Legality is tested by making the capture 
+        on the occupancy, since it removes two pieces from the board."""
+        if self.ep < 0: return
+        color = self.side
+        for from_sq in squares(PAWN_ATTACKS[color ^ 1][self.ep] & self.pieces[color][PAWN]):
+            move = from_sq | self.ep << 6 | EN_PASSANT << 12
+            if self.is_safe(move): moves.append(move)
+
+    def castling_moves(self, moves, occupied):
+        """Add castling moves: the king is not in check and does not cross an attacked square"""
+        color = self.side
+        rights = self.castling >> (2 * color) & 0b11
+        if not rights: return
+
+        king_sq = 4 if color == WHITE else 60
+        if self.squares[king_sq] != (color, KING): return
+        enemy = color ^ 1
+        if self.is_attacked(king_sq, enemy): return
+
+        if (rights & 1
+            and self.squares[king_sq + 3] == (color, ROOK)
+            and not occupied & (SQUARE_BB[king_sq + 1] | SQUARE_BB[king_sq + 2])
+            and not self.is_attacked(king_sq + 1, enemy)
+            and not self.is_attacked(king_sq + 2, enemy)):
+            moves.append(encode_move(king_sq, king_sq + 2, KING_CASTLE))
+
+        if (rights & 2
+            and self.squares[king_sq - 4] == (color, ROOK)
+            and not occupied & (SQUARE_BB[king_sq - 1] | SQUARE_BB[king_sq - 2] | SQUARE_BB[king_sq - 3])
+            and not self.is_attacked(king_sq - 1, enemy)
+            and not self.is_attacked(king_sq - 2, enemy)):
+            moves.append(encode_move(king_sq, king_sq - 2, QUEEN_CASTLE))
+
+    def is_safe(self, move):
+        """Check if the own king is not attacked after the move"""
+        from_sq, to_sq = move & 63, move >> 6 & 63
+        color = self.side
+        enemy = color ^ 1
+        piece_type = self.squares[from_sq][1]
+
+        captured = SQUARE_BB[to_sq]
+        if move >> 12 == EN_PASSANT: captured = SQUARE_BB[to_sq - 8 if color == WHITE else to_sq + 8]
+
+        occupied = ((self.occupied[0] | self.occupied[1]) & ~(SQUARE_BB[from_sq] | captured)) | SQUARE_BB[to_sq]
+        king_sq = to_sq if piece_type == KING else self.king_square(color)
+
+        pieces = self.pieces[enemy]
+        not_captured = ~captured
+        return not (((KNIGHT_ATTACKS[king_sq] & pieces[KNIGHT])
+                     | (KING_ATTACKS[king_sq] & pieces[KING])
+                     | (PAWN_ATTACKS[color][king_sq] & pieces[PAWN])
+                     | (bishop_attacks(king_sq, occupied) & (pieces[BISHOP] | pieces[QUEEN]))
+                     | (rook_attacks(king_sq, occupied) & (pieces[ROOK] | pieces[QUEEN]))) & not_captured)
+
+    def gives_check(self, move):
+        """Check if the move attacks the enemy king, directly or by uncovering a slider"""
+        flags = move >> 12
+        if flags in (KING_CASTLE, QUEEN_CASTLE):
+            self.push(move)
+            check = self.in_check(self.side)
+            self.pop()
+            return check
+
+        from_sq, to_sq = move & 63, move >> 6 & 63
+        color = self.side
+        king_sq = self.king_square(color ^ 1)
+        piece_type = self.squares[from_sq][1]
+        new_type = (flags & 3) + KNIGHT if flags & PROMOTION else piece_type
+
+        captured = SQUARE_BB[to_sq - 8 if color == WHITE else to_sq + 8] if flags == EN_PASSANT else 0
+        occupied = ((self.occupied[0] | self.occupied[1]) & ~(SQUARE_BB[from_sq] | captured)) | SQUARE_BB[to_sq]
+
+        # Pieces of the side to move after the move
+        pieces = list(self.pieces[color])
+        pieces[piece_type] &= ~SQUARE_BB[from_sq]
+        pieces[new_type] |= SQUARE_BB[to_sq]
+
+        return bool((KNIGHT_ATTACKS[king_sq] & pieces[KNIGHT])
+                    | (PAWN_ATTACKS[color ^ 1][king_sq] & pieces[PAWN])
+                    | (bishop_attacks(king_sq, occupied) & (pieces[BISHOP] | pieces[QUEEN]))
+                    | (rook_attacks(king_sq, occupied) & (pieces[ROOK] | pieces[QUEEN])))
+
+    def to_move(self, from_sq, to_sq, promotion=None):
+        """Packed move of a from and to square in this position, with the flags
+        of the piece on the from square and the piece on the to square
+
+        Args:
+            from_sq (int): square of the moving piece
+            to_sq (int): target square
+            promotion (int): piece type a pawn promotes to
+        """
+        piece_type = self.squares[from_sq][1]
+        flags = QUIET if self.squares[to_sq] is None else CAPTURE
+
+        if piece_type == PAWN:
+            if to_sq == self.ep: flags = EN_PASSANT
+            elif abs(to_sq - from_sq) == 16: flags = DOUBLE_PUSH
+            elif SQUARE_BB[to_sq] & (RANK_1 | RANK_8): 
+                flags |= PROMOTION | (QUEEN if promotion is None else promotion) - KNIGHT
+        elif piece_type == KING and abs(to_sq - from_sq) == 2: 
+            flags = KING_CASTLE if to_sq > from_sq else QUEEN_CASTLE
+        return encode_move(from_sq, to_sq, flags)
+
+    def san(self, move, legal_moves=None):
+        """Standard Algebraic Notation of a legal move (e.g. 'Nbd7', 'exd6', 'e8=Q+', 'O-O').
+        The notation is cached by position and move, see `SAN_CACHE`.
+
+        Args:
+            move (int): packed legal move
+            legal_moves (iterable): legal moves of the position, to disambiguate 
+                the move from. By default the other pieces that attack the target 
+                square are tested with `is_safe`.
+        """
+        key = (self.hash, move)
+        san = SAN_CACHE.get(key)
+        if san is not None: return san
+
+        flags = move >> 12
+        from_sq, to_sq = move & 63, move >> 6 & 63
+        piece_type = self.squares[from_sq][1]
+
+        if flags == KING_CASTLE: san = 'O-O'
+        elif flags == QUEEN_CASTLE: san = 'O-O-O'
+        elif piece_type == PAWN:
+            san = square_name(from_sq)[0] + 'x' if flags & CAPTURE else ''
+            san += square_name(to_sq)
+            if flags & PROMOTION: san += '=' + SYMBOLS[(flags & 3) + KNIGHT]
+        else:
+            # Disambiguation: other pieces of the type that can move to the square
+            if legal_moves is not None:
+                others = 0
+                for other in legal_moves:
+                    if other >> 6 & 63 == to_sq and other & 63 != from_sq and self.squares[other & 63][1] == piece_type:
+                        others |= SQUARE_BB[other & 63]
+            elif piece_type == KING: others = 0
+            else:
+                pieces = self.pieces[self.side][piece_type] & ~SQUARE_BB[from_sq]
+                if piece_type == KNIGHT: others = KNIGHT_ATTACKS[to_sq] & pieces
+                elif pieces:
+                    occupied = self.occupied[0] | self.occupied[1]
+                    if piece_type == BISHOP: others = bishop_attacks(to_sq, occupied) & pieces
+                    elif piece_type == ROOK: others = rook_attacks(to_sq, occupied) & pieces
+                    else: others = queen_attacks(to_sq, occupied) & pieces
+                else: others = 0
+                for other_sq in squares(others):
+                    if not self.is_safe(self.to_move(other_sq, to_sq)): others ^= SQUARE_BB[other_sq]
+
+            origin = ''
+            if others:
+                name = square_name(from_sq)
+                if not others & FILE_A << (from_sq & 7): origin = name[0]
+                elif not others & RANK_1 << (from_sq & 56): origin = name[1]
+                else: origin = name
+            san = SYMBOLS[piece_type] + origin + ('x' if flags & CAPTURE else '') + square_name(to_sq)
+
+        # Check, and mate when the other side has no legal move
+        if self.gives_check(move):
+            self.push(move)
+            san += '+' if self.legal_moves() else '#'
+            self.pop()
+
+        if len(SAN_CACHE) >= SAN_CACHE_LIMIT: SAN_CACHE.clear()
+        SAN_CACHE[key] = san
+        return san
+
+    def parse_move(self, name):
+        """Packed legal move of a move in long algebraic notation (e.g. 'e2e4',
+        'e7e8q'), as written by `move_name`. Raises ValueError if it is not legal."""
+        from_sq, to_sq = SQUARE_NAMES.get(name[:2]), SQUARE_NAMES.get(name[2:4])
+        promotion = 'nbrq'.find(name[4:]) + KNIGHT if len(name) == 5 else None
+        if from_sq is None or to_sq is None or len(name) > 5 or promotion == KNIGHT - 1:
+            raise ValueError(f'Invalid move: {name}')
+
+        if self.squares[from_sq] is not None:
+            move = self.to_move(from_sq, to_sq, promotion)
+            if move in self.legal_moves(): return move
+        raise ValueError(f'Illegal move: {name}')
+
+    def parse_san(self, san):
+        """Packed legal move of a move in Standard Algebraic Notation (e.g. 'Nbd7', 
+        'exd6', 'e8=Q+', 'O-O'). Raises ValueError if no or more than one legal 
+        move matches.
+
+        The pieces that can make the move are found with the attack tables from 
+        the target square, so only their moves are tested for legality.
+        """
+        piece_type, to_sq, from_squares, capture, promotion = decode_san(san)
+        if to_sq < 0:
+            for move in self.legal_moves():
+                if move >> 12 == promotion: return move
+            raise ValueError(f'Illegal move: {san}')
+
+        color = self.side
+        own = self.occupied[color]
+        occupied = own | self.occupied[color ^ 1]
+        pieces = self.pieces[color]
+        target = SQUARE_BB[to_sq]
+        if target & own: raise ValueError(f'Illegal move: {san}')
+
+        # Pieces that can move to the target square
+        if piece_type == PAWN:
+            if (promotion is None) == bool(target & (RANK_1 | RANK_8)): raise ValueError(f'Illegal move: {san}')
+            if capture or from_squares & FILE_A << (to_sq & 7) == 0:
+                if not target & occupied and to_sq != self.ep: raise ValueError(f'Illegal move: {san}')
+                candidates = PAWN_ATTACKS[color ^ 1][to_sq] & pieces[PAWN]
+            else:
+                if target & occupied: raise ValueError(f'Illegal move: {san}')
+                from_sq = to_sq - 8 if color == WHITE else to_sq + 8
+                if not 0 <= from_sq < 64: raise ValueError(f'Illegal move: {san}')
+                candidates = SQUARE_BB[from_sq] & pieces[PAWN]
+                if not SQUARE_BB[from_sq] & occupied and to_sq >> 3 == (3 if color == WHITE else 4):
+                    candidates = SQUARE_BB[2 * from_sq - to_sq] & pieces[PAWN]
+        elif piece_type == KNIGHT: candidates = KNIGHT_ATTACKS[to_sq] & pieces[KNIGHT]
+        elif piece_type == BISHOP: candidates = bishop_attacks(to_sq, occupied) & pieces[BISHOP]
+        elif piece_type == ROOK: candidates = rook_attacks(to_sq, occupied) & pieces[ROOK]
+        elif piece_type == QUEEN: candidates = queen_attacks(to_sq, occupied) & pieces[QUEEN]
+        else: candidates = KING_ATTACKS[to_sq] & pieces[KING]
+
+        found = NO_MOVE
+        for from_sq in squares(candidates & from_squares):
+            move = self.to_move(from_sq, to_sq, promotion)
+            if not self.is_safe(move): continue
+            if found: raise ValueError(f'Ambiguous move: {san}')
+            found = move
+        
+        if not found: raise ValueError(f'Illegal move: {san}')
+        return found
+
+    def checks_and_pins(self, color=None):
+        """Checking pieces, check evasion mask and pin rays of a color, by default the side to move
+
+        Returns:
+            tuple: (checkers, evasions, pins) with the mask of the pieces that give check, 
+                the mask of the squares a piece other than the king must move to (capture 
+                or block the checker), and for every pinned piece its square -> mask of 
+                the squares between the king and the pinning piece, including that piece
+        """
+        if color is None: color = self.side
+        king_sq = self.king_square(color)
+        own = self.occupied[color]
+        occupied = own | self.occupied[color ^ 1]
+        enemy = self.pieces[color ^ 1]
+
+        checkers = (KNIGHT_ATTACKS[king_sq] & enemy[KNIGHT]) | (PAWN_ATTACKS[color][king_sq] & enemy[PAWN])
+        pins = {}
+
+        # Enemy sliders on a line through the king either give check or pin a single own piece
+        snipers = ((ROOK_RAYS[king_sq] & (enemy[ROOK] | enemy[QUEEN]))
+                   | (BISHOP_RAYS[king_sq] & (enemy[BISHOP] | enemy[QUEEN])))
+        for sniper in squares(snipers):
+            between = BETWEEN[king_sq][sniper] & occupied
+            if not between: checkers |= SQUARE_BB[sniper]
+            elif between & own and not between & (between - 1):
+                pins[between.bit_length() - 1] = BETWEEN[king_sq][sniper] | SQUARE_BB[sniper]
+
+        if not checkers: evasions = FULL
+        elif checkers & (checkers - 1): evasions = 0
+        else: evasions = BETWEEN[king_sq][checkers.bit_length() - 1] | checkers
+        return checkers, evasions, pins
+
+    def legal_moves(self, captures_only=False):
+        """All legal moves of the side to move, as an array of packed moves.
+
+        The checkers, check evasion mask and pin rays are computed once, after
+        which every move is a mask test. Only en passant captures are tested by 
+        making them on the occupancy.
+
+        Args:
+            captures_only (bool): only generate captures and promotions
+        """
+        color = self.side
+        own = self.occupied[color]
+        enemy = self.occupied[color ^ 1]
+        occupied = own | enemy
+        checkers, evasions, pins = self.checks_and_pins()
+        targets = enemy if captures_only else ~own & FULL
+        moves = []
+
+        # In double check only the king can move
+        if evasions: 
+            if captures_only: 
+                promotion_rank = RANK_8 if color == WHITE else RANK_1
+                self.piece_moves(moves, evasions & targets, pins, evasions & promotion_rank)
+            else: self.piece_moves(moves, evasions & targets, pins)
+            self.en_passant_moves(moves)
+
+        # King moves: the target square is not attacked once the king has left its square
+        king_sq = self.king_square(color)
+        without_king = occupied ^ SQUARE_BB[king_sq]
+        safe = 0
+        for to_sq in squares(KING_ATTACKS[king_sq] & targets):
+            if not self.attackers(to_sq, color ^ 1, without_king): safe |= SQUARE_BB[to_sq]
+        self.king_moves(moves, king_sq, safe, enemy)
+
+        if not checkers and not captures_only: self.castling_moves(moves, occupied)
+        return array('H', moves)
+
+    def see(self, move):
+        """Static exchange evaluation: the material (in centipawns) the moving side 
+        gains with a capture, when both sides keep recapturing on the target square
+        with their least valuable attacker for as long as it pays off. Pieces behind
+        a capturing slider join the exchange (X-rays), pins are ignored."""
+        from_sq, to_sq, flags = move & 63, move >> 6 & 63, move >> 12
+        color, piece_type = self.squares[from_sq]
+        occupied = (self.occupied[0] | self.occupied[1]) ^ SQUARE_BB[from_sq]
+
+        gain = 0
+        if flags == EN_PASSANT:
+            gain = SEE_VALUES[PAWN]
+            occupied ^= SQUARE_BB[to_sq - 8 if color == WHITE else to_sq + 8]
+        elif flags & CAPTURE: gain = SEE_VALUES[self.squares[to_sq][1]]
+        
+        # Value of the piece standing on the target square after the capture
+        on_square = SEE_VALUES[piece_type]
+        if flags & PROMOTION:
+            on_square = SEE_VALUES[(flags & 3) + KNIGHT]
+            gain += on_square - SEE_VALUES[PAWN]
+
+        gains = [gain]
+        side = color ^ 1
+        while True:
+            attackers = (self.attackers(to_sq, WHITE, occupied) | self.attackers(to_sq, BLACK, occupied)) & occupied
+            own = attackers & self.occupied[side]
+            if not own: break
+            
+            # Least valuable attacker. The king can only capture an undefended piece
+            for attacker_type in range(6):
+                bb = own & self.pieces[side][attacker_type]
+                if bb: break
+            if attacker_type == KING and attackers & self.occupied[side ^ 1]: break
+
+            gains.append(on_square - gains[-1])
+            on_square = SEE_VALUES[attacker_type]
+            occupied ^= bb & -bb
+            side ^= 1
+
+        # Either side may stop capturing when it would lose material
+        while len(gains) > 1:
+            last = gains.pop()
+            gains[-1] = -max(-gains[-1], last)
+        return gains[0]
+
+    def hanging_pieces(self, color):
+        """Squares of the pieces of color (but the king) that the other side wins 
+        material by capturing, according to the static exchange evaluation"""
+        enemy = color ^ 1
+        occupied = self.occupied[0] | self.occupied[1]
+        hanging = []
+        
+        for sq in squares(self.occupied[color] & ~self.pieces[color][KING]):
+            attackers = self.attackers(sq, enemy, occupied)
+            if not attackers: continue
+            
+            # Capture with the least valuable attacker
+            for attacker_type in range(6):
+                bb = attackers & self.pieces[enemy][attacker_type]
+                if bb: break
+            from_sq = (bb & -bb).bit_length() - 1
+            if self.see(encode_move(from_sq, sq, CAPTURE)) > 0: hanging.append(sq)
+        return hanging
+
+    def push(self, move):
+        """Play a (legal) packed move and pass the turn to the other side"""
+        from_sq, to_sq, flags = move & 63, move >> 6 & 63, move >> 12
+        color = self.side
+        piece_type = self.squares[from_sq][1]
+        captured = (color ^ 1, PAWN) if flags == EN_PASSANT else self.squares[to_sq]
+        self.stack.append((move, captured, self.castling, self.ep, self.halfmove, self.hash))
+
+        # En passant: captured pawn is behind the target square
+        if flags == EN_PASSANT: self.remove(to_sq - 8 if color == WHITE else to_sq + 8)
+        elif captured is not None: self.remove(to_sq)
+
+        self.relocate(from_sq, to_sq)
+
+        if flags & PROMOTION:
+            self.remove(to_sq)
+            self.put(to_sq, color, (flags & 3) + KNIGHT)
+
+        # Castling: also move the rook
+        elif flags == KING_CASTLE: self.relocate(from_sq + 3, from_sq + 1)
+        elif flags == QUEEN_CASTLE: self.relocate(from_sq - 4, from_sq - 1)
+
+        castling = self.castling & CASTLING_MASKS[from_sq] & CASTLING_MASKS[to_sq]
+        self.hash ^= ZOBRIST_CASTLING[self.castling] ^ ZOBRIST_CASTLING[castling] ^ ZOBRIST_SIDE
+        self.castling = castling
+
+        # En passant target is only kept if an enemy pawn can capture on it,
+        # otherwise equal positions would get different hashes
+        if self.ep >= 0: self.hash ^= ZOBRIST_EP[self.ep & 7]
+        self.ep = -1
+        if flags == DOUBLE_PUSH:
+            ep = (from_sq + to_sq) // 2
+            if PAWN_ATTACKS[color][ep] & self.pieces[color ^ 1][PAWN]:
+                self.ep = ep
+                self.hash ^= ZOBRIST_EP[ep & 7]
+
+        self.halfmove = 0 if captured is not None or piece_type == PAWN else self.halfmove + 1
+        if color == BLACK: self.fullmove += 1
+        self.side = color ^ 1
+
+    def pop(self):
+        """Take back the last move, and return it"""
+        move, captured, castling, ep, halfmove, key = self.stack.pop()
+        from_sq, to_sq, flags = move & 63, move >> 6 & 63, move >> 12
+        color = self.side ^ 1
+
+        if flags & PROMOTION:
+            self.remove(to_sq)
+            self.put(to_sq, color, PAWN)
+        self.relocate(to_sq, from_sq)
+
+        if flags == KING_CASTLE: self.relocate(from_sq + 1, from_sq + 3)
+        elif flags == QUEEN_CASTLE: self.relocate(from_sq - 1, from_sq - 4)
+
+        if flags == EN_PASSANT: self.put(to_sq - 8 if color == WHITE else to_sq + 8, *captured)
+        elif captured is not None: self.put(to_sq, *captured)
+
+        self.castling = castling
+        self.ep = ep
+        self.halfmove = halfmove
+        self.hash = key
+        if color == BLACK: self.fullmove -= 1
+        self.side = color
+        return move
@@ -1,23 +1,75 @@
 import random
+from array import array
 from model.pieces import Pawn, Knight, Bishop, Rook, Queen, King, Empty
+from model.bitboard import (BitBoard, COLORS, SYMBOLS, QUEEN, WHITE, START_FEN, FULL, SQUARE_BB,
+                            WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE, 
+                            PROMOTION, KING_CASTLE, QUEEN_CASTLE, EN_PASSANT, KNIGHT,
+                            square_xy, move_xy, move_promotion)
+from model.pgn import Game
+
+
+class Undo:
+    """Record of everything a move changes that can not be recomputed, 
+    so `Board.pop` can take the move back in constant time"""
+
+    __slots__ = ('move', 'piece', 'squares', 'locations', 'kings', 'king_position', 'previous_move', 
+                 'move_nr', 'current_player', 'end_conditions', 'winner', 'position_history', 
+                 'move_history', 'move_history_len', 'captured', 'promoted', 'key')
+
+    def __init__(self, board, move, piece, squares):
+        self.move = move
+        self.piece = piece
+        
+        # Square objects and piece locations before the move
+        self.squares = [(x, y, board.position[y][x]) for x, y in squares]
+        self.locations = [(square, square.x, square.y, square.has_moved) 
+                          for _, _, square in self.squares if not isinstance(square, Empty)]
+        kings = [board.position[y][x] for x, y in board.king_position.values()]
+        self.kings = [(king, list(king.castling)) for king in kings]
+        
+        # Game state before the move
+        self.king_position = dict(board.king_position)
+        self.previous_move = board.previous_move
+        self.move_nr = board.move_nr
+        self.current_player = board.current_player
+        self.end_conditions = dict(board.end_conditions)
+        self.winner = board.winner
+        self.position_history = board.position_history
+        self.move_history = board.move_history[-1] if board.move_history else None
+        self.move_history_len = len(board.move_history)
+        
+        # Filled in when the move is made
+        self.captured = None
+        self.promoted = None
+        self.key = None
 
 
 class Board:
     """Class to store current position on the board and 
     to keep track of all the pieces on the board."""
 
-    START_POSITION = [['Rw', 'Nw', 'Bw', 'Qw', 'Kw', 'Bw', 'Nw', 'Rw'],  # 1
-                     ['Pw', 'Pw', 'Pw', 'Pw', 'Pw', 'Pw', 'Pw', 'Pw'],  # 2
-                     [0, 0, 0, 0, 0, 0, 0, 0],  # 3
-                     [0, 0, 0, 0, 0, 0, 0, 0],  # 4
-                     [0, 0, 0, 0, 0, 0, 0, 0],  # 5
-                     [0, 0, 0, 0, 0, 0, 0, 0],  # 6
-                     ['Pb', 'Pb', 'Pb', 'Pb', 'Pb', 'Pb', 'Pb', 'Pb'],  # 7
-                     ['Rb', 'Nb', 'Bb', 'Qb', 'Kb', 'Bb', 'Nb', 'Rb']]  # 8
+    PIECE_CLASSES = {'P': Pawn, 'N': Knight, 'B': Bishop, 'R': Rook, 'Q': Queen, 'K': King}
+    
+    # Castling rights of the king and rook squares: (king, rook) -> right
+    CASTLING_SQUARES = {((4, 0), (7, 0)): WHITE_KINGSIDE,
+                        ((4, 0), (0, 0)): WHITE_QUEENSIDE,
+                        ((4, 7), (7, 7)): BLACK_KINGSIDE,
+                        ((4, 7), (0, 7)): BLACK_QUEENSIDE}
+
+    BACKENDS = ('bitboard', 'objects')
 
-    def __init__(self, square_width, square_height, is_flipped):
-        self.square_width = square_width
-        self.square_height = square_height
+    def __init__(self, is_flipped=False, backend='bitboard', fen=START_FEN):
+        """Args:
+            is_flipped (bool): white is shown on top of the board
+            backend (str): move generation backend, 'bitboard' (occupancy bitboards 
+                and precomputed attack tables) or 'objects' (squares walked by the pieces)
+            fen (str): starting position in Forsyth-Edwards Notation
+        """
+        if backend not in self.BACKENDS: raise ValueError(f'Undefined backend: {backend}')
+        
+        self.backend = backend
+        self.bitboard = BitBoard.from_fen(fen)
+        self.start_fen = fen
         
         # Piece and tile variables
         self.id = 0
@@ -26,6 +78,7 @@ class Board:
         
         # Board position variables
         self.position = []
+        self.empty_squares = []
         self.highlighted_tiles = []
         self.arrow_coordinates = []
         self.is_flipped = is_flipped        
@@ -33,7 +86,6 @@ class Board:
         
         # Win conditions
         self.winner = None
-        self.FMR = 0
         self.end_conditions = {'resignation': False,
                                'checkmate': False, 
                                'stalemate': False, 
@@ -49,51 +101,121 @@ class Board:
         # Move variables
         self.moves = []
         self.move_nr = 1
+        self.notation = None
         self.move_history = []
         self.position_history = {}
         self.previous_move = []
-        self.all_possible_moves = {'w': [], 'b': []}
+        self.all_possible_moves = {'w': array('H'), 'b': array('H')}
+        self.undo_stack = []
+        
+        # Position generation: bumped on every change of the position, so that
+        # possible moves are only recomputed once per move
+        self.generation = 0
+        self.updated_generation = -1
         
         self.setup()
+        self.position_history[self.position_to_key()] = 1
+    
+    @classmethod
+    def from_fen(cls, fen, is_flipped=False, backend='bitboard'):
+        """Board of a position in Forsyth-Edwards Notation"""
+        return cls(is_flipped, backend, fen)
+    
+    def to_fen(self):
+        """Position in Forsyth-Edwards Notation"""
+        return self.bitboard.to_fen()
+    
+    @classmethod
+    def from_game(cls, game, is_flipped=False, backend='bitboard'):
+        """Board of the position after the moves of a game (see `model.pgn`),
+        with the moves on the undo stack"""
+        board = cls(is_flipped, backend, game.fen)
+        for move in game.moves: board.push(move)
+        return board
+    
+    def to_game(self, tags=None):
+        """Game of the moves played from the starting position, to be written
+        with `model.pgn.write_game`
+
+        Args:
+            tags (dict): tag pairs, e.g. the names of the players
+        """
+        if self.winner == 'White': result = '1-0'
+        elif self.winner == 'Black': result = '0-1'
+        elif self.winner == 'Draw' or self.end_conditions['FMR'] or self.end_conditions['3_fold_rep']:
+            result = '1/2-1/2'
+        else: result = '*'
+        
+        tags = dict(tags or {})
+        if self.start_fen != START_FEN: tags.update(SetUp='1', FEN=self.start_fen)
+        return Game(tags, [record.move for record in self.undo_stack], result)
     
     def setup(self):
-        """Create piece objects based on starting board position"""
+        """Create piece objects based on the position of the bitboards"""
+        bitboard = self.bitboard
+        squares = bitboard.squares
         
         for y in range(8):
             board_row = []
+            
+            # One empty square object per square, reused whenever the square is emptied
+            empty_row = []
                         
             for x in range(8):
                 self.id += 1
+                piece = squares[y * 8 + x]
+                empty = Empty(str(self.id), x, y)
+                empty_row.append(empty)
 
-                if self.START_POSITION[y][x] != 0:
+                if piece is not None:
+                    color = COLORS[piece[0]]
+                    symbol = SYMBOLS[piece[1]]
+                    square = self.PIECE_CLASSES[symbol](str(self.id), symbol, color, x, y)
                     
-                    symbol = self.START_POSITION[y][x][0]
-                    color = self.START_POSITION[y][x][1]
-         
-                    if symbol == 'K':
-                        square = King(str(self.id), symbol, color, x, y, self.square_width, self.square_height)
+                    # Pawns off their starting rank can not make a double step
+                    if symbol == 'P': square.has_moved = y != (1 if color == 'w' else 6)
+                    if symbol == 'K': 
+                        if self.king_position[color]: raise ValueError(f'More than one {color} king')
                         self.king_position[color] = (x, y)
-                    elif symbol == 'Q':
-                        square = Queen(str(self.id), symbol, color, x, y, self.square_width, self.square_height)
-                    elif symbol == 'B':
-                        square = Bishop(str(self.id), symbol, color, x, y, self.square_width, self.square_height)
-                    elif symbol == 'N':
-                        square = Knight(str(self.id), symbol, color, x, y, self.square_width, self.square_height)
-                    elif symbol == 'R':
-                        square = Rook(str(self.id), symbol, color, x, y, self.square_width, self.square_height)
-                    elif symbol == 'P':
-                        square = Pawn(str(self.id), symbol, color, x, y, self.square_width, self.square_height)
-                        
-                    else:
-                        raise ValueError('Undefined piece type.')
                     
                     self.pieces[color].add(square)
-                    
                 else:
-                    square = Empty(str(self.id), x, y)
+                    square = empty
             
                 board_row.append(square)
             self.position.append(board_row)
+            self.empty_squares.append(empty_row)
+        
+        for color in COLORS:
+            if not self.king_position[color]: raise ValueError(f'No {color} king')
+        
+        # Castling rights: kings and rooks without a right count as moved
+        for color in COLORS:
+            x, y = self.king_position[color]
+            king = self.position[y][x]
+            king.has_moved = True
+            king.castling = [False, False]
+            for piece in self.pieces[color]: 
+                if isinstance(piece, Rook): piece.has_moved = True
+            
+        for ((king_x, king_y), (rook_x, rook_y)), right in self.CASTLING_SQUARES.items():
+            if bitboard.castling & right:
+                king = self.position[king_y][king_x]
+                rook = self.position[rook_y][rook_x]
+                king.has_moved = False
+                king.castling[0 if rook_x == 7 else 1] = True
+                rook.has_moved = False
+        
+        # Game state
+        self.current_player = bitboard.side
+        self.current_color = COLORS[bitboard.side]
+        self.move_nr = bitboard.fullmove
+        
+        # En passant: the previous move was the double step past the target square
+        if bitboard.ep >= 0:
+            x, y = square_xy(bitboard.ep)
+            step = 1 if bitboard.side == WHITE else -1
+            self.previous_move = [(x, y + step), (x, y - step)]
                 
     def flipped_board(self, y):
         return y if self.is_flipped else 7 - y
@@ -112,12 +234,117 @@ class Board:
             y = self.flipped_board(y)
             return self.position[y][x]
             
-    def move_piece(self, color, moving_piece, move):
+    def invalidate(self):
+        """Mark the position as changed, so possible moves are recomputed"""
+        self.generation += 1
+
+    def is_updated(self):
+        """Check if the possible moves belong to the current position"""
+        return self.updated_generation == self.generation
+
+    def find_move(self, move, promotion=None):
+        """Packed legal move of a move in board coordinates, None if the move is not legal
+
+        Args:
+            move (list): [(x1, y1), (x2, y2)] in board coordinates
+            promotion (str): symbol of the piece a pawn promotes to, random if None
+        """
+        (x1, y1), (x2, y2) = move
+        piece = self.position[y1][x1]
+        if isinstance(piece, Empty): return None
+        
+        from_to = y1 * 8 + x1 | (y2 * 8 + x2) << 6
+        for packed in piece.valid_moves:
+            if packed & 0xFFF == from_to: break
+        else: return None
+        
+        # The moves of the pieces only hold the queen promotion
+        if packed >> 12 & PROMOTION:
+            if promotion is None: promotion = random.choice('QRBN')
+            packed = packed & ~(3 << 12) | (SYMBOLS.index(promotion) - KNIGHT) << 12
+        return packed
+
+    def push(self, move):
+        """Play a move for the side to move, so that it can be taken back with `pop`
+
+        Args:
+            move (int): packed move, see `find_move` for a move in board coordinates
+        """
+        promotion = move_promotion(move)
+        promotion = SYMBOLS[promotion] if promotion is not None else None
+        packed, move = move, move_xy(move)
+        (x1, y1), (x2, y2) = move
+        piece = self.position[y1][x1]
+        
+        # Squares the move can change
+        squares = [(x1, y1), (x2, y2)]
+        if isinstance(piece, Pawn) and x1 != x2: squares.append((x2, y1))
+        if isinstance(piece, King) and abs(x2 - x1) == 2: 
+            squares.extend([(0, y1), (3, y1)] if x2 < x1 else [(7, y1), (5, y1)])
+        
+        record = Undo(self, packed, piece, squares)
+        captured = sum(len(pieces) for pieces in self.captured_pieces.values())
+        
+        self.move_piece(self.current_color, piece, move, promotion)
+        self.next_turn(piece, move)
+        
+        if sum(len(pieces) for pieces in self.captured_pieces.values()) > captured:
+            record.captured = self.captured_pieces[piece.enemy_color][-1]
+        if self.promotion: record.promoted = self.position[y2][x2]
+        record.key = self.position_to_key()
+        self.undo_stack.append(record)
+
+    def pop(self):
+        """Take back the last move played with `push`, and return it (packed)"""
+        record = self.undo_stack.pop()
+        self.invalidate()
+        self.bitboard.pop()
+        
+        piece = record.piece
+        color = piece.color
+        
+        for x, y, square in record.squares: self.position[y][x] = square
+        for square, x, y, has_moved in record.locations:
+            square.x, square.y = x, y
+            square.has_moved = has_moved
+            square.set_coordinate()
+        
+        if record.captured is not None:
+            self.captured_pieces[record.captured.color].pop()
+            self.pieces[record.captured.color].add(record.captured)
+        
+        if record.promoted is not None:
+            self.pieces[color].discard(record.promoted)
+            self.pieces[color].add(piece)
+        
+        for king, castling in record.kings: king.castling = castling
+        
+        self.king_position = record.king_position
+        self.previous_move = record.previous_move
+        self.move_nr = record.move_nr
+        self.current_player = record.current_player
+        self.current_color = 'wb'[self.current_player]
+        self.end_conditions = record.end_conditions
+        self.winner = record.winner
+        
+        # The history was either updated or replaced by a new one
+        self.position_history[record.key] -= 1
+        if self.position_history[record.key] == 0: del self.position_history[record.key]
+        self.position_history = record.position_history
+        
+        del self.move_history[record.move_history_len:]
+        if record.move_history is not None: self.move_history[-1] = record.move_history
+        
+        return record.move
+
+    def move_piece(self, color, moving_piece, move, promotion=None):
         """Make move"""
+        legal_moves = self.all_possible_moves[color] if self.is_updated() else None
+        self.invalidate()
         self.current_color = color
         self.moving = moving_piece
         
-        (x2, y2) = move[1]
+        (x1, y1), (x2, y2) = move
         
         if isinstance(self.moving, King): 
             self.king_position[self.current_color] = (x2, y2)
@@ -125,9 +352,15 @@ class Board:
         self.special_moves(x2, y2)
 
         if self.en_passant: self.is_en_passant(move)
-        elif self.promotion: self.is_promotion(move)
+        elif self.promotion: self.is_promotion(move, promotion)
         elif self.castling: self.is_castle(move)
         else: self.make_move(move)
+        
+        # Keep the bitboards in sync with the piece objects
+        promotion = SYMBOLS.index(self.position[y2][x2].symbol) if self.promotion else None
+        packed = self.bitboard.to_move(y1 * 8 + x1, y2 * 8 + x2, promotion)
+        self.notation = self.get_notation(packed, legal_moves)
+        self.bitboard.push(packed)
 
     def special_moves(self, x, y):
         """[summary]
@@ -137,7 +370,9 @@ class Board:
             y ([type]): [description]
         """
         
-        if isinstance(self.moving, Pawn) and (x, y) == self.moving.EPT: 
+        # Diagonal pawn move to an empty square
+        if (isinstance(self.moving, Pawn) and x != self.moving.x 
+            and isinstance(self.position[y][x], Empty)): 
             self.en_passant = True
         else: self.en_passant = False
         
@@ -145,7 +380,8 @@ class Board:
             self.promotion = True
         else: self.promotion = False
         
-        if isinstance(self.moving, King) and (x, y) in self.moving.castling_loc: 
+        # King moves two squares
+        if isinstance(self.moving, King) and abs(x - self.moving.x) == 2: 
             self.castling = True
         else: self.castling = False
         
@@ -154,21 +390,20 @@ class Board:
         self.make_move(move)
         
         # Capture other pawn
-        ept_y = y2 - self.moving.walk_direction
+        ept_y = y2 - (1 if self.moving.color == 'w' else -1)
         en_passant_target = self.position[ept_y][x2]
         
         if not isinstance(en_passant_target, Empty): self.remove_piece(en_passant_target)
         
-        self.id += 1
-        self.position[ept_y][x2] = Empty(str(self.id), x2, ept_y)
+        self.position[ept_y][x2] = self.empty_squares[ept_y][x2]
 
-    def is_promotion(self, move):
+    def is_promotion(self, move, symbol=None):
         x2, y2 = move[1]
         self.make_move(move)
                 
-        # Random promotion
+        # Random promotion, unless the piece is given
         self.id += 1
-        piece_nr = random.choice([0, 1, 2, 3])
+        piece_nr = random.choice([0, 1, 2, 3]) if symbol is None else 'QRBN'.index(symbol)
         piece_type = [Queen, Rook, Bishop, Knight][piece_nr]
         
         symbol = 'Q'
@@ -178,9 +413,8 @@ class Board:
         elif piece_nr == 2: symbol = 'B'
         elif piece_nr == 3: symbol = 'N'
             
-        promotion_piece = piece_type(str(self.id), symbol, self.moving.color, x2, y2, self.square_width, self.square_height)
+        promotion_piece = piece_type(str(self.id), symbol, self.moving.color, x2, y2)
         promotion_piece.points = 1
-        promotion_piece.set_piece_value(promotion_piece.value_table)
         
         self.pieces[self.current_color].discard(self.moving)
         self.pieces[self.current_color].add(promotion_piece)
@@ -205,13 +439,10 @@ class Board:
         
         # Move the rook
         x1 = rook.x
-        rook.x = new_square.x
-        rook.y = y2
-        rook.set_piece_value(rook.value_table)
+        rook.make_move(new_square.x, y2)
         
         self.position[new_square.y][new_square.x] = rook
-        self.id += 1
-        self.position[y2][x1] = Empty(str(self.id), x1, y2)
+        self.position[y2][x1] = self.empty_squares[y2][x1]
 
     def make_move(self, move):
         """Make the move and update board variables
@@ -220,17 +451,13 @@ class Board:
             x2 (int): [description]
             tile_y2 (int): [description]
         """
-        self.capture = False
         (x1, y1), (x2, y2) = move
         self.moving.make_move(x2, y2)
         
-        self.position[y1][x1] = Empty(str(self.id + 1), x1, y1)
+        self.position[y1][x1] = self.empty_squares[y1][x1]
 
         if not isinstance(self.position[y2][x2], Empty): 
             self.remove_piece(self.position[y2][x2])
-            self.capture = True
-            
-        if self.en_passant: self.capture = True
             
         self.position[y2][x2]= self.moving
         self.previous_move = move
@@ -240,58 +467,104 @@ class Board:
         self.captured_pieces[color].append(piece)
         self.pieces[color].discard(piece)
     
-    def check_for_block_or_pin(self, king, piece):
-        """Check if piece is pinned and can block or capture attacker
+    def filter_legal_moves(self, color):
+        """Keep the legal moves of the pieces of a color. The checkers, check evasion 
+        mask and pin rays are computed once from the bitboards, after which every 
+        move is a mask test.
 
         Args:
-            king ():
-            piece ([type]): [description]
-
-        Returns:
-            Piece: the piece that pins the current piece
+            color (str): color of the pieces, 'w' or 'b'
         """
-
-        # Double check
-        if len(king.attacked_by['direct'].keys()) > 1:
-            piece.can_move = False
-            piece.valid_moves = []
-        
-        # Check: look for block or capture of attacking piece
-        elif king.in_check:
-            king_attacker_ids = king.attacked_by['direct'].keys()
-            
-            for attacker_id in king_attacker_ids:
-                moves = piece.can_block_or_capture(king.attacked_by['direct'][attacker_id])
-            
-                if moves:
-                    piece.can_move = True
-                    piece.valid_moves = moves
-                    return
-
-            piece.can_move = False
-            piece.valid_moves = []
-
-        # Pin: check for capture of attacking piece
-        elif king.attacked_by['indirect']:         
-            king_attacker_ids = king.attacked_by['indirect'].keys()
-            piece_attacker_ids = piece.attacked_by['direct'].keys()
-            
-            for attacker_id in piece_attacker_ids:
-                if attacker_id in king_attacker_ids:
-                    moves = piece.can_block_or_capture(king.attacked_by['indirect'][attacker_id])
-            
-                    if moves: piece.can_move = True
-                    else: piece.can_move = False
+        bitboard = self.bitboard
+        player = COLORS.index(color)
+        checkers, evasions, pins = bitboard.checks_and_pins(player)
+        occupied = bitboard.occupied[0] | bitboard.occupied[1]
+        
+        for piece in self.pieces[color]:
+            if isinstance(piece, King):
+                piece.in_check = checkers != 0
+                without_king = occupied ^ piece.bit
+                moves = array('H')
+                
+                for move in piece.valid_moves:
+                    to_sq = move >> 6 & 63
+                    
+                    # Castling: not out of, through or into check
+                    if move >> 12 in (KING_CASTLE, QUEEN_CASTLE): 
+                        if (checkers 
+                            or bitboard.is_attacked(((move & 63) + to_sq) // 2, 1 - player) 
+                            or bitboard.is_attacked(to_sq, 1 - player)): continue
+                    
+                    # The square is not attacked once the king has left its square
+                    elif bitboard.attackers(to_sq, 1 - player, without_king): continue
+                    moves.append(move)
+            else:
+                targets = evasions & pins.get(piece.square, FULL)
+                moves = array('H')
                 
-                    piece.valid_moves = moves
-       
-        else: piece.can_move = True
+                for move in piece.valid_moves:
+                    # En passant removes two pieces from a line, so it is made on the occupancy
+                    if move >> 12 == EN_PASSANT:
+                        if bitboard.is_safe(move): moves.append(move)
+                    elif SQUARE_BB[move >> 6 & 63] & targets: moves.append(move)
+            
+            piece.valid_moves = moves
+            piece.can_move = bool(moves)
      
     def update_possible_moves(self):
-        """Check possible moves after last move"""
+        """Check possible moves after last move. Nothing is done when the 
+        position did not change since the last call."""
+        if self.is_updated(): return
+        self.updated_generation = self.generation
+        
+        if self.backend == 'bitboard': self.update_bitboard_moves()
+        else: self.update_object_moves()
+    
+    def update_bitboard_moves(self):
+        """Get the legal moves of the side to move from the bitboards and
+        store them on the piece objects"""
+        bitboard = self.bitboard
+        self.all_possible_moves = {'w': array('H'), 'b': array('H')}
+        
+        for color in self.pieces.keys():
+            for piece in self.pieces[color]:
+                piece.valid_moves = array('H')
+                piece.can_move = False
+            
+            x, y = self.king_position[color]
+            self.position[y][x].in_check = bitboard.in_check(COLORS.index(color))
+        
+        color = COLORS[bitboard.side]
+        position = self.position
+        all_moves = self.all_possible_moves[color]
+        for move in bitboard.legal_moves():
+            # The promotion piece is chosen when the move is made
+            if move >> 12 & PROMOTION and move >> 12 & 3 != QUEEN - KNIGHT: continue
+            
+            piece = position[move >> 3 & 7][move & 7]
+            piece.valid_moves.append(move)
+            piece.can_move = True
+            all_moves.append(move)
+        
+        # Check for game winning states
+        x, y = self.king_position[color]
+        king = self.position[y][x]
+        
+        if not self.all_possible_moves[color]:
+            if king.in_check:
+                print('checkmate')
+                self.end_conditions['checkmate'] = True
+                self.winner = 'Black' if color == 'w' else 'White'
+            else:
+                print('stalemate')
+                self.end_conditions['stalemate'] = True
+                self.winner = 'Draw'
+    
+    def update_object_moves(self):
+        """Get possible moves by letting every piece object walk the squares"""
         
         # Reset tiles
-        self.all_possible_moves = {'w': [], 'b': []}
+        self.all_possible_moves = {'w': array('H'), 'b': array('H')}
         
         for rows in self.position:
             for square in rows:
@@ -312,17 +585,10 @@ class Board:
             king_x, king_y = self.king_position[color]
             king = self.position[king_y][king_x]
             king.moves(self)
-            self.all_possible_moves[king.color].extend(king.valid_moves)
             
-            if king.in_check or king.attacked_by['indirect']:
-                for piece in self.pieces[color]:
-                    if not isinstance(piece, King):
-                        self.check_for_block_or_pin(king, piece)
-                        self.all_possible_moves[piece.color].extend(piece.valid_moves)
-            else:
-                for piece in self.pieces[color]: 
-                    if not isinstance(piece, King): 
-                        self.all_possible_moves[piece.color].extend(piece.valid_moves)
+            self.filter_legal_moves(color)
+            for piece in self.pieces[color]: 
+                self.all_possible_moves[piece.color].extend(piece.valid_moves)
             
             # Check for game winning states
             if (not king.in_check 
@@ -340,6 +606,7 @@ class Board:
     def next_turn(self, piece, move):
         """Update game state variables"""
         
+        self.invalidate()
         self.save_position(piece, move)
         self.current_player = 0 if self.current_player == 1 else 1
         self.current_color = 'wb'[self.current_player]
@@ -348,119 +615,56 @@ class Board:
         if self.current_color == 'w': self.move_nr += 1
         
         self.fifty_move_rule()
-        self.endgame()
     
     def fifty_move_rule(self):
-        """Fifty move rule"""
-        if self.FMR == 50:
-            self.end_conditions['FMR'] = True
-            return
-        
-        if self.capture or isinstance(self.moving, Pawn): 
-            self.FMR = 0
-            return
-        
-        else: self.FMR += 1
+        """Fifty move rule: 100 plies without a capture or pawn move, counted by
+        the bitboard (also from the halfmove clock of the FEN), like the engine"""
+        if self.bitboard.halfmove >= 100: self.end_conditions['FMR'] = True
     
-    def endgame(self):
-        """Update settings for endgame"""
-        colors = ['w', 'b']
-        total_value = self.get_value_pieces()
-        if self.move_nr > 30 or total_value < 15:
-            for color in colors:
-                x, y = self.king_position[color]
-                king = self.position[y][x]
-                king.is_endgame()
-                king.set_piece_value()
+    def hanging_pieces(self, color):
+        """Pieces of color that the other side wins material by capturing 
+        (by static exchange evaluation), e.g. to highlight them"""
+        return [self.position[sq >> 3][sq & 7] for sq in self.bitboard.hanging_pieces(COLORS.index(color))]
     
-    def get_value_pieces(self):
-        """Get value of all pieces on the board"""
-        colors = ['w', 'b']
-        total_value = 0
-        for color in colors:
-            for piece in self.pieces[color]:
-                if piece.symbol != 'K': total_value += piece.points
-        return total_value
-    
-    def get_notation(self, piece, move):
-        """"""
-        notation = ''
-        (x1, y1), (x2, y2) = move
-        
-        if piece.symbol != 'P': notation = piece.symbol
-        
-        if self.promotion: 
-            promoted_piece = self.position[y2][x2]
-            notation = piece.coordinate + '=' + promoted_piece.symbol
-        
-        elif self.en_passant:
-            notation = 'abcdefgh'[x1] + str(y1)
-            ept = self.position[piece.EPT[1]][piece.EPT[0]]
-            notation += 'x'
-            notation += ept.coordinate
-        
-        elif self.castling: 
-            if x2 == 6: notation = 'O-O'
-            if x2 == 2: notation = 'O-O-O'
-            
-        else:
-            if self.capture: 
-                if piece.symbol == 'P': notation += 'abcdefgh'[x1]
-                notation += 'x'
-            notation += piece.coordinate
-            
-        enemy_color = 'b' if self.current_color == 'w' else 'w'
-        king_x, king_y = self.king_position[enemy_color]
-        enemy_king = self.position[king_y][king_x]
-        
-        if self.end_conditions['checkmate']: notation += '#' 
-        elif enemy_king.in_check: notation += '+'
-        
-        return notation
+    def get_notation(self, move, legal_moves=None):
+        """Standard Algebraic Notation of a move of the side to move, before it is
+        made on the bitboard (see `BitBoard.san`)
+
+        Args:
+            move (int): packed move
+            legal_moves (array): legal moves of the side to move, if they are up to date
+        """
+        return self.bitboard.san(move, legal_moves)
     
     def save_position(self, piece, move):
         """"""
         # Move history
-        notation = self.get_notation(piece, move)
+        notation = self.notation
         if self.current_color == 'w': 
             self.move_history.append(str(self.move_nr) + '. ' + notation + ' ')
+        elif not self.move_history:
+            # Game started from a position with black to move
+            self.move_history.append(str(self.move_nr) + '... ' + notation)
         else: self.move_history[-1] += ' ' + notation
         
-        # Position history
+        # Position history: positions before a capture or pawn move 
+        # (which resets the fifty move counter) can not be repeated
+        if self.bitboard.halfmove == 0: self.position_history = {}
+        
         key = self.position_to_key()
-        if str(key) in self.position_history.keys():
-            self.position_history[str(key)] += 1
-            if self.position_history[str(key)] == 3: self.end_conditions['3_fold_rep'] = True
-        else: self.position_history[str(key)] = 1
+        self.position_history[key] = self.position_history.get(key, 0) + 1
+        if self.position_history[key] == 3: self.end_conditions['3_fold_rep'] = True
 
     def position_to_key(self):
         """For a repetition of position to occur, the following three rules have to met:
         1) The same position must be repeated three times.
         2) The same player must be on the move each time.
         3) The same move options must be available each time. (En passant, castling)
-        """        
-        save_board = []
-        colors = ['w', 'b']
         
-        for row in self.position:
-            save_row = []
-            for square in row:
-                if not isinstance(square, Empty): save_row.append(square.symbol)
-                else: save_row.append('0')
-            save_board.append(tuple(save_row))
-        save_board = tuple(save_board)
-        
-        player_rights = []
-        if self.en_passant: player_rights.append(self.moving.EPT)
-        
-        for color in colors:
-            x, y = self.king_position[color]
-            king = self.position[y][x]
-            player_rights.append(king.castling)
-        player_rights = tuple(player_rights)
-        
-        key = (save_board, self.current_player, player_rights)
-        return key
+        The Zobrist hash of the bitboards covers all three, and is updated 
+        incrementally with every move.
+        """        
+        return self.bitboard.hash
 
     def tile_coord_to_piece(self, y):
         """"""
@@ -0,0 +1,182 @@
+"""Portable Game Notation: a streaming reader and a writer of games.
+
+The reader is a generator over the lines of a file, so files of any size are
+read one game at a time. The moves are resolved against the legal moves of
+the position as they are read (see `BitBoard.parse_san`), so a game comes
+with its packed moves, ready to be replayed on a `BitBoard` or a `Board`.
+Comments, variations, move numbers and annotation glyphs are skipped.
+
+The writer formats a game from its starting position and packed moves, e.g.
+the move records of a `Board` (see `Board.to_game`).
+"""
+import re
+from array import array
+from model.bitboard import BitBoard, START_FEN, WHITE
+
+
+# Game termination markers
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+
+# Tags every game has, in this order
+SEVEN_TAG_ROSTER = ('Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result')
+
+TAG = re.compile(r'\[\s*(\w+)\s*"((?:[^"\\]|\\.)*)"\s*\]')
+
+# Movetext tokens of lines with comments or variations
+MOVETEXT_TOKEN = re.compile(r'[{}();]|[^\s{}();]+')
+
+# Line length of the movetext
+LINE_LENGTH = 80
+
+
+class Game:
+    """A game: tag pairs, packed moves from the starting position and the result"""
+
+    __slots__ = ('tags', 'moves', 'result', 'error')
+
+    def __init__(self, tags=None, moves=(), result='*'):
+        """Args:
+            tags (dict): tag pairs, the FEN tag is the starting position
+            moves (iterable): packed moves
+            result (str): '1-0', '0-1', '1/2-1/2' or '*'
+        """
+        self.tags = {} if tags is None else tags
+        self.moves = array('H', moves)
+        self.result = result
+
+        # Why the moves stop early, e.g. at an illegal move
+        self.error = None
+
+    @property
+    def fen(self):
+        """Starting position"""
+        return self.tags.get('FEN', START_FEN)
+
+    def board(self):
+        """Position after the moves"""
+        board = BitBoard.from_fen(self.fen)
+        for move in self.moves: board.push(move)
+        return board
+
+
+def read_games(file, plies=None):
+    """Games of a PGN file, one at a time.
+
+    Args:
+        file (file): PGN text file, iterated line by line
+        plies (int): number of moves to read per game (all by default), the
+            following ones are skipped without being resolved
+
+    Yields:
+        Game: tags, moves and result of the next game. A game with an invalid
+            starting position or an illegal move has its moves up to it, and
+            the reason in `error`.
+    """
+    game = None
+    board = None
+    tags = {}
+    finished = False
+
+    # Comment and variation nesting of the movetext
+    comment = False
+    depth = 0
+
+    for line in file:
+        if line[:1] == '%': continue
+
+        if line[:1] == '[' and not comment and not depth:
+            if game is not None:
+                yield game
+                game, tags, finished = None, {}, False
+            for name, value in TAG.findall(line): tags[name] = re.sub(r'\\(.)', r'\1', value)
+            continue
+
+        # Lines without comments or variations are split on whitespace
+        if comment or depth or '{' in line or '(' in line or ';' in line or '}' in line or ')' in line:
+            tokens = []
+            for token in MOVETEXT_TOKEN.findall(line):
+                if comment:
+                    if token == '}': comment = False
+                elif token == '{': comment = True
+                elif token == ';': break
+                elif token == '(': depth += 1
+                elif token == ')': depth = max(0, depth - 1)
+                elif not depth: tokens.append(token)
+        else: tokens = line.split()
+
+        for token in tokens:
+            if finished:
+                # Movetext of a game without tags
+                yield game
+                game, tags, finished = None, {}, False
+
+            if game is None:
+                game = Game(tags, result=tags.get('Result', '*'))
+                try: board = BitBoard.from_fen(game.fen)
+                except ValueError as error: game.error = f'Invalid position: {error}'
+
+            if token in RESULTS:
+                game.result = token
+                finished = True
+                continue
+
+            # Move numbers ('12.', '12...', '12.e4'), annotation glyphs
+            if token[0].isdigit() and not token.startswith('0-0'):
+                token = token.lstrip('0123456789.')
+                if not token: continue
+            if token[0] in '$!?': continue
+
+            if game.error is not None or len(game.moves) == plies: continue
+            try: move = board.parse_san(token)
+            except ValueError as error:
+                game.error = str(error)
+                continue
+            board.push(move)
+            game.moves.append(move)
+
+    # Tags without movetext are a game without moves
+    if game is None and tags: game = Game(tags, result=tags.get('Result', '*'))
+    if game is not None: yield game
+
+
+def escape(value):
+    """Tag value with backslashes and quotes escaped"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def format_game(game):
+    """PGN text of a game, with the seven tag roster first"""
+    tags = {name: game.tags.get(name, '?') for name in SEVEN_TAG_ROSTER}
+    tags['Result'] = game.result
+    fen = game.fen
+    if fen != START_FEN:
+        tags['SetUp'] = '1'
+        tags['FEN'] = fen
+    for name, value in game.tags.items(): tags.setdefault(name, value)
+
+    lines = [f'[{name} "{escape(value)}"]' for name, value in tags.items()]
+    lines.append('')
+
+    # Movetext, wrapped between moves: a move number stays on the line of its move
+    board = BitBoard.from_fen(fen)
+    tokens = []
+    for i, move in enumerate(game.moves):
+        if board.side == WHITE: tokens.append(f'{board.fullmove}. {board.san(move)}')
+        elif i == 0: tokens.append(f'{board.fullmove}... {board.san(move)}')
+        else: tokens.append(board.san(move))
+        board.push(move)
+    tokens.append(game.result)
+
+    line = ''
+    for token in tokens:
+        if len(line) + len(token) >= LINE_LENGTH:
+            lines.append(line)
+            line = token
+        else: line = line + ' ' + token if line else token
+    lines.append(line)
+    return '\n'.join(lines) + '\n'
+
+
+def write_game(file, game):
+    """Append a game to a PGN file"""
+    file.write(format_game(game) + '\n')
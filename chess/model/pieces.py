@@ -1,7 +1,15 @@
 
 
+from array import array
+from model.bitboard import (SQUARE_BB, KNIGHT, QUEEN, QUIET, DOUBLE_PUSH, CAPTURE, EN_PASSANT, 
+                            PROMOTION, KING_CASTLE, QUEEN_CASTLE, encode_move)
+
+
 class Empty:
-    """Class for empty squares"""
+    """Class for empty squares. A board creates one per square and reuses 
+    it whenever the square becomes empty."""
+
+    __slots__ = ('id', 'x', 'y', 'coordinate', 'attacked_by')
 
     LETTERS = 'abcdefgh'
     
@@ -9,19 +17,25 @@ class Empty:
         self.id = id
         self.x = x
         self.y = y
-        self.attacked_by = {'direct': dict(), 'indirect': dict()}
+        
+        # Squares of the pieces that attack this square, as a 64-bit mask
+        self.attacked_by = 0
         self.coordinate = self.LETTERS[self.x] + str(self.y + 1)
     
     def reset(self):
-        self.attacked_by = {'direct': dict(), 'indirect': dict()}
+        self.attacked_by = 0
         
 
 class Piece:
     """Base class for all pieces"""
 
+    __slots__ = ('id', 'symbol', 'color', 'enemy_color', 'player', 'x', 'y', 'square', 'bit', 'coordinate', 
+                 'points', 'can_move', 'has_moved', 'is_blocked', 'valid_moves', 
+                 'attacked_by', 'direction')
+
     LETTERS = 'abcdefgh'
 
-    def __init__(self, id, symbol, color, x, y, square_width, square_height):
+    def __init__(self, id, symbol, color, x, y):
         
         self.id = id
         self.symbol = symbol
@@ -31,78 +45,62 @@ class Piece:
         
         self.x = x
         self.y = y
-        self.upper_y = 0 if self.color == 'w' else square_height
 
         self.can_move = True
         self.has_moved = False
         self.is_blocked = False
         
-        self.valid_moves = []
-        self.attacks = {'direct': dict(), 'indirect': dict()}
-        self.attacked_by = {'direct': dict(), 'indirect': dict()}
-        self.defended_by = set()
+        self.valid_moves = array('H')
+        
+        # Squares of the pieces that attack this piece, as a 64-bit mask
+        self.attacked_by = 0
 
-        self.direction = [-1, 1]
+        self.direction = (-1, 1)
         self.set_coordinate()
 
     def set_coordinate(self):
         self.coordinate = self.LETTERS[self.x] + str(self.y + 1)
+        self.square = self.y * 8 + self.x
+        self.bit = SQUARE_BB[self.square]
 
-    def set_subsection(self, index, square_width, square_height):
-        self.left_x = index * square_width
-        self.subsection = (self.left_x, self.upper_y, square_width, square_height)
-        self.pos = (-1, -1)
-
-    def set_piece_value(self, value_table):
-        self.value = value_table[self.y][self.x]
-       
-    def check_square(self, board, x, y, attack_line, direct_attack):
-        """[summary]
+    def check_square(self, board, x, y, direct_attack):
+        """Register the attack of the piece on a square.
 
         Args:
-            board ([type]): [description]
-            x ([type]): [description]
-            y ([type]): [description]
-            direct_attack ([type]): [description]
+            board (Board): the board
+            x (int): x-coordinate of the square
+            y (int): y-coordinate of the square
+            direct_attack (bool): no piece stands between the piece and the square
 
         Returns:
-            [type]: [description]
+            bool: whether the next square on the line is attacked directly
         """
-
-        attack_type = 'direct' if direct_attack else 'indirect'
         square = board.position[y][x]
         
-        try: index = attack_line.index([(self.x, self.y), (square.x, square.y)]) + 1
-        except ValueError: index = len(attack_line) + 1
-        
-        
         if not isinstance(square, Empty):
             # Pawn cannot occupy non-empty states
             if isinstance(self, Pawn): self.is_blocked = True
             else:
                 if square.color != self.color and not self.is_blocked:
-                    square.attacked_by[attack_type][str(self.id)] = attack_line[:index]
-                    self.attacks[attack_type][str(square.id)] = attack_line[:index]
+                    if direct_attack: self.add_attack_map(square)
                     
                     # Can't capture king
-                    if direct_attack and not isinstance(square, King):
-                        self.valid_moves.append([(self.x, self.y), (square.x, square.y)])
+                    if direct_attack and not isinstance(square, King): self.add_move(x, y, capture=True)
                         
-                else:
-                    square.defended_by.add(self.id)
-                    self.is_blocked = True
+                else: self.is_blocked = True
                     
                 return False
 
-        else:
-            square.attacked_by[attack_type][str(self.id)] = attack_line[:index]
-            self.attacks[attack_type][str(square.id)] = attack_line[:index]
-
-            if direct_attack:
-                self.valid_moves.append([(self.x, self.y), (square.x, square.y)])
+        elif direct_attack:
+            self.add_attack_map(square)
+            self.add_move(x, y)
         
         return direct_attack
 
+    def add_attack_map(self, square):
+        """Save the attack on square in its attack map"""
+        square.attacked_by |= self.bit
+
     def horizontal_moves(self, board, max_range):
         """Check all horizontal squares the piece can move to, and
         possibly capture another piece."""
@@ -110,8 +108,6 @@ class Piece:
         for dx in self.direction:
             x_possible = self.x
             y_possible = self.y
-            attack_line = [(x_possible, y_possible)]
-            
             direct_attack = True
             self.is_blocked = False
 
@@ -119,11 +115,9 @@ class Piece:
                 
                 x_possible += dx
                 if 0 <= x_possible <= 7:
-                    attack_line.extend([(x_possible, y_possible)])
                     direct_attack = self.check_square(board, 
                                                       x_possible, 
                                                       y_possible,
-                                                      attack_line,
                                                       direct_attack)
                 else: break
                 
@@ -135,8 +129,6 @@ class Piece:
         
         for dy in self.direction:
             
-            attack_line = [(self.x, self.y)]
-            
             direct_attack = True
             self.is_blocked = False
 
@@ -146,11 +138,9 @@ class Piece:
                 
                 y_possible += dy
                 if 0 <= y_possible <= 7:
-                    attack_line.extend([(self.x, y_possible)])
                     direct_attack = self.check_square(board, 
                                                       self.x, 
-                                                      y_possible, 
-                                                      attack_line,
+                                                      y_possible,
                                                       direct_attack)
                 else: break
                 
@@ -164,8 +154,6 @@ class Piece:
             x_possible = self.x
             y_possible = self.y
 
-            attack_line = [(x_possible, y_possible)]
-
             direct_attack = True
             self.is_blocked = False
 
@@ -175,11 +163,9 @@ class Piece:
 
                 # Check first diagonal
                 if 0 <= x_possible <= 7 and 0 <= y_possible <= 7:
-                    attack_line.extend([(x_possible, y_possible)])
                     direct_attack = self.check_square(board, 
                                                       x_possible, 
-                                                      y_possible, 
-                                                      attack_line,
+                                                      y_possible,
                                                       direct_attack)
                 else: break
                     
@@ -188,7 +174,6 @@ class Piece:
             # Reset search square
             x_possible = self.x
             y_opposite = self.y
-            attack_line = [(x_possible, y_opposite)]
             
             direct_attack = True
             self.is_blocked = False
@@ -199,11 +184,9 @@ class Piece:
                 y_opposite -= d
 
                 if 0 <= x_possible <= 7 and 0 <= y_opposite <= 7:
-                    attack_line.extend([(x_possible, y_possible)])
                     direct_attack = self.check_square(board, 
                                                       x_possible, 
                                                       y_opposite,
-                                                      attack_line, 
                                                       direct_attack)
                 else: break
             
@@ -211,74 +194,60 @@ class Piece:
 
     def add_attack(self, square):
         """Save how piece attacks square"""
-        square.attacked_by['direct'][str(self.id)] = [(self.x, self.y), (square.x, square.y)]
-        self.attacks['direct'][str(self.id)] = [(self.x, self.y), (square.x, square.y)]
+        self.add_attack_map(square)
         
         # Can't capture king
-        if not isinstance(square, King): self.valid_moves.append([(self.x, self.y), (square.x, square.y)])
+        if not isinstance(square, King): self.add_move(square.x, square.y, capture=not isinstance(square, Empty))
+
+    def add_move(self, x, y, capture=False):
+        """Add the move to square (x, y) to the valid moves, as packed move"""
+        self.valid_moves.append(encode_move(self.square, y * 8 + x, CAPTURE if capture else QUIET))
 
     def make_move(self, x, y):
         """Update piece variables to new position on the board"""
         self.x = x
         self.y = y
         self.has_moved = True
-        self.set_piece_value(self.value_table)
         self.set_coordinate()
     
-    def can_block_or_capture(self, attack_line):
-        """If check, or pinned, the piece may be able to capture or block attacker"""
-        moves = []
-        for x1, y1 in attack_line:
-            if [(self.x, self.y), (x1, y1)] in self.valid_moves: 
-                moves.append([(self.x, self.y), (x1, y1)])
-        return moves
-    
     def reset(self):
         """Reset piece variables each turn"""
         self.can_move = True
         self.is_blocked = False
-        self.attacks = {'direct': dict(), 'indirect': dict()}
-        self.attacked_by = {'direct': dict(), 'indirect': dict()}
-        self.defended_by = set()
+        self.attacked_by = 0
         
 
 class Pawn(Piece):
     """Class for pawns"""
 
-    def __init__(self, id, symbol, color, x, y, square_width, square_height):
-        super().__init__(id, symbol, color, x, y, square_width, square_height)
-        self.EPT = -1
-        self.index = 5
+    __slots__ = ('promotion_target', 'walk_direction')
+
+    def __init__(self, id, symbol, color, x, y):
+        super().__init__(id, symbol, color, x, y)
         self.points = 1
         self.promotion_target = 7 if color == 'w' else 0
-        self.set_value_table()
-        self.set_subsection(self.index, square_width, square_height)
-        self.set_piece_value(self.value_table) 
-
-    def set_value_table(self):
-        self.value_table = [[0, 0, 0, 0, 0, 0, 0, 0],
-                            [50, 50, 50, 50, 50, 50, 50, 50],
-                            [10, 10, 20, 30, 30, 20, 10, 10],
-                            [5, 5, 10, 25, 25, 10, 5, 5],
-                            [0, 0, 0, 20, 20, 0, 0, 0],
-                            [5, -5, -10, 0, 0, -10, -5, 5],
-                            [5, 10, 10, -20, -20, 10, 10, 5],
-                            [0, 0, 0, 0, 0, 0, 0, 0]]
+        self.walk_direction = 1 if color == 'w' else -1
+        self.direction = (self.walk_direction,)
 
     def moves(self, board):
         """"""
         self.is_blocked = False
-        self.valid_moves = []
+        self.valid_moves = array('H')
         
         max_range = 2 if not self.has_moved else 1
-        self.walk_direction = 1 if self.color == 'w'  else -1
-        self.direction = [self.walk_direction]
         
         self.vertical_moves(board, max_range)
         self.captures(board)
         self.en_passant(board)
         return self.valid_moves
 
+    def add_move(self, x, y, capture=False):
+        """Add the move to square (x, y), a pawn reaching the last rank promotes to a queen"""
+        flags = CAPTURE if capture else QUIET
+        if y == self.promotion_target: flags |= PROMOTION | QUEEN - KNIGHT
+        elif abs(y - self.y) == 2: flags = DOUBLE_PUSH
+        self.valid_moves.append(encode_move(self.square, y * 8 + x, flags))
+
     def captures(self, board):
         """"""
         if self.x != 0:
@@ -301,43 +270,29 @@ class Pawn(Piece):
                 square = board.position[self.y][self.x - 1]
                 if board.previous_move == [(self.x - 1, self.y + w), (self.x - 1, self.y)] \
                    and isinstance(square, Pawn):
-                        self.valid_moves.append([(self.x, self.y), 
-                                                 (square.x, square.y + self.walk_direction)])
-                        self.EPT = (square.x, square.y + self.walk_direction)
+                        self.valid_moves.append(encode_move(self.square, (square.y + self.walk_direction) * 8 + square.x, 
+                                                            EN_PASSANT))
                                     
             if self.x != 7:
                 square = board.position[self.y][self.x + 1]
                 if board.previous_move == [(self.x + 1, self.y + w), (self.x + 1, self.y)] \
                    and isinstance(square, Pawn):
-                        self.valid_moves.append([(self.x, self.y), 
-                                                 (square.x, square.y + self.walk_direction)])
-                        self.EPT = (square.x, square.y + self.walk_direction)
+                        self.valid_moves.append(encode_move(self.square, (square.y + self.walk_direction) * 8 + square.x, 
+                                                            EN_PASSANT))
 
     
 class Knight(Piece):
     """Class for knights"""
-    
-    def __init__(self, id, symbol, color, x, y, square_width, square_height):
-        super().__init__(id, symbol, color, x, y, square_width, square_height)
-        self.index = 3
+
+    __slots__ = ()
+
+    def __init__(self, id, symbol, color, x, y):
+        super().__init__(id, symbol, color, x, y)
         self.points = 3
-        self.set_value_table()
-        self.set_subsection(self.index, square_width, square_height)
-        self.set_piece_value(self.value_table)
-
-    def set_value_table(self):
-        self.value_table = [[-50, -40, -30, -30, -30, -30, -40, -50],
-                            [-40, -20, 0, 0, 0, 0, -20, -40],
-                            [-30, 0, 10, 15, 15, 10, 0, -30],
-                            [-30, 5, 15, 20, 20, 15, 5, -30],
-                            [-30, 0, 15, 20, 20, 15, 0, -30],
-                            [-30, 5, 10, 15, 15, 10, 5, -30],
-                            [-40, -20, 0, 5, 5, 0, -20, -40],
-                            [-50, -90, -30, -30, -30, -30, -90, -50]]
 
     def moves(self, board):
         """A knight can either move +2/-2 in x direction and +1/-1 in y direction, or the other way around"""
-        self.valid_moves = []       
+        self.valid_moves = array('H')       
         for dx in self.direction:
             # Possible squares that are +1/-1 in x, +2/-2 in y away from original square
             x_possible = self.x + dx
@@ -369,53 +324,30 @@ class Knight(Piece):
 class Bishop(Piece):
     """Class for bishops"""
 
-    def __init__(self, id, symbol, color, x, y, square_width, square_height):
-        super().__init__(id, symbol, color, x, y, square_width, square_height)
-        self.index = 2
+    __slots__ = ()
+
+    def __init__(self, id, symbol, color, x, y):
+        super().__init__(id, symbol, color, x, y)
         self.points = 3
-        self.set_value_table()
-        self.set_subsection(self.index, square_width, square_height)
-        self.set_piece_value(self.value_table)
-
-    def set_value_table(self):
-        self.value_table = [[-20, -10, -10, -10, -10, -10, -10, -20],
-                            [-10, 0, 0, 0, 0, 0, 0, -10],
-                            [-10, 0, 5, 10, 10, 5, 0, -10],
-                            [-10, 5, 5, 10, 10, 5, 5, -10],
-                            [-10, 0, 10, 10, 10, 10, 0, -10],
-                            [-10, 10, 10, 10, 10, 10, 10, -10],
-                            [-10, 5, 0, 0, 0, 0, 5, -10],
-                            [-20, -10, -90, -10, -10, -90, -10, -20]]
+
     
     def moves(self, board):
-        self.valid_moves = []
+        self.valid_moves = array('H')
         self.diagonal_moves(board=board, max_range=7)
         return self.valid_moves
 
 
 class Rook(Piece):
     """Class for rooks"""
-    
-    def __init__(self, id, symbol, color, x, y, square_width, square_height):
-        super().__init__(id, symbol, color, x, y, square_width, square_height)
-        self.index = 4
+
+    __slots__ = ()
+
+    def __init__(self, id, symbol, color, x, y):
+        super().__init__(id, symbol, color, x, y)
         self.points = 5
-        self.set_value_table()
-        self.set_subsection(self.index, square_width, square_height)
-        self.set_piece_value(self.value_table)
-
-    def set_value_table(self):
-        self.value_table = [[0, 0, 0, 0, 0, 0, 0, 0],
-                            [5, 10, 10, 10, 10, 10, 10, 5],
-                            [-5, 0, 0, 0, 0, 0, 0, -5],
-                            [-5, 0, 0, 0, 0, 0, 0, -5],
-                            [-5, 0, 0, 0, 0, 0, 0, -5],
-                            [-5, 0, 0, 0, 0, 0, 0, -5],
-                            [-5, 0, 0, 0, 0, 0, 0, -5],
-                            [0, 0, 0, 5, 5, 0, 0, 0]]
 
     def moves(self, board):
-        self.valid_moves = []
+        self.valid_moves = array('H')
         self.horizontal_moves(board=board, max_range=7)
         self.vertical_moves(board=board, max_range=7)
         return self.valid_moves
@@ -423,27 +355,15 @@ class Rook(Piece):
 
 class Queen(Piece):
     """Class for the queen"""
-    
-    def __init__(self, id, symbol, color, x, y, square_width, square_height):
-        super().__init__(id, symbol, color, x, y, square_width, square_height)
-        self.index = 1
+
+    __slots__ = ()
+
+    def __init__(self, id, symbol, color, x, y):
+        super().__init__(id, symbol, color, x, y)
         self.points = 9
-        self.set_value_table()
-        self.set_subsection(self.index, square_width, square_height)
-        self.set_piece_value(self.value_table)
-
-    def set_value_table(self):
-        self.value_table = [[-20, -10, -10, -5, -5, -10, -10, -20],
-                            [-10, 0, 0, 0, 0, 0, 0, -10],
-                            [-10, 0, 5, 5, 5, 5, 0, -10],
-                            [-5, 0, 5, 5, 5, 5, 0, -5],
-                            [0, 0, 5, 5, 5, 5, 0, -5],
-                            [-10, 5, 5, 5, 5, 5, 0, -10],
-                            [-10, 0, 5, 0, 0, 0, 0, -10],
-                            [-20, -10, -10, 70, -5, -10, -10, -20]]
 
     def moves(self, board):
-        self.valid_moves = []       
+        self.valid_moves = array('H')       
         self.horizontal_moves(board=board, max_range=7)
         self.vertical_moves(board=board, max_range=7)
         self.diagonal_moves(board=board, max_range=7)
@@ -452,36 +372,14 @@ class Queen(Piece):
 
 class King(Piece):
     """Class for the king"""
-    
-    def __init__(self, id, symbol, color, x, y, square_width, square_height):
-        super().__init__(id, symbol, color, x, y, square_width, square_height)
-        self.index = 0
+
+    __slots__ = ('in_check', 'castling')
+
+    def __init__(self, id, symbol, color, x, y):
+        super().__init__(id, symbol, color, x, y)
         self.points = 9999
         self.in_check = False
         self.castling = [True, True]
-        self.set_value_table()
-        self.set_subsection(self.index, square_width, square_height)
-        self.set_piece_value(self.value_table)
-
-    def set_value_table(self):
-        self.value_table = [[-30, -40, -40, -50, -50, -40, -40, -30],
-                            [-30, -40, -40, -50, -50, -40, -40, -30],
-                            [-30, -40, -40, -50, -50, -40, -40, -30],
-                            [-30, -40, -40, -50, -50, -40, -40, -30],
-                            [-20, -30, -30, -40, -40, -30, -30, -20],
-                            [-10, -20, -20, -20, -20, -20, -20, -10],
-                            [20, 20, 0, 0, 0, 0, 20, 20],
-                            [20, 30, 10, 0, 0, 10, 30, 20]]
-    
-    def is_endgame(self):
-        self.value_table = [[-50, -40, -30, -20, -20, -30, -40, -50],
-                            [-30, -20, -10, 0, 0, -10, -20, -30],
-                            [-30, -10, 20, 30, 30, 20, -10, -30],
-                            [-30, -10, 30, 40, 40, 30, -10, -30],
-                            [-30, -10, 30, 40, 40, 30, -10, -30],
-                            [-30, -10, 20, 30, 30, 20, -10, -30],
-                            [-30, -30, 0, 0, 0, 0, -30, -30],
-                            [-50, -30, -30, -30, -30, -30, -30, -50]]
 
     def get_neighboring_squares(self, board):
         """[summary]
@@ -510,72 +408,34 @@ class King(Piece):
     
     def moves(self, board):
         """For the king, one need to checks the 8 surrounding squares, 
-        for being in check, and castling options."""
-        self.in_check = self.is_check(board.pieces[self.enemy_color])
-        self.normal_moves(board, self.in_check)
-        if not self.in_check or self.has_moved: self.castling_rights(board)
+        and castling options. Moves into or through check are removed by 
+        `Board.filter_legal_moves`."""
+        self.in_check = self.is_check(board)
+        self.normal_moves(board)
+        self.castling_rights(board)
                      
-    def normal_moves(self, board, check):
-        """[summary]
+    def normal_moves(self, board):
+        """Moves to the neighbouring squares that are empty or hold an enemy piece
 
         Args:
-            board ([type]): [description]
-            check ([type]): [description]
+            board (Board): the board
         """
-        self.valid_moves = []
-        squares = self.get_neighboring_squares(board)
+        self.valid_moves = array('H')
         
-        for (x, y) in squares:
+        for (x, y) in self.get_neighboring_squares(board):
             square = board.position[y][x]
+            self.add_attack_map(square)
             
-            # Filled squares
-            if not isinstance(square, Empty):
-                
-                # Enemy pieces
-                if square.color != self.color:
-                    square.attacked_by['direct'][self.id] = [(self.x, self.y), (x, y)]
-                    self.attacks['direct'][square.id] = [(self.x, self.y), (x, y)]
-                    
-                    # Enemy piece is not defended and can be captured
-                    if len(square.defended_by) == 0: self.valid_moves.append([(self.x, self.y), (x, y)])
-                
-                # Friendly piece  
-                else: square.defended_by.add(self.id)
-                
-            # Empty squares
-            else:
-                possible = True
-                square.attacked_by['direct'][self.id] = [(self.x, self.y), (x, y)]
-                
-                # Square not attacked directly
-                if not square.attacked_by['direct'].keys(): 
-                    square.attacked_by['direct'][self.id] = [(self.x, self.y), (x, y)]
-                    self.attacks['direct'][square.id] = [(self.x, self.y), (x, y)]
-                    self.valid_moves.append([(self.x, self.y), (x, y)])
-                    break
-                
-                # Square is attacked
-                if square.attacked_by['direct'].keys():
-                    for enemy_piece in board.pieces[self.enemy_color]:
-                        if enemy_piece.id in square.attacked_by['direct'].keys(): possible = False
-                        
-                        # X-ray attack (only when in check)
-                        if check and square.attacked_by['indirect'].keys():
-                            if enemy_piece.id in square.attacked_by['indirect'].keys() and \
-                                enemy_piece.id in self.attacked_by['direct']: possible = False
-                    
-                    if possible: 
-                        square.attacked_by['direct'][self.id] = [(self.x, self.y), (x, y)]
-                        self.attacks['direct'][square.id] = [(self.x, self.y), (x, y)]
-                        self.valid_moves.append([(self.x, self.y), (x, y)])
+            if isinstance(square, Empty) or square.color != self.color:
+                self.add_move(x, y, capture=not isinstance(square, Empty))
 
     def castling_rights(self, board):
-        """[summary]
+        """Castling moves: the king and rook did not move and the squares 
+        between them are empty
 
         Args:
-            board ([type]): [description]
+            board (Board): the board
         """        
-        self.castling_loc = []
         y = 0 if self.color == 'w' else 7
         
         if self.has_moved: 
@@ -585,72 +445,29 @@ class King(Piece):
         # Kingside castle
         rook = board.position[y][7]
         if (self.castling[0] 
-            and not isinstance(rook, Empty) 
-            and not rook.has_moved):
-            square_5 = board.position[y][5]
-            square_6 = board.position[y][6]
-
-            if (isinstance(square_5, Empty) 
-                and isinstance(square_6, Empty)):
-                attackers_5 = square_5.attacked_by['direct']
-                attackers_6 = square_6.attacked_by['direct']
-                direct_attack = False
-                
-                for piece in board.pieces[self.enemy_color]:
-                    if piece.id in attackers_5.keys(): 
-                        direct_attack = True
-                
-                if not direct_attack:
-                    for piece in board.pieces[self.enemy_color]:
-                        if piece.id in attackers_6.keys(): 
-                            direct_attack = True
-                
-                if not direct_attack:
-                    self.valid_moves.append([(self.x, y), (6, y)])
-                    self.castling_loc.append((6, y))
+            and isinstance(rook, Rook) 
+            and not rook.has_moved
+            and isinstance(board.position[y][5], Empty) 
+            and isinstance(board.position[y][6], Empty)):
+            self.valid_moves.append(encode_move(self.square, y * 8 + 6, KING_CASTLE))
                                
         # Queenside castle
         rook = board.position[y][0]
-            
         if (self.castling[1] 
-            and not isinstance(rook, Empty) 
-            and not rook.has_moved):
-            square_1 = board.position[y][1]
-            square_2 = board.position[y][2]
-            square_3 = board.position[y][3]
-            
-            if (isinstance(square_1, Empty) 
-                and isinstance(square_2, Empty) 
-                and isinstance(square_3, Empty)):
-                
-                attackers_2 = square_2.attacked_by['direct']
-                attackers_3 = square_3.attacked_by['direct']
-                direct_attack = False
-                
-                for piece in board.pieces[self.enemy_color]:
-                    if piece.id in attackers_2.keys(): 
-                        direct_attack = True
-                
-                if not direct_attack:
-                    for piece in board.pieces[self.enemy_color]:
-                        if piece.id in attackers_3.keys(): 
-                            direct_attack = True
-                
-                if not direct_attack:
-                    self.valid_moves.append([(self.x, y), (2, y)])
-                    self.castling_loc.append((2, y))
+            and isinstance(rook, Rook) 
+            and not rook.has_moved
+            and isinstance(board.position[y][1], Empty) 
+            and isinstance(board.position[y][2], Empty) 
+            and isinstance(board.position[y][3], Empty)):
+            self.valid_moves.append(encode_move(self.square, y * 8 + 2, QUEEN_CASTLE))
 
-    def is_check(self, enemy_pieces):
-        """[summary]
+    def is_check(self, board):
+        """Check if the king is attacked by an enemy piece
 
         Args:
-            enemy_pieces ([type]): [description]
+            board (Board): the board
 
         Returns:
-            [type]: [description]
+            bool: the king is in check
         """        
-        if self.attacked_by['direct']:
-            for enemy_piece in enemy_pieces:
-                if enemy_piece.id in self.attacked_by['direct'].keys(): 
-                    return True
-        return False
+        return (self.attacked_by & board.bitboard.occupied[1 - self.player]) != 0
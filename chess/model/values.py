@@ -0,0 +1,82 @@
+"""Evaluation values of the pieces.
+
+Piece-square tables give the positional value of a piece per square. They 
+are drawn from white's side: the first row is the 8th rank, so white pieces 
+look them up mirrored. The king has separate middlegame and endgame tables, 
+which the evaluation blends by the game phase (see `BitBoard.evaluate`).
+"""
+
+PAWN_TABLE = ((0, 0, 0, 0, 0, 0, 0, 0),
+              (50, 50, 50, 50, 50, 50, 50, 50),
+              (10, 10, 20, 30, 30, 20, 10, 10),
+              (5, 5, 10, 25, 25, 10, 5, 5),
+              (0, 0, 0, 20, 20, 0, 0, 0),
+              (5, -5, -10, 0, 0, -10, -5, 5),
+              (5, 10, 10, -20, -20, 10, 10, 5),
+              (0, 0, 0, 0, 0, 0, 0, 0))
+
+KNIGHT_TABLE = ((-50, -40, -30, -30, -30, -30, -40, -50),
+                (-40, -20, 0, 0, 0, 0, -20, -40),
+                (-30, 0, 10, 15, 15, 10, 0, -30),
+                (-30, 5, 15, 20, 20, 15, 5, -30),
+                (-30, 0, 15, 20, 20, 15, 0, -30),
+                (-30, 5, 10, 15, 15, 10, 5, -30),
+                (-40, -20, 0, 5, 5, 0, -20, -40),
+                (-50, -90, -30, -30, -30, -30, -90, -50))
+
+BISHOP_TABLE = ((-20, -10, -10, -10, -10, -10, -10, -20),
+                (-10, 0, 0, 0, 0, 0, 0, -10),
+                (-10, 0, 5, 10, 10, 5, 0, -10),
+                (-10, 5, 5, 10, 10, 5, 5, -10),
+                (-10, 0, 10, 10, 10, 10, 0, -10),
+                (-10, 10, 10, 10, 10, 10, 10, -10),
+                (-10, 5, 0, 0, 0, 0, 5, -10),
+                (-20, -10, -90, -10, -10, -90, -10, -20))
+
+ROOK_TABLE = ((0, 0, 0, 0, 0, 0, 0, 0),
+              (5, 10, 10, 10, 10, 10, 10, 5),
+              (-5, 0, 0, 0, 0, 0, 0, -5),
+              (-5, 0, 0, 0, 0, 0, 0, -5),
+              (-5, 0, 0, 0, 0, 0, 0, -5),
+              (-5, 0, 0, 0, 0, 0, 0, -5),
+              (-5, 0, 0, 0, 0, 0, 0, -5),
+              (0, 0, 0, 5, 5, 0, 0, 0))
+
+QUEEN_TABLE = ((-20, -10, -10, -5, -5, -10, -10, -20),
+               (-10, 0, 0, 0, 0, 0, 0, -10),
+               (-10, 0, 5, 5, 5, 5, 0, -10),
+               (-5, 0, 5, 5, 5, 5, 0, -5),
+               (0, 0, 5, 5, 5, 5, 0, -5),
+               (-10, 5, 5, 5, 5, 5, 0, -10),
+               (-10, 0, 5, 0, 0, 0, 0, -10),
+               (-20, -10, -10, 70, -5, -10, -10, -20))
+
+KING_TABLE = ((-30, -40, -40, -50, -50, -40, -40, -30),
+              (-30, -40, -40, -50, -50, -40, -40, -30),
+              (-30, -40, -40, -50, -50, -40, -40, -30),
+              (-30, -40, -40, -50, -50, -40, -40, -30),
+              (-20, -30, -30, -40, -40, -30, -30, -20),
+              (-10, -20, -20, -20, -20, -20, -20, -10),
+              (20, 20, 0, 0, 0, 0, 20, 20),
+              (20, 30, 10, 0, 0, 10, 30, 20))
+
+KING_ENDGAME_TABLE = ((-50, -40, -30, -20, -20, -30, -40, -50),
+                      (-30, -20, -10, 0, 0, -10, -20, -30),
+                      (-30, -10, 20, 30, 30, 20, -10, -30),
+                      (-30, -10, 30, 40, 40, 30, -10, -30),
+                      (-30, -10, 30, 40, 40, 30, -10, -30),
+                      (-30, -10, 20, 30, 30, 20, -10, -30),
+                      (-30, -30, 0, 0, 0, 0, -30, -30),
+                      (-50, -30, -30, -30, -30, -30, -30, -50))
+
+# Middlegame tables by piece type (pawn, knight, bishop, rook, queen, king)
+MIDDLEGAME_TABLES = (PAWN_TABLE, KNIGHT_TABLE, BISHOP_TABLE, ROOK_TABLE, QUEEN_TABLE, KING_TABLE)
+ENDGAME_TABLES = (PAWN_TABLE, KNIGHT_TABLE, BISHOP_TABLE, ROOK_TABLE, QUEEN_TABLE, KING_ENDGAME_TABLE)
+
+# Material value (in centipawns) by piece type, the king has no material value
+MATERIAL = (100, 300, 300, 500, 900, 0)
+
+# Game phase: the sum of the phase weights of all pieces on the board. The 
+# starting position has the full phase (middlegame), bare kings have phase 0
+PHASE_WEIGHTS = (0, 1, 1, 2, 4, 0)
+MAX_PHASE = 24
@@ -0,0 +1,122 @@
+"""Perft: count the leaf nodes of the legal move tree to a fixed depth.
+
+Verifies the move generator against known node counts and measures its
+speed. Runs headless, without pygame.
+
+Usage (from the `chess` directory):
+    python perft.py [fen] [depth] [--divide]
+    python perft.py --suite [--max-nodes N]
+"""
+import argparse
+import time
+from model.bitboard import BitBoard, START_FEN, move_name
+
+
+# Reference positions and their node counts per depth
+# (https://www.chessprogramming.org/Perft_Results)
+REFERENCE_POSITIONS = [
+    ('Start position', START_FEN,
+     [20, 400, 8902, 197281, 4865609, 119060324]),
+    ('Kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     [48, 2039, 97862, 4085603, 193690690]),
+    ('Position 3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     [14, 191, 2812, 43238, 674624, 11030083]),
+    ('Position 4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     [6, 264, 9467, 422333, 15833292]),
+    ('Position 4 mirrored', 'r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1',
+     [6, 264, 9467, 422333, 15833292]),
+    ('Position 5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     [44, 1486, 62379, 2103487, 89941194]),
+    ('Position 6', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     [46, 2079, 89890, 3894594, 164075551]),
+]
+
+
+def perft(board, depth):
+    """Number of leaf nodes at depth"""
+    if depth <= 0: return 1
+    moves = board.legal_moves()
+    if depth == 1: return len(moves)
+    
+    nodes = 0
+    for move in moves:
+        board.push(move)
+        nodes += perft(board, depth - 1)
+        board.pop()
+    return nodes
+
+
+def divide(board, depth):
+    """Number of leaf nodes per root move"""
+    counts = {}
+    for move in board.legal_moves():
+        board.push(move)
+        counts[move_name(move)] = perft(board, depth - 1) if depth > 1 else 1
+        board.pop()
+    return counts
+
+
+def run(fen, depth, show_divide=False):
+    """Print the node count of a position"""
+    board = BitBoard.from_fen(fen)
+    start = time.perf_counter()
+    
+    if show_divide and depth > 0:
+        counts = divide(board, depth)
+        for name in sorted(counts): print(f'{name}: {counts[name]}')
+        nodes = sum(counts.values())
+    else: nodes = perft(board, depth)
+    
+    elapsed = time.perf_counter() - start
+    print(f'Depth {depth}: {nodes} nodes in {elapsed:.3f} s ({nodes / elapsed:,.0f} nodes/s)')
+    return nodes
+
+
+def run_suite(max_nodes):
+    """Check the reference positions at every depth up to max_nodes leaf nodes"""
+    failures = 0
+    total_nodes = 0
+    start = time.perf_counter()
+    
+    for name, fen, counts in REFERENCE_POSITIONS:
+        board = BitBoard.from_fen(fen)
+        for depth, expected in enumerate(counts, 1):
+            if expected > max_nodes: break
+            
+            depth_start = time.perf_counter()
+            nodes = perft(board, depth)
+            elapsed = time.perf_counter() - depth_start
+            total_nodes += nodes
+            
+            status = 'ok' if nodes == expected else f'FAILED (expected {expected})'
+            if nodes != expected: failures += 1
+            print(f'{name:20} depth {depth}: {nodes:>10} {elapsed:8.3f} s {nodes / elapsed:>12,.0f} nodes/s  {status}')
+    
+    elapsed = time.perf_counter() - start
+    print(f'{total_nodes} nodes in {elapsed:.3f} s ({total_nodes / elapsed:,.0f} nodes/s), {failures} failed')
+    return failures
+
+
+def depth_type(value):
+    """Depth argument: a non-negative integer"""
+    depth = int(value)
+    if depth < 0: raise argparse.ArgumentTypeError(f'depth must not be negative: {value}')
+    return depth
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Perft node counts of the move generator')
+    parser.add_argument('fen', nargs='?', default=START_FEN, help='position (default: start position)')
+    parser.add_argument('depth', nargs='?', type=depth_type, default=4, help='depth (default: 4)')
+    parser.add_argument('--divide', action='store_true', help='show node count per root move')
+    parser.add_argument('--suite', action='store_true', help='check the reference positions')
+    parser.add_argument('--max-nodes', type=int, default=1000000, 
+                        help='largest reference count checked by --suite (default: 1000000)')
+    args = parser.parse_args()
+    
+    if args.suite: raise SystemExit(1 if run_suite(args.max_nodes) else 0)
+    run(args.fen, args.depth, args.divide)
+
+
+if __name__ == '__main__':
+    main()
@@ -37,13 +37,17 @@ class Game:
             if self.view.limit_fps: self.view.clock.tick(self.view.fps_max)
             else: self.view.clock.tick()
         
+        # Stop the engine process
+        self.chess.stop_ai()
+        
         
     def draw(self):
         """draw screen"""
         
         # draw code
         if self.chess.status != 'game': self.view.draw_screens(self.chess.status, self.chess.board)
-        else: self.view.draw_position(self.chess.board, self.chess.is_dragged)
+        else: self.view.draw_position(self.chess.board, self.chess.is_dragged, self.chess.is_thinking(), 
+                                      self.chess.settings['show_hanging'])
         
         x, y = pygame.mouse.get_pos()
         self.view.follow_mouse(x, y)
@@ -69,6 +73,10 @@ class Game:
             elif event.type == KEYDOWN:
                 if event.key == K_ESCAPE: self.chess.play = False
                 if event.key == K_q: self.chess.play = False
+                if event.key == K_BACKSPACE: self.chess.takeback()
+                if event.key == K_s: self.chess.save_game()
+                if event.key == K_l: self.chess.load_game()
+                if event.key == K_h: self.chess.toggle_hanging_pieces()
             
             # event: mousedown
             elif event.type == MOUSEBUTTONDOWN:
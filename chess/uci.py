@@ -0,0 +1,255 @@
+"""UCI (Universal Chess Interface) front-end of the engine on stdin and stdout.
+
+Lets chess GUIs and match runners (e.g. cutechess-cli) play the engine and
+follow its search. The search runs in the background processes of a
+`SearchWorker` and the commands are read by a separate thread, so `stop` and
+`ponderhit` take effect within milliseconds while the engine thinks.
+
+Supported commands: uci, isready, setoption (Hash, Threads, Ponder),
+ucinewgame, position [startpos | fen ...] [moves ...], go [wtime btime winc
+binc movestogo movetime depth nodes infinite ponder], stop, ponderhit, quit.
+
+Usage (from the `chess` directory):
+    python uci.py
+"""
+import sys
+import time
+import queue
+import threading
+from model.bitboard import BitBoard, START_FEN, WHITE, move_name
+from ai.chess_engine import MATE, MATE_BOUND
+from ai.search_worker import SearchWorker
+
+
+NAME = 'Chess'
+
+# Options: (UCI type, default, minimum, maximum)
+OPTIONS = {'Hash': ('spin', 16, 1, 1024),
+           'Threads': ('spin', 1, 1, 64),
+           'Ponder': ('check', False, None, None)}
+
+# Integer parameters of the go command
+GO_PARAMETERS = ('wtime', 'btime', 'winc', 'binc', 'movestogo', 'movetime', 'depth', 'nodes')
+
+# Time management: without movestogo the remaining time is shared over this
+# many moves, and every move keeps a margin (in ms) for the communication
+MOVES_TO_GO = 30
+MOVE_OVERHEAD = 50
+
+
+def format_score(score):
+    """UCI score: centipawns, or moves to mate (negative when mated)"""
+    if score > MATE_BOUND: return f'mate {(MATE - score + 1) // 2}'
+    if score < -MATE_BOUND: return f'mate {-((MATE + score) // 2)}'
+    return f'cp {score}'
+
+
+def format_info(info):
+    """UCI info line of a search"""
+    line = (f"info depth {info['depth']} score {format_score(info['score'])} nodes {info['nodes']} "
+            f"nps {info['nps']} time {int(1000 * info['time'])}")
+    if 'tt' in info: line += f" hashfull {info['tt']['hashfull']}"
+    if info.get('tbhits'): line += f" tbhits {info['tbhits']}"
+    return line + f" pv {' '.join(info['pv'])}" if info['pv'] else line
+
+
+def parse_go(tokens):
+    """Parameters of a go command, e.g. {'wtime': 60000, 'infinite': True}"""
+    parameters = {}
+    for i, token in enumerate(tokens):
+        if token in ('infinite', 'ponder'): parameters[token] = True
+        elif token in GO_PARAMETERS and i + 1 < len(tokens):
+            try: parameters[token] = int(tokens[i + 1])
+            except ValueError: pass
+    return parameters
+
+
+def search_limits(parameters, side):
+    """Limits of `Engine.search` for the parameters of a go command"""
+    limits = {'time_limit': float('inf'), 'node_limit': float('inf')}
+    if 'depth' in parameters: limits['depth_limit'] = max(1, parameters['depth'])
+    if 'nodes' in parameters: limits['node_limit'] = parameters['nodes']
+
+    time_left = parameters.get('wtime' if side == WHITE else 'btime')
+    if 'movetime' in parameters:
+        limits['time_limit'] = max(1, parameters['movetime'] - MOVE_OVERHEAD) / 1000
+    elif time_left is not None:
+        increment = parameters.get('winc' if side == WHITE else 'binc', 0)
+        moves_to_go = max(1, parameters.get('movestogo', MOVES_TO_GO))
+        move_time = min(time_left / moves_to_go + 0.8 * increment, time_left / 2)
+        limits['time_limit'] = max(1, move_time - MOVE_OVERHEAD) / 1000
+    return limits
+
+
+class UCI:
+    """UCI session: the position, the options and the search worker"""
+
+    def __init__(self, output=sys.stdout):
+        """Args:
+            output (file): where responses are written
+        """
+        self.output = output
+        self.options = {name: option[1] for name, option in OPTIONS.items()}
+        self.board = BitBoard.from_fen(START_FEN)
+        self.worker = None
+
+        # Infinite and ponder searches only send their best move after stop
+        # (or ponderhit), even when they finish before
+        self.wait_for_stop = False
+        self.result = None
+        
+        # Depth and nodes of the last info line, not to repeat it with the best move
+        self.last_info = None
+
+    def send(self, line):
+        print(line, file=self.output, flush=True)
+
+    def run(self, input=sys.stdin):
+        """Handle commands until quit or the end of the input"""
+        commands = queue.Queue()
+
+        def read():
+            for line in input: commands.put(line)
+            commands.put('quit')
+        threading.Thread(target=read, daemon=True).start()
+
+        while True:
+            searching = self.worker is not None and self.worker.searching
+            try: line = commands.get(timeout=0.005 if searching else None)
+            except queue.Empty: line = None
+
+            if line is not None and not self.command(line): break
+            self.update()
+        self.close()
+
+    def command(self, line):
+        """Handle a command line. Returns False on quit."""
+        tokens = line.split()
+        if not tokens: return True
+        name, arguments = tokens[0], tokens[1:]
+
+        if name == 'uci':
+            self.send(f'id name {NAME}')
+            self.send('id author Chess contributors')
+            for option, (kind, default, minimum, maximum) in OPTIONS.items():
+                if kind == 'spin': self.send(f'option name {option} type spin default {default} min {minimum} max {maximum}')
+                else: self.send(f'option name {option} type check default {str(default).lower()}')
+            self.send('uciok')
+        elif name == 'isready':
+            self.get_worker()
+            self.send('readyok')
+        elif name == 'setoption': self.set_option(arguments)
+        elif name == 'ucinewgame': self.finish_search()
+        elif name == 'position': self.set_position(arguments)
+        elif name == 'go': self.go(parse_go(arguments))
+        elif name == 'stop': self.stop()
+        elif name == 'ponderhit': self.ponderhit()
+        elif name == 'quit': return False
+        else: self.send(f'info string unknown command: {line.strip()}')
+        return True
+
+    def set_option(self, arguments):
+        """setoption name <name> value <value>"""
+        if 'name' not in arguments: return
+        value_index = arguments.index('value') if 'value' in arguments else len(arguments)
+        name = ' '.join(arguments[arguments.index('name') + 1:value_index])
+        value = ' '.join(arguments[value_index + 1:])
+
+        option = next((option for option in OPTIONS if option.lower() == name.lower()), None)
+        if option is None: return self.send(f'info string unknown option: {name}')
+
+        kind, _, minimum, maximum = OPTIONS[option]
+        if kind == 'check': self.options[option] = value.lower() == 'true'
+        else:
+            try: self.options[option] = min(maximum, max(minimum, int(value)))
+            except ValueError: return self.send(f'info string invalid value: {value}')
+
+            # The worker is started again with the new table size or processes
+            if self.worker is not None:
+                self.finish_search()
+                self.worker.close()
+                self.worker = None
+
+    def set_position(self, arguments):
+        """position [startpos | fen <fen>] [moves <move> ...]"""
+        self.finish_search()
+        moves_index = arguments.index('moves') if 'moves' in arguments else len(arguments)
+        try:
+            if arguments[:1] == ['fen']: board = BitBoard.from_fen(' '.join(arguments[1:moves_index]))
+            else: board = BitBoard.from_fen(START_FEN)
+            for name in arguments[moves_index + 1:]: board.push(board.parse_move(name))
+        except ValueError as error:
+            return self.send(f'info string invalid position: {error}')
+        self.board = board
+
+    def get_worker(self):
+        if self.worker is None:
+            self.worker = SearchWorker(1, self.options['Hash'], self.options['Threads'])
+        return self.worker
+
+    def go(self, parameters):
+        """Start the search of the current position"""
+        self.finish_search()
+        worker = self.get_worker()
+
+        self.result = self.last_info = None
+        self.wait_for_stop = parameters.get('infinite', False) or parameters.get('ponder', False)
+        worker.start(self.board, ponder=parameters.get('ponder', False), **search_limits(parameters, self.board.side))
+
+    def update(self):
+        """Send the info of the search, and its best move when it is done"""
+        worker = self.worker
+        if worker is None or not worker.searching: return
+
+        for info in worker.progress(): 
+            self.send(format_info(info))
+            self.last_info = (info['depth'], info['nodes'])
+        result = worker.poll()
+        if result is None: return
+
+        self.result = result
+        if not self.wait_for_stop: self.send_result()
+
+    def send_result(self):
+        move, info = self.result
+        self.result = None
+        if info.get('depth') and (info['depth'], info['nodes']) != self.last_info: self.send(format_info(info))
+
+        if move is None: return self.send('bestmove 0000')
+        line = f'bestmove {move_name(move)}'
+        if info.get('ponder'): line += f" ponder {move_name(info['ponder'])}"
+        self.send(line)
+
+    def stop(self):
+        """Stop the search and send its best move"""
+        self.wait_for_stop = False
+        if self.result is not None: self.send_result()
+        elif self.worker is not None and self.worker.searching: self.worker.stop()
+
+    def ponderhit(self):
+        """The opponent played the ponder move: the search goes on as a normal search"""
+        self.wait_for_stop = False
+        if self.result is not None: self.send_result()
+        elif self.worker is not None and self.worker.searching: self.worker.ponderhit()
+
+    def finish_search(self):
+        """Stop the search of the previous go, if it still runs, and send its best
+        move: every go gets one, even when the next command comes before it was sent"""
+        self.wait_for_stop = False
+        if self.worker is not None and self.worker.searching:
+            self.worker.stop()
+            while self.worker.searching:
+                self.update()
+                time.sleep(0.001)
+        if self.result is not None: self.send_result()
+
+    def close(self):
+        if self.worker is not None: self.worker.close()
+
+
+def main():
+    UCI().run()
+
+
+if __name__ == '__main__':
+    main()
@@ -3,12 +3,17 @@ import pygame
 from view.arrow import Arrow
 from view.button import Button
 from model.pieces import Empty, King
+from model.bitboard import move_xy
 
 
 class GameView:
-    STARTSCREEN_IMG = pygame.image.load(os.path.join('view/media', 'startscreen.jpg')) 
-    BACKGROUND_IMG =  pygame.image.load(os.path.join('view/media', 'board.png'))
-    PIECES_IMG =      pygame.image.load(os.path.join('view/media', 'pieces.png'))
+    MEDIA = 'view/media'
+    STARTSCREEN_IMG = 'startscreen.jpg'
+    BACKGROUND_IMG = 'board.png'
+    PIECES_IMG = 'pieces.png'
+    
+    # Column of each piece in the pieces image (white on the top row, black below)
+    PIECE_INDEX = {'K': 0, 'Q': 1, 'B': 2, 'N': 3, 'R': 4, 'P': 5}
 
     WHITE = (255, 255, 255)
     YELLOW = (255, 233, 33)
@@ -53,25 +58,44 @@ class GameView:
 
         # Startscreen image
         scale_factor = 1.3
-        self.start_screen_image = self.STARTSCREEN_IMG.convert_alpha()  # Original size: 930 x 590 px
+        self.start_screen_image = self.load_image(self.STARTSCREEN_IMG).convert_alpha()  # Original size: 930 x 590 px
         self.size_of_ssi = self.start_screen_image.get_rect().size
         self.start_screen_image = pygame.transform.scale(self.start_screen_image, (round(self.size_of_ssi[0] / scale_factor), round(self.size_of_ssi[1] / scale_factor)))
 
         # Get image of board
-        self.background = self.BACKGROUND_IMG.convert()
+        self.background = self.load_image(self.BACKGROUND_IMG).convert()
         self.size_of_bg = self.background.get_rect().size
 
         self.square_width = self.size_of_bg[0] // 8
         self.square_height = self.size_of_bg[1] // 8
         
         # Pieces
-        self.pieces_image = self.PIECES_IMG.convert_alpha()
+        self.pieces_image = self.load_image(self.PIECES_IMG).convert_alpha()
         self.pieces_image = pygame.transform.scale(self.pieces_image, (self.square_width * 6, self.square_height * 2))
+        self.subsections = self.get_subsections()
         self.images = self.get_orig_images()
 
         # Buttons
         self.create_buttons()
+        
+        # Hanging pieces of the side to move, found once per position
+        self.hanging_pieces = []
+        self.hanging_key = None
+
+
+    def load_image(self, name):
+        return pygame.image.load(os.path.join(self.MEDIA, name))
 
+    def get_subsections(self):
+        """Area of each piece in the pieces image, by symbol and color"""
+        subsections = {}
+        for symbol, index in self.PIECE_INDEX.items():
+            for color, upper_y in (('w', 0), ('b', self.square_height)):
+                subsections[symbol, color] = (index * self.square_width, upper_y, self.square_width, self.square_height)
+        return subsections
+
+    def subsection(self, piece):
+        return self.subsections[piece.symbol, piece.color]
 
     def draw_screens(self, status, board):
         """Method to control what screen is draw when tracking mouse movement.
@@ -109,15 +133,18 @@ class GameView:
                     else: button.color = self.LIGHT_GRAY
                     
 
-    def draw_position(self, board, dragged_piece=None):
+    def draw_position(self, board, dragged_piece=None, thinking=False, show_hanging=False):
         """Main drawing method. 
         This method contains all the methods that are called during the draw step of the game.
+        Hanging pieces are only marked when the player asks for it (show_hanging).
         """
         self.draw_board(board)
         self.draw_captured_pieces(board)
         self.draw_move_list(board)
+        if thinking: self.draw_thinking()
         self.draw_highlighed_tiles(board)
         if board.previous_move: self.draw_previous_move(board)
+        if show_hanging: self.draw_hanging_pieces(board)
         self.draw_possible_moves(board)
         self.draw_all_pieces(board, dragged_piece)
         self.draw_arrows(board)
@@ -142,6 +169,19 @@ class GameView:
         self.screen.blit(self.images['yellow_box'], (x1 * self.square_width, y1 * self.square_height))
         self.screen.blit(self.images['yellow_box'], (x2 * self.square_width, y2 * self.square_height))
             
+    def draw_hanging_pieces(self, board):
+        """Frame the pieces of the side to move that the opponent wins material
+        by capturing (by static exchange evaluation)"""
+        key = (board, board.generation)
+        if self.hanging_key != key:
+            self.hanging_pieces = board.hanging_pieces(board.current_color)
+            self.hanging_key = key
+        
+        for piece in self.hanging_pieces:
+            y = 7 - piece.y if not board.is_flipped else piece.y
+            pygame.draw.rect(self.screen, self.RED, 
+                             (piece.x * self.square_width, y * self.square_height, self.square_width, self.square_height), 3)
+            
     def draw_arrows(self, board):
         """Draw arrows"""
         for coord in board.arrow_coordinates:
@@ -158,7 +198,8 @@ class GameView:
             
     def draw_possible_moves(self, board):
         """Show dots on squares that indicate positions the clicked piece can move to"""
-        for _, (x2, y2) in board.moves:
+        for move in board.moves:
+            _, (x2, y2) = move_xy(move)
             if not board.is_flipped: y2 = 7 - y2
             self.screen.blit(self.images['circle_image_green'], (x2 * self.square_width, y2 * self.square_height))
     
@@ -172,18 +213,18 @@ class GameView:
                         if square.id != dragged_piece.id:
                             if isinstance(square, King): 
                                 if square.in_check: 
-                                    self.screen.blit(self.images['circle_image_red'], (square.x * self.square_width, y * self.square_height), square.subsection)
-                            self.screen.blit(self.pieces_image, (square.x * self.square_width, y * self.square_height), square.subsection)
+                                    self.screen.blit(self.images['circle_image_red'], (square.x * self.square_width, y * self.square_height))
+                            self.screen.blit(self.pieces_image, (square.x * self.square_width, y * self.square_height), self.subsection(square))
                     else: 
                         if isinstance(square, King): 
                                 if square.in_check: 
-                                    self.screen.blit(self.images['circle_image_red'], (square.x * self.square_width, y * self.square_height), square.subsection)
-                        self.screen.blit(self.pieces_image, (square.x * self.square_width, y * self.square_height), square.subsection)
+                                    self.screen.blit(self.images['circle_image_red'], (square.x * self.square_width, y * self.square_height))
+                        self.screen.blit(self.pieces_image, (square.x * self.square_width, y * self.square_height), self.subsection(square))
 
     def draw_dragged_piece(self, dragged_piece):
         """Show dragging piece at mouse location"""
         x, y = pygame.mouse.get_pos()
-        self.screen.blit(self.pieces_image, (x - self.square_width / 2, y - self.square_height / 2), dragged_piece.subsection)
+        self.screen.blit(self.pieces_image, (x - self.square_width / 2, y - self.square_height / 2), self.subsection(dragged_piece))
 
     def draw_captured_pieces(self, board):
         """Draw captured piece on the side of the board"""
@@ -220,7 +261,7 @@ class GameView:
                 counter[piece.color][piece.symbol] += 1
                 piece_valuation[color] += piece.points
                 
-                self.screen.blit(self.pieces_image, (piece_loc[0] + x_offset, piece_loc[1]), piece.subsection)
+                self.screen.blit(self.pieces_image, (piece_loc[0] + x_offset, piece_loc[1]), self.subsection(piece))
         
         valuation = piece_valuation['w'] - piece_valuation['b']
         if valuation == 0: return
@@ -273,6 +314,11 @@ class GameView:
         self.draw_game_button.draw(self.screen, self.font)
         self.resign_game_button.draw(self.screen, self.font)
     
+    def draw_thinking(self):
+        """Show that the computer is searching a move"""
+        text = self.small_font.render('Thinking...', 1, self.BLUE, self.LIGHT_GRAY)
+        self.screen.blit(text, (self.screen_size + 100, 380))
+
     def draw_end_of_game(self, board):
         """Show message indicating end of game and the winner"""
         for condition, state in board.end_conditions.items():
@@ -402,13 +448,13 @@ class GameView:
 
     def get_orig_images(self):
         """Load all the media into one dictionary"""
-        circle_image_green = pygame.image.load(os.path.join('view/media', 'green_circle_small.png')).convert_alpha()
-        circle_image_capture = pygame.image.load(os.path.join('view/media', 'green_circle_neg.png')).convert_alpha()
-        circle_image_red = pygame.image.load(os.path.join('view/media', 'red_circle_big.png')).convert_alpha()
-        green_box_image = pygame.image.load(os.path.join('view/media', 'green_box.png')).convert_alpha()
-        circle_image_yellow = pygame.image.load(os.path.join('view/media', 'yellow_circle_big.png')).convert_alpha()
-        circle_image_green_big = pygame.image.load(os.path.join('view/media', 'green_circle_big.png')).convert_alpha()
-        yellow_box_image = pygame.image.load(os.path.join('view/media', 'yellow_box.png')).convert_alpha()
+        circle_image_green = self.load_image('green_circle_small.png').convert_alpha()
+        circle_image_capture = self.load_image('green_circle_neg.png').convert_alpha()
+        circle_image_red = self.load_image('red_circle_big.png').convert_alpha()
+        green_box_image = self.load_image('green_box.png').convert_alpha()
+        circle_image_yellow = self.load_image('yellow_circle_big.png').convert_alpha()
+        circle_image_green_big = self.load_image('green_circle_big.png').convert_alpha()
+        yellow_box_image = self.load_image('yellow_box.png').convert_alpha()
 
         images = {
             'circle_image_green': circle_image_green,